@@ -1,9 +1,24 @@
 class ASRInterface:
-    async def transcribe(self, client):
+    """
+    Interface for automatic speech recognition (ASR) systems.
+
+    transcribe runs on the server's event loop, so implementations run their blocking
+    model work in a src.stage_executor.StageExecutor stored as self.executor.
+    """
+    async def transcribe(self, client, audio=None):
         """
         Transcribe the given audio data.
 
         :param client: The client object with all the member variables including the buffer
+        :param audio: The client's scratch buffer as float32 samples, when the caller already
+            converted it; converted here otherwise
         :return: The transcription structure, see for example the faster_whisper_asr.py file.
         """
         raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def stats(self):
+        """
+        Timing metrics of the pipeline's executor (see StageExecutor.stats), or {} without one.
+        """
+        executor = getattr(self, 'executor', None)
+        return executor.stats() if executor is not None else {}
@@ -1,8 +1,10 @@
 import os
+
 from faster_whisper import WhisperModel
 
 from .asr_interface import ASRInterface
-from src.audio_utils import save_audio_to_file
+from src.audio_utils import pcm16_to_float32
+from src.stage_executor import StageExecutor
 
 language_codes = {
     "afrikaans": "af",
@@ -111,17 +113,25 @@ language_codes = {
 class FasterWhisperASR(ASRInterface):
     def __init__(self, **kwargs):
         model_size = kwargs.get('model_size', "large-v3")
-        # Run on GPU with FP16
-        self.asr_pipeline = WhisperModel(model_size, device="cuda", compute_type="float16")
+        # Chunks transcribed at the same time; CTranslate2 releases the GIL, so threads are enough
+        workers = int(os.environ.get('ASR_WORKERS') or kwargs.get('workers', 1))
+        # Run on GPU with FP16, one CTranslate2 worker per thread of the executor
+        self.asr_pipeline = WhisperModel(model_size, device="cuda", compute_type="float16", num_workers=workers)
+        self.executor = StageExecutor("asr", "thread", workers)
 
-    async def transcribe(self, client):
-        file_path = await save_audio_to_file(client.scratch_buffer, client.get_file_name())
+    async def transcribe(self, client, audio=None):
+        if audio is None:
+            # faster-whisper takes 16 kHz float32 samples directly, no WAV decode
+            audio = pcm16_to_float32(client.scratch_buffer)
 
         language = None if client.config['language'] is None else language_codes.get(client.config['language'].lower())
-        segments, info = self.asr_pipeline.transcribe(file_path, word_timestamps=True, language=language)
+        return await self.executor.run(self._transcribe, audio, language)
+
+    def _transcribe(self, audio, language):
+        # Blocking: runs in the executor, off the event loop
+        segments, info = self.asr_pipeline.transcribe(audio, word_timestamps=True, language=language)
 
         segments = list(segments)  # The transcription will actually run here.
-        os.remove(file_path)
 
         flattened_words = [word for segment in segments for word in segment.words]
 
@@ -135,4 +145,3 @@ class FasterWhisperASR(ASRInterface):
             ]
         }
         return to_return
-
@@ -1,22 +1,24 @@
+import os
+
 from transformers import pipeline
 from .asr_interface import ASRInterface
-from src.audio_utils import save_audio_to_file
-import os
+from src.audio_utils import pcm16_to_float32
+from src.stage_executor import StageExecutor
 
 class WhisperASR(ASRInterface):
     def __init__(self, **kwargs):
         model_name = kwargs.get('model_name', "openai/whisper-large-v3")
         self.asr_pipeline = pipeline("automatic-speech-recognition", model=model_name)
+        # torch releases the GIL during inference, so a thread pool keeps the event loop free
+        self.executor = StageExecutor("asr", "thread", int(os.environ.get('ASR_WORKERS') or kwargs.get('workers', 1)))
 
-    async def transcribe(self, client):
-        file_path = await save_audio_to_file(client.scratch_buffer, client.get_file_name())
-        
-        if client.config['language'] is not None:
-            to_return = self.asr_pipeline(file_path, generate_kwargs={"language": client.config['language']})['text']
-        else:
-            to_return = self.asr_pipeline(file_path)['text']
+    async def transcribe(self, client, audio=None):
+        if audio is None:
+            audio = pcm16_to_float32(client.scratch_buffer)
+        # The pipeline takes raw samples with their rate, no WAV round trip
+        inputs = {"raw": audio, "sampling_rate": client.sampling_rate}
 
-        os.remove(file_path)
+        to_return = await self.executor.run(self._transcribe, inputs, client.config['language'])
 
         to_return = {
             "language": "UNSUPPORTED_BY_HUGGINGFACE_WHISPER",
@@ -25,3 +27,9 @@ class WhisperASR(ASRInterface):
             "words": "UNSUPPORTED_BY_HUGGINGFACE_WHISPER"
         }
         return to_return
+
+    def _transcribe(self, audio, language):
+        # Blocking: runs in the executor, off the event loop
+        if language is not None:
+            return self.asr_pipeline(audio, generate_kwargs={"language": language})['text']
+        return self.asr_pipeline(audio)['text']
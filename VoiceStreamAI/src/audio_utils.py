@@ -1,6 +1,8 @@
 import wave
 import os
 
+import numpy as np
+
 async def save_audio_to_file(audio_data, file_name, audio_dir="audio_files", audio_format="wav"):
     """
     Saves the audio data to a file.
@@ -14,7 +16,7 @@ async def save_audio_to_file(audio_data, file_name, audio_dir="audio_files", aud
     """
 
     os.makedirs(audio_dir, exist_ok=True)
-    
+
     file_path = os.path.join(audio_dir, file_name)
 
     with wave.open(file_path, 'wb') as wav_file:
@@ -24,3 +26,36 @@ async def save_audio_to_file(audio_data, file_name, audio_dir="audio_files", aud
         wav_file.writeframes(audio_data)
 
     return file_path
+
+def pcm16_to_float32(audio_data):
+    """
+    Converts 16-bit PCM bytes to float32 samples in [-1, 1], as pyannote and Whisper expect.
+
+    The bytes are read in place (no copy of the buffer, no WAV round trip); the only
+    allocation is the float32 output. A trailing odd byte is ignored.
+
+    :param audio_data: bytes or bytearray of little-endian 16-bit mono samples.
+    :return: 1-D float32 numpy array.
+    """
+    view = memoryview(audio_data)[:len(audio_data) // 2 * 2]
+    samples = np.frombuffer(view, dtype=np.int16).astype(np.float32)
+    # Release the view, so the caller can still resize its bytearray
+    view.release()
+    samples *= 1.0 / 32768.0
+    return samples
+
+async def save_debug_audio(client, audio_dir=None):
+    """
+    Saves the client's scratch buffer for debugging, only when DEBUG_AUDIO_DIR is set.
+
+    The VAD and ASR pipelines work on the in-memory buffer; this dump is the only
+    place audio chunks reach the disk.
+
+    :param client: The client whose scratch buffer to save.
+    :param audio_dir: Directory to save to, defaults to the DEBUG_AUDIO_DIR env var.
+    :return: Path to the saved audio file, or None when debugging is off.
+    """
+    audio_dir = audio_dir or os.environ.get('DEBUG_AUDIO_DIR')
+    if not audio_dir:
+        return None
+    return await save_audio_to_file(client.scratch_buffer, client.get_file_name(), audio_dir)
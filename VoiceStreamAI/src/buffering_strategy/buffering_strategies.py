@@ -4,6 +4,7 @@ import json
 import time
 
 from .buffering_strategy_interface import BufferingStrategyInterface
+from src.audio_utils import pcm16_to_float32, save_debug_audio
 
 class SilenceAtEndOfChunk(BufferingStrategyInterface):
     """
@@ -41,8 +42,11 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
         self.error_if_not_realtime = os.environ.get('ERROR_IF_NOT_REALTIME')
         if not self.error_if_not_realtime:
             self.error_if_not_realtime = kwargs.get('error_if_not_realtime', False)
+        if isinstance(self.error_if_not_realtime, str):
+            self.error_if_not_realtime = self.error_if_not_realtime.lower() in ('1', 'true', 'yes')
         
         self.processing_flag = False
+        self.holding_audio = False
 
     def process_audio(self, websocket, vad_pipeline, asr_pipeline):
         """
@@ -59,8 +63,16 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
         chunk_length_in_bytes = self.chunk_length_seconds * self.client.sampling_rate * self.client.samples_width
         if len(self.client.buffer) > chunk_length_in_bytes:
             if self.processing_flag:
-                exit("Error in realtime processing: tried processing a new chunk while the previous one was still being processed")
-
+                if self.error_if_not_realtime:
+                    exit("Error in realtime processing: tried processing a new chunk while the previous one was still being processed")
+                # VAD and ASR are shared by all clients and may be queued behind other chunks:
+                # keep buffering, the audio is processed once the previous chunk is done
+                if not self.holding_audio:
+                    print(f"Client {self.client.client_id} is not realtime: holding audio until the previous chunk is processed")
+                    self.holding_audio = True
+                return
+
+            self.holding_audio = False
             self.client.scratch_buffer += self.client.buffer
             self.client.buffer.clear()
             self.processing_flag = True
@@ -79,24 +91,39 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
             vad_pipeline: The voice activity detection pipeline.
             asr_pipeline: The automatic speech recognition pipeline.
         """   
+        try:
+            await self._process_chunk(websocket, vad_pipeline, asr_pipeline)
+        except Exception as e:
+            # Nothing awaits this task, so the error is reported here
+            print(f"Error processing audio from client {self.client.client_id}: {e!r}")
+        finally:
+            # Also after a failed chunk, or the client's audio would be held forever
+            self.processing_flag = False
+
+    async def _process_chunk(self, websocket, vad_pipeline, asr_pipeline):
         start = time.time()
-        vad_results = await vad_pipeline.detect_activity(self.client)
+        # Only written when DEBUG_AUDIO_DIR is set; VAD and ASR read the buffer in memory
+        await save_debug_audio(self.client)
+        # Converted once for both stages, which run in their pipeline's executor
+        # so other clients are served meanwhile
+        audio = pcm16_to_float32(self.client.scratch_buffer)
+        vad_results = await vad_pipeline.detect_activity(self.client, audio)
+        vad_end = time.time()
 
         if len(vad_results) == 0:
+            # client.buffer is kept: it holds the audio received while this chunk was processed
             self.client.scratch_buffer.clear()
-            self.client.buffer.clear()
-            self.processing_flag = False
             return
 
         last_segment_should_end_before = ((len(self.client.scratch_buffer) / (self.client.sampling_rate * self.client.samples_width)) - self.chunk_offset_seconds)
         if vad_results[-1]['end'] < last_segment_should_end_before:
-            transcription = await asr_pipeline.transcribe(self.client)
+            transcription = await asr_pipeline.transcribe(self.client, audio)
             if transcription['text'] != '':
                 end = time.time()
                 transcription['processing_time'] = end - start
+                transcription['vad_time'] = vad_end - start
+                transcription['asr_time'] = end - vad_end
                 json_transcription = json.dumps(transcription) 
                 await websocket.send(json_transcription)
             self.client.scratch_buffer.clear()
             self.client.increment_file_counter()
-        
-        self.processing_flag = False
\ No newline at end of file
@@ -63,6 +63,15 @@ class Server:
             print(f"Connection with {client_id} closed: {e}")
         finally:
             del self.connected_clients[client_id]
+            print(f"Pipeline timings: {json.dumps(self.stats())}")
+
+    def stats(self):
+        """
+        Per-stage timing metrics: calls, calls in flight and mean run/wait seconds for VAD and ASR.
+        """
+        return {"clients": len(self.connected_clients),
+                "vad": self.vad_pipeline.stats(),
+                "asr": self.asr_pipeline.stats()}
 
     def start(self):
         print("Websocket server ready to accept connections")
@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def _timed(function, *args):
+    """Runs function(*args) in the worker and returns (result, seconds it ran)."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class StageExecutor:
+    """
+    Runs the blocking work of one pipeline stage (VAD or ASR) off the asyncio loop and times it.
+
+    The VAD and ASR models do synchronous pyannote/CTranslate2/torch work. Awaited directly
+    from a coroutine, it blocks the websockets loop, and with it every other client. A
+    StageExecutor runs that work in a pool, so the loop keeps serving other clients and
+    several of them can be processed at the same time.
+
+    Attributes:
+        name (str): Stage name, used in the metrics ("vad", "asr").
+        kind (str): "thread" for work that releases the GIL (CTranslate2, torch), or
+            "process" for work that does not, at the cost of one model copy per process.
+        workers (int): Size of the pool, so the number of chunks processed at once.
+    """
+    def __init__(self, name, kind="thread", workers=1, initializer=None, initargs=()):
+        self.name = name
+        self.kind = kind
+        self.workers = int(workers)
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-worker",
+                                               initializer=initializer, initargs=initargs)
+        elif kind == "process":
+            # spawn, not fork: torch and CUDA state do not survive a fork
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=initializer, initargs=initargs)
+        else:
+            raise ValueError(f"Unknown executor kind for {name}: {kind}")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.run_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def run(self, function, *args):
+        """
+        Runs function(*args) in the pool and returns its result. For a process pool,
+        function and args must be picklable (a module-level function and numpy arrays).
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            result, run_seconds = await loop.run_in_executor(self.executor, _timed, function, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        total_seconds = time.perf_counter() - submitted
+        with self._lock:
+            self.calls += 1
+            self.run_seconds += run_seconds
+            # Time spent queued behind other clients' chunks (and pickling, for processes)
+            self.wait_seconds += total_seconds - run_seconds
+            self.max_seconds = max(self.max_seconds, total_seconds)
+        return result
+
+    def stats(self):
+        """
+        Returns:
+            dict: Calls so far, calls in flight, and the mean run, mean wait and max total seconds.
+        """
+        with self._lock:
+            calls = self.calls
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "calls": calls,
+                "in_flight": self.in_flight,
+                "mean_run_seconds": self.run_seconds / calls if calls else 0.0,
+                "mean_wait_seconds": self.wait_seconds / calls if calls else 0.0,
+                "max_seconds": self.max_seconds,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -1,12 +1,48 @@
-from os import remove
 import os
 
+import torch
 from pyannote.core import Segment
 from pyannote.audio import Model
 from pyannote.audio.pipelines import VoiceActivityDetection
 
 from .vad_interface import VADInterface
-from src.audio_utils import save_audio_to_file
+from src.audio_utils import pcm16_to_float32
+from src.stage_executor import StageExecutor
+
+# The pipeline loaded in this worker process, when the VAD runs in a process pool
+_worker_pipeline = None
+
+
+def load_pipeline(model_name, auth_token, pyannote_args):
+    model = Model.from_pretrained(model_name, use_auth_token=auth_token)
+    vad_pipeline = VoiceActivityDetection(segmentation=model)
+    vad_pipeline.instantiate(pyannote_args)
+    return vad_pipeline
+
+
+def _init_worker(model_name, auth_token, pyannote_args, torch_threads):
+    global _worker_pipeline
+    # Worker processes share the cores instead of each starting one torch thread per core
+    torch.set_num_threads(torch_threads)
+    _worker_pipeline = load_pipeline(model_name, auth_token, pyannote_args)
+
+
+def detect_segments(audio, sample_rate, vad_pipeline=None):
+    """
+    Runs the VAD over float32 mono samples. Blocking: called in the VAD's executor.
+    Without vad_pipeline, the one loaded in this worker process is used.
+    """
+    vad_pipeline = vad_pipeline or _worker_pipeline
+    # pyannote takes a (channel, time) waveform in memory; torch.from_numpy does not copy
+    waveform = torch.from_numpy(audio).unsqueeze(0)
+    vad_results = vad_pipeline({"waveform": waveform, "sample_rate": sample_rate})
+    vad_segments = []
+    if len(vad_results) > 0:
+        vad_segments = [
+            {"start": segment.start, "end": segment.end, "confidence": 1.0}
+            for segment in vad_results.itersegments()
+        ]
+    return vad_segments
 
 
 class PyannoteVAD(VADInterface):
@@ -21,6 +57,9 @@ class PyannoteVAD(VADInterface):
         Args:
             model_name (str): The model name for Pyannote.
             auth_token (str, optional): Authentication token for Hugging Face.
+            executor (str, optional): "thread" (default) to run the VAD in a thread pool, or
+                "process" to load one pipeline per worker process, for when pyannote holds the GIL.
+            workers (int, optional): Chunks detected at the same time (default 1).
         """
         
         model_name = kwargs.get('model_name', "pyannote/segmentation")
@@ -33,18 +72,21 @@ class PyannoteVAD(VADInterface):
             raise ValueError("Missing required env var in PYANNOTE_AUTH_TOKEN or argument in --vad-args: 'auth_token'")
         
         pyannote_args = kwargs.get('pyannote_args', {"onset": 0.5, "offset": 0.5, "min_duration_on": 0.3, "min_duration_off": 0.3})
-        self.model = Model.from_pretrained(model_name, use_auth_token=auth_token)
-        self.vad_pipeline = VoiceActivityDetection(segmentation=self.model)
-        self.vad_pipeline.instantiate(pyannote_args)
-
-    async def detect_activity(self, client):
-        audio_file_path = await save_audio_to_file(client.scratch_buffer, client.get_file_name())
-        vad_results = self.vad_pipeline(audio_file_path)
-        remove(audio_file_path)
-        vad_segments = []
-        if len(vad_results) > 0:
-            vad_segments = [
-                {"start": segment.start, "end": segment.end, "confidence": 1.0}
-                for segment in vad_results.itersegments()
-            ]
-        return vad_segments
+
+        executor = os.environ.get('VAD_EXECUTOR') or kwargs.get('executor', "thread")
+        workers = int(os.environ.get('VAD_WORKERS') or kwargs.get('workers', 1))
+        if executor == "process":
+            # The pipeline is loaded in each worker process instead of here
+            self.vad_pipeline = None
+            torch_threads = max(1, (os.cpu_count() or 1) // workers)
+            self.executor = StageExecutor("vad", "process", workers, _init_worker,
+                                          (model_name, auth_token, pyannote_args, torch_threads))
+        else:
+            self.vad_pipeline = load_pipeline(model_name, auth_token, pyannote_args)
+            self.executor = StageExecutor("vad", executor, workers)
+
+    async def detect_activity(self, client, audio=None):
+        if audio is None:
+            # Converted here, on the loop: the worker gets its own copy while the client keeps buffering
+            audio = pcm16_to_float32(client.scratch_buffer)
+        return await self.executor.run(detect_segments, audio, client.sampling_rate, self.vad_pipeline)
@@ -1,16 +1,29 @@
 class VADInterface:
     """
     Interface for voice activity detection (VAD) systems.
+
+    detect_activity runs on the server's event loop, so implementations run their blocking
+    model work in a src.stage_executor.StageExecutor stored as self.executor.
     """
 
-    async def detect_activity(self, client):
+    async def detect_activity(self, client, audio=None):
         """
         Detects voice activity in the given audio data.
 
         Args:
             client (src.Client): The client to detect on
+            audio (numpy.ndarray, optional): The client's scratch buffer as float32 samples,
+                when the caller already converted it; converted here otherwise
 
         Returns:
             List: VAD result, a list of objects containing "start", "end", "confidence"
         """
         raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Timing metrics of the pipeline's executor (see StageExecutor.stats), or {} without one.
+        """
+        executor = getattr(self, 'executor', None)
+        return executor.stats() if executor is not None else {}
@@ -0,0 +1,108 @@
+# tests/buffering_strategy/test_silence_at_end_of_chunk.py
+
+import unittest
+import asyncio
+import json
+
+import numpy as np
+
+from src.client import Client
+
+class FakeWebsocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+class FakeVAD:
+    """Reports speech that ends one second into the chunk, after `delay` seconds."""
+    def __init__(self, delay=0.0):
+        self.audio = []
+        self.delay = delay
+
+    async def detect_activity(self, client, audio=None):
+        self.audio.append(audio)
+        await asyncio.sleep(self.delay)
+        return [{"start": 0.0, "end": 1.0, "confidence": 1.0}]
+
+class FakeASR:
+    def __init__(self):
+        self.audio = []
+
+    async def transcribe(self, client, audio=None):
+        self.audio.append(audio)
+        return {"language": "en", "language_probability": 1.0, "text": "hello", "words": []}
+
+class TestSilenceAtEndOfChunk(unittest.TestCase):
+    def setUp(self):
+        self.client = Client("test_client", 16000, 2)
+        self.websocket = FakeWebsocket()
+        self.vad = FakeVAD()
+        self.asr = FakeASR()
+
+    def chunk(self, seconds=6):
+        return np.full(int(seconds * 16000), 1000, dtype=np.int16).tobytes()
+
+    def test_buffer_converted_once_for_both_stages(self):
+        async def main():
+            self.client.append_audio_data(self.chunk())
+            self.client.process_audio(self.websocket, self.vad, self.asr)
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+        self.assertEqual(len(self.vad.audio), 1)
+        self.assertIs(self.vad.audio[0], self.asr.audio[0])
+        self.assertEqual(self.vad.audio[0].dtype, np.float32)
+        self.assertEqual(self.websocket.sent[0]["text"], "hello")
+
+    def test_slow_chunk_holds_audio_instead_of_exiting(self):
+        self.vad.delay = 0.1
+
+        async def main():
+            for _ in range(2):
+                self.client.append_audio_data(self.chunk())
+                self.client.process_audio(self.websocket, self.vad, self.asr)
+            # The second chunk arrived while the first was processed: it waits in the buffer
+            self.assertEqual(len(self.client.buffer), len(self.chunk()))
+            await asyncio.sleep(0.15)
+            self.client.append_audio_data(self.chunk(0.1))
+            self.client.process_audio(self.websocket, self.vad, self.asr)
+            await asyncio.sleep(0.15)
+
+        asyncio.run(main())
+
+        self.assertEqual([len(audio) for audio in self.vad.audio], [6 * 16000, int(6.1 * 16000)])
+        self.assertEqual(len(self.websocket.sent), 2)
+
+    def test_slow_chunk_exits_when_realtime_is_required(self):
+        self.vad.delay = 0.1
+        self.client.update_config({"processing_args": {"chunk_length_seconds": 5, "chunk_offset_seconds": 0.1,
+                                                       "error_if_not_realtime": True}})
+
+        async def main():
+            self.client.append_audio_data(self.chunk())
+            self.client.process_audio(self.websocket, self.vad, self.asr)
+            self.client.append_audio_data(self.chunk())
+            with self.assertRaises(SystemExit):
+                self.client.process_audio(self.websocket, self.vad, self.asr)
+            await asyncio.sleep(0.15)
+
+        asyncio.run(main())
+
+    def test_failed_chunk_releases_the_client(self):
+        async def broken(client, audio=None):
+            raise RuntimeError("VAD broke")
+        self.vad.detect_activity = broken
+
+        async def main():
+            self.client.append_audio_data(self.chunk())
+            self.client.process_audio(self.websocket, self.vad, self.asr)
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+        self.assertFalse(self.client.buffering_strategy.processing_flag)
+
+if __name__ == '__main__':
+    unittest.main()
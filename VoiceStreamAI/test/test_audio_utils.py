@@ -0,0 +1,38 @@
+# tests/test_audio_utils.py
+
+import unittest
+import os
+import asyncio
+import tempfile
+import wave
+
+import numpy as np
+
+from src.audio_utils import pcm16_to_float32, save_debug_audio
+from src.client import Client
+
+class TestAudioUtils(unittest.TestCase):
+    def test_pcm16_to_float32(self):
+        samples = np.array([0, 16384, -16384, 32767, -32768], dtype=np.int16)
+        buffer = bytearray(samples.tobytes()) + b'\x01'  # a trailing odd byte is ignored
+
+        audio = pcm16_to_float32(buffer)
+
+        self.assertEqual(audio.dtype, np.float32)
+        np.testing.assert_allclose(audio, [0.0, 0.5, -0.5, 32767 / 32768, -1.0])
+        # The client clears its scratch buffer after processing, so no view may be left on it
+        buffer.clear()
+
+    def test_debug_audio_only_when_enabled(self):
+        client = Client("test_client", 16000, 2)
+        client.scratch_buffer = bytearray(np.zeros(1600, dtype=np.int16).tobytes())
+        os.environ.pop('DEBUG_AUDIO_DIR', None)
+        self.assertIsNone(asyncio.run(save_debug_audio(client)))
+
+        with tempfile.TemporaryDirectory() as audio_dir:
+            file_path = asyncio.run(save_debug_audio(client, audio_dir))
+            with wave.open(file_path, 'rb') as wav_file:
+                self.assertEqual(wav_file.getnframes(), 1600)
+
+if __name__ == '__main__':
+    unittest.main()
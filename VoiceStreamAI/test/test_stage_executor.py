@@ -0,0 +1,65 @@
+# tests/test_stage_executor.py
+
+import unittest
+import asyncio
+import time
+
+from src.stage_executor import StageExecutor
+
+class TestStageExecutor(unittest.TestCase):
+    def test_thread_pool_overlaps_calls_and_frees_the_loop(self):
+        executor = StageExecutor("asr", "thread", workers=2)
+        ticks = []
+
+        async def ticker():
+            # Keeps running only if the blocking calls are off the loop
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.02)
+
+        async def main():
+            start = time.perf_counter()
+            results = await asyncio.gather(executor.run(time.sleep, 0.2), executor.run(time.sleep, 0.2), ticker())
+            return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(main())
+        executor.shutdown()
+
+        self.assertEqual(results[:2], [None, None])
+        self.assertLess(elapsed, 0.35)  # two 0.2 s calls overlapped
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.2)
+
+        stats = executor.stats()
+        self.assertEqual((stats["calls"], stats["in_flight"], stats["workers"]), (2, 0, 2))
+        self.assertGreaterEqual(stats["mean_run_seconds"], 0.2)
+        self.assertGreaterEqual(stats["max_seconds"], stats["mean_run_seconds"])
+
+    def test_single_worker_queues_calls(self):
+        executor = StageExecutor("vad", "thread", workers=1)
+
+        async def main():
+            await asyncio.gather(executor.run(time.sleep, 0.1), executor.run(time.sleep, 0.1))
+
+        asyncio.run(main())
+        executor.shutdown()
+        # The second call waited for the first
+        self.assertGreaterEqual(executor.stats()["mean_wait_seconds"], 0.04)
+
+    def test_process_pool(self):
+        executor = StageExecutor("vad", "process", workers=1)
+        self.assertEqual(asyncio.run(executor.run(sum, [1, 2, 3])), 6)
+        executor.shutdown()
+        self.assertEqual(executor.stats()["executor"], "process")
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            StageExecutor("vad", "fiber")
+        executor = StageExecutor("asr")
+        with self.assertRaises(ZeroDivisionError):
+            asyncio.run(executor.run(divmod, 1, 0))
+        executor.shutdown()
+        self.assertEqual(executor.stats()["in_flight"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,15 @@
 from fuzzywuzzy import process
-import io
 import numpy as np
-import scipy.io.wavfile as wavfile
-from scipy.signal import resample
-import soundfile as sf
+import os
 import streamlit as st
 from st_audiorec import st_audiorec
+import sys
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from resampler import resample_wav
+from debug_capture import AudioCapture
 
 st.set_page_config(layout='wide')
 
@@ -27,6 +30,13 @@ def load_processor():
 model = load_model()
 processor = load_processor()
 
+@st.cache_resource
+def load_audio_capture():
+    # Off unless DEBUG_AUDIO_DIR is set
+    return AudioCapture.from_env()
+
+AUDIO_CAPTURE = load_audio_capture()
+
 MACROS = {
     "enterocolitis": "No evidence of a mechanical obstruction. The appearance of the gastrointestinal structures is compatible with enterocolitis. Consider testing for infectious causes in addition to medical management, with fasted abdominal ultrasound or repaeat abdominal radioraphs if clinical signs persist.",
     "open email": "Opening email application...",
@@ -40,15 +50,15 @@ def main():
     st.title('Audio-based Macro Creator')
     st.write('This app uses the OpenAI Whisper model to generate a macro from an audio recording.')
 
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = str(uuid.uuid4())
+
     wav_audio_data = st_audiorec()
 
     if wav_audio_data is not None:
-        input_audio_data, loaded_sample_rate = sf.read(io.BytesIO(wav_audio_data), dtype='float32', always_2d=True)
-        resampling_factor = TARGET_SAMPLE_RATE / loaded_sample_rate
-        resampled_audio_data = resample(input_audio_data, int(len(input_audio_data) * resampling_factor))
-
-        with sf.SoundFile('output_audio.wav', 'w', samplerate=TARGET_SAMPLE_RATE, channels=2) as audio_file:
-            audio_file.write(np.int16(resampled_audio_data))
+        # Mono at TARGET_SAMPLE_RATE, resampled block by block
+        resampled_audio_data, loaded_sample_rate = resample_wav(wav_audio_data, TARGET_SAMPLE_RATE)
+        AUDIO_CAPTURE.capture(st.session_state['session_id'], resampled_audio_data, TARGET_SAMPLE_RATE)
 
         st.audio(wav_audio_data, format='audio/wav')
 
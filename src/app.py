@@ -2,148 +2,311 @@ import asyncio
 import json
 import logging
 import torch
-import uuid
-import base64
-import io
-from datetime import datetime
-from faster_whisper import WhisperModel
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-import numpy as np
-import soundfile as sf
 
-from macro_processor import process_text, MACROS
+from macro_processor import macro_store_for
+from incremental import IncrementalProcessor, compose_diffs
+from transcription_pool import TranscriptionBusy, TranscriptionPool
+from audio_stream import AudioFormatError, AudioSession
+from streaming_transcriber import StreamingTranscriber
+from batch_scheduler import BatchScheduler
+from report_store import ReportStore
+from macro_sync import MacroSync
+from model_pool import ModelPool
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Transcription runs off the event loop, TRANSCRIBE_WORKERS calls at a time
+TRANSCRIBE_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', 2))
+# Calls queued or running before new audio gets a busy reply
+MAX_PENDING_TRANSCRIPTIONS = int(os.environ.get('MAX_PENDING_TRANSCRIPTIONS', 32))
+# Windows from different sessions decoded together; 1 (the default) turns batching off
+TRANSCRIBE_BATCH_SIZE = int(os.environ.get('TRANSCRIBE_BATCH_SIZE', 1))
+# How long the first window of a batch waits for others to join
+TRANSCRIBE_BATCH_WAIT_MS = float(os.environ.get('TRANSCRIBE_BATCH_WAIT_MS', 10))
+# Segmented report log and its id/date index
+REPORTS_DIR = os.environ.get('REPORTS_DIR', 'reports')
+
+# Whisper model, device and precision; by default int8 on CPU and float16 on CUDA
+WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE') or ("cuda" if torch.cuda.is_available() else "cpu")
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL') or ("large-v3" if WHISPER_DEVICE == "cuda" else "base")
+WHISPER_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE')
+# Threads per model replica; 0 splits the cores evenly between the TRANSCRIBE_WORKERS replicas
+WHISPER_CPU_THREADS = int(os.environ.get('WHISPER_CPU_THREADS', 0))
+
+# Loaded and warmed by the lifespan hook, off the event loop
+model_pool = ModelPool(WHISPER_MODEL, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE, TRANSCRIBE_WORKERS,
+                       WHISPER_CPU_THREADS or None)
+# Set once the model is ready; audio that arrives before is held in the ring buffers
+transcriber_model = None
+batch_scheduler = None
+# Each batch slot needs a waiting thread
+transcription_pool = TranscriptionPool(max(TRANSCRIBE_WORKERS, TRANSCRIBE_BATCH_SIZE), MAX_PENDING_TRANSCRIPTIONS)
+
+# Opened by the lifespan hook, so importing the app creates no files
+report_store = None
+# Connected sessions per macro store, for pushing macro edits as deltas
+macro_sync = MacroSync()
 
-# Initialize Whisper model
-model_name = "large-v3" if torch.cuda.is_available() else "base"
-logger.info(f"Initializing Whisper model: {model_name}")
-whisper = WhisperModel(model_name, device="cuda" if torch.cuda.is_available() else "cpu")
-logger.info("Whisper model initialized")
-
-def save_report(text):
-    """Save transcribed text to a JSON file with timestamp and UUID."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_id = str(uuid.uuid4())
-    filename = f"report_{timestamp}_{report_id}.json"
-    with open(filename, 'w') as f:
-        json.dump({
-            "timestamp": timestamp,
-            "id": report_id,
-            "text": text
-        }, f)
-    return filename
-
-def add_or_update_macro(name, text):
+async def save_report(text):
+    """Append a report to the report store without blocking the event loop; returns its id."""
+    record = await report_store.save(text)
+    return record["id"]
+
+def add_or_update_macro(name, text, store=None):
     """Add or update a macro in the MACROS dictionary and save to file."""
-    MACROS[name] = text
-    save_macros()
+    (store or macro_store_for()).set(name, text)
 
-def delete_macro(name):
+def delete_macro(name, store=None):
     """Delete a macro from the MACROS dictionary and save to file."""
-    if name in MACROS:
-        del MACROS[name]
-        save_macros()
+    (store or macro_store_for()).delete(name)
+
+# Decoding options for every stream; the prompt and word timestamps are set per call
+TRANSCRIBE_OPTIONS = dict(
+    language="en",
+    beam_size=1,  # Faster processing
+    best_of=1,    # Faster processing
+    condition_on_previous_text=True  # Better continuous transcription
+)
 
-def save_macros():
-    """Save the MACROS dictionary to a JSON file."""
-    with open('macros.json', 'w') as f:
-        json.dump(MACROS, f)
+async def load_model():
+    """Load and warm the model pool, then put it (batched, if enabled) in service."""
+    global transcriber_model, batch_scheduler
+    try:
+        whisper = await asyncio.to_thread(model_pool.load, **TRANSCRIBE_OPTIONS)
+    except Exception:
+        # Logged by model_pool; /ready keeps answering 503 with the error
+        return
+    if TRANSCRIBE_BATCH_SIZE > 1:
+        # Sessions share batched encoder/decoder passes
+        batch_scheduler = BatchScheduler(whisper, TRANSCRIBE_BATCH_SIZE, TRANSCRIBE_BATCH_WAIT_MS / 1000)
+        transcriber_model = batch_scheduler
+    else:
+        transcriber_model = whisper
 
-# Update the transcribe_audio function in your app.py:
-async def transcribe_audio(audio_data, sample_rate=16000):
+@asynccontextmanager
+async def lifespan(app):
+    global report_store
+    report_store = ReportStore(REPORTS_DIR)
+    # Loaded here rather than at import, so importing the app opens no macro files
+    await asyncio.to_thread(macro_store_for)
+    # Serve /ready and static files while the model loads
+    loading = asyncio.create_task(load_model())
+    yield
+    await loading
+    if batch_scheduler is not None:
+        batch_scheduler.close()
+    transcription_pool.shutdown()
+    # Reports still queued are written and synced before exit
+    report_store.close()
+
+# Initialize FastAPI
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", StaticFiles(directory="static"), name="static")
+
+def transcribe_stream(stream, final=False):
     """
-    Transcribe audio data using Whisper model.
+    Decode the new audio of a stream with Whisper. Blocks; runs on transcription_pool.
     
     Args:
-        audio_data (str): Base64 encoded audio data
-        sample_rate (int): Sample rate of the audio
+        stream (StreamingTranscriber): The connection's streaming state
+        final (bool): Whether the stream ended, so all of its text is final
     
     Returns:
-        str: Transcribed text or None if transcription fails
+        tuple: (committed, pending) text, or None if transcription fails
     """
     try:
-        # Convert base64 to numpy array
-        audio_bytes = base64.b64decode(audio_data)
-        audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-        
-        # Convert to float32 and normalize
-        audio_array = audio_array.astype(np.float32) / 32768.0
-        
-        # Transcribe
-        logger.debug(f"Starting transcription of {len(audio_array)} samples")
-        segments, _ = whisper.transcribe(
-            audio_array,
-            language="en",
-            beam_size=1,  # Faster processing
-            best_of=1,    # Faster processing
-            condition_on_previous_text=True  # Better continuous transcription
-        )
-        
-        # Combine all segments
-        text = " ".join([segment.text for segment in segments])
-        logger.debug(f"Transcription complete: {text}")
-        
-        return text
+        # Decoding happens as the segment generator is consumed, inside decode()
+        return stream.decode(final)
     except Exception as e:
         logger.error(f"Error transcribing audio: {e}", exc_info=True)
         return None
 
+async def transcribe_audio(stream, final=False):
+    """
+    Transcribe a stream's new audio on the worker pool without blocking other connections.
+    
+    Raises:
+        TranscriptionBusy: If the pool stays full for its wait timeout
+    """
+    return await transcription_pool.run(transcribe_stream, stream, final)
+
+@app.get("/ready")
+async def ready():
+    """200 once the model is loaded and warm, 503 before (or if loading failed)."""
+    status = model_pool.stats()
+    if transcriber_model is None:
+        return JSONResponse(status, status_code=503)
+    return status
+
+@app.get("/metrics")
+async def metrics():
+    """Transcription queue depth, timings, batching and model state."""
+    return {
+        "model": model_pool.stats(),
+        "transcription": transcription_pool.stats(),
+        "batching": batch_scheduler.stats() if batch_scheduler else None
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections and messages."""
     await websocket.accept()
     logger.info("WebSocket connection established")
+    # Per-user or per-clinic macro set, e.g. /ws?namespace=clinic-a
+    store = macro_store_for(websocket.query_params.get('namespace'))
+    # Expansion state of this connection's dictation, fed one chunk at a time
+    processor = IncrementalProcessor(store.macros, index=store.index)
+    macro_sync.register(websocket, store)
+    # Audio format and ring buffer of this connection's binary stream
+    audio = AudioSession()
+
+    # Rolling-window transcription state over audio.ring
+    stream = None
+
+    def current_stream():
+        nonlocal stream
+        # A new ring buffer (another sample rate) starts a new stream
+        if stream is None or stream.ring is not audio.ring:
+            stream = StreamingTranscriber(transcriber_model, audio.ring, **TRANSCRIBE_OPTIONS)
+        return stream
+
+    async def send_update(committed, pending, seq=None):
+        committed_diff = processor.commit(committed + ' ') if committed else None
+        diff = processor.set_pending(pending)
+        if committed_diff is not None:
+            # One message for both edits, without re-reading the whole dictation
+            diff = compose_diffs(committed_diff, diff)
+        await websocket.send_json({
+            "start": diff.start,
+            "text": diff.text,
+            "action": "update",
+            "seq": seq
+        })
+
+    async def transcribe_and_send(seq=None, final=False):
+        if transcriber_model is None:
+            # Still warming up; the audio waits in the ring buffer for the first decode
+            await websocket.send_json({
+                "status": "Model loading, transcription delayed",
+                "busy": True,
+                "seq": seq
+            })
+            return
+        # The window is read from the ring buffer; nothing else is written
+        # to it until this returns, as messages are handled in turn
+        transcriber = current_stream()
+        previous_pending = transcriber.pending_text
+        try:
+            result = await transcribe_audio(transcriber, final)
+        except TranscriptionBusy as e:
+            # The audio stays in the ring buffer and goes into the next decode
+            logger.warning(f"Transcription delayed: {e}")
+            await websocket.send_json({
+                "status": "Server busy, transcription delayed",
+                "busy": True,
+                "seq": seq
+            })
+            return
+        if result is None:
+            return
+        committed, pending = result
+        if committed or pending != previous_pending:
+            await send_update(committed, pending, seq)
     
     try:
         while True:
             try:
-                data = await websocket.receive_text()
-                action = json.loads(data)
-                logger.info(f"Received action: {action}")
-
-                if action['action'] == 'process_audio':
-                    audio_data = action['audio_data']
-                    sample_rate = action.get('sample_rate', 16000)
-                    text = await transcribe_audio(audio_data, sample_rate)
-                    if text:
-                        processed_text = process_text(text, MACROS)
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                # Pick up macro edits from other workers (rate limited)
+                if store.refresh():
+                    await macro_sync.publish(store)
+
+                if message.get("bytes") is not None:
+                    # Raw PCM frame in the format of the last audio_header
+                    try:
+                        seq, _ = audio.write_frame(message["bytes"])
+                    except AudioFormatError as e:
+                        logger.error(f"Rejected audio frame: {e}")
                         await websocket.send_json({
-                            "text": processed_text,
-                            "action": "update"
+                            "status": f"Error: {e}"
                         })
+                        continue
+                    await transcribe_and_send(seq)
+                    continue
+
+                action = json.loads(message["text"])
+                logger.info(f"Received action: {action.get('action')}")
+
+                if action['action'] == 'audio_header':
+                    try:
+                        audio.start(action)
+                    except AudioFormatError as e:
+                        await websocket.send_json({
+                            "status": f"Error: {e}"
+                        })
+                        continue
+                    await websocket.send_json({
+                        "status": "Audio stream started",
+                        "session": audio.session_id,
+                        "seq": audio.seq
+                    })
+
+                elif action['action'] == 'process_audio':
+                    # JSON fallback for clients that send base64 int16
+                    audio.write_base64(action['audio_data'], action.get('sample_rate', 16000))
+                    await transcribe_and_send()
+
+                elif action['action'] == 'end_audio':
+                    # Recording stopped: decode what is left and make it final
+                    if stream is not None:
+                        audio.flush()
+                        await transcribe_and_send(final=True)
+
+                elif action['action'] == 'reset':
+                    processor.reset()
+                    if stream is not None:
+                        stream.reset()
+                    await websocket.send_json({
+                        "status": "Transcription reset"
+                    })
                 
                 elif action['action'] == 'save_report':
-                    filename = save_report(action['text'])
+                    report_id = await save_report(action['text'])
                     await websocket.send_json({
-                        "status": f"Report saved as {filename}"
+                        "status": f"Report saved as {report_id}",
+                        "report_id": report_id
                     })
                 
                 elif action['action'] == 'add_macro':
-                    add_or_update_macro(action['name'], action['text'])
+                    add_or_update_macro(action['name'], action['text'], store)
                     await websocket.send_json({
-                        "status": f"Macro '{action['name']}' added/updated",
-                        "macros": MACROS
+                        "status": f"Macro '{action['name']}' added/updated"
                     })
+                    # Every session of this macro set gets the change as a delta
+                    await macro_sync.publish(store)
                 
                 elif action['action'] == 'delete_macro':
-                    delete_macro(action['name'])
+                    delete_macro(action['name'], store)
                     await websocket.send_json({
-                        "status": f"Macro '{action['name']}' deleted",
-                        "macros": MACROS
+                        "status": f"Macro '{action['name']}' deleted"
                     })
+                    await macro_sync.publish(store)
                 
                 elif action['action'] == 'get_macros':
-                    await websocket.send_json({
-                        "macros": MACROS
-                    })
+                    # Only the keys changed since the client's last version, if it sent one
+                    await macro_sync.send(websocket, action.get('version'))
+
+            except WebSocketDisconnect:
+                raise
 
             except json.JSONDecodeError as e:
                 logger.error(f"Invalid JSON received: {e}")
@@ -162,6 +325,7 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"Error in WebSocket: {e}", exc_info=True)
     finally:
+        macro_sync.unregister(websocket)
         logger.info("WebSocket connection closed")
 
 if __name__ == "__main__":
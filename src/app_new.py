@@ -9,7 +9,7 @@ from RealtimeSTT import AudioToTextRecorder
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from macro_processor import process_text, MACROS
+from macro_processor import process_text, MACROS, MACRO_STORE
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -64,17 +64,10 @@ def save_report(text):
     return filename
 
 def add_or_update_macro(name, text):
-    MACROS[name] = text
-    save_macros()
+    MACRO_STORE.set(name, text)
 
 def delete_macro(name):
-    if name in MACROS:
-        del MACROS[name]
-        save_macros()
-
-def save_macros():
-    with open('macros.json', 'w') as f:
-        json.dump(MACROS, f)
+    MACRO_STORE.delete(name)
 
 # Initialize recorder
 recorder_initialized = initialize_recorder()
@@ -108,6 +101,8 @@ async def websocket_endpoint(websocket: WebSocket):
     
     try:
         while True:
+            # Pick up macro edits from other workers (rate limited)
+            MACRO_STORE.refresh()
             try:
                 # Handle both text messages and binary (audio) data
                 message = await asyncio.wait_for(websocket.receive(), timeout=0.5)
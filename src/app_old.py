@@ -8,7 +8,7 @@ from RealtimeSTT import AudioToTextRecorder
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 
-from macro_processor import process_text, MACROS
+from macro_processor import process_text, MACROS, MACRO_STORE
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -53,17 +53,10 @@ def save_report(text):
     return filename
 
 def add_or_update_macro(name, text):
-    MACROS[name] = text
-    save_macros()
+    MACRO_STORE.set(name, text)
 
 def delete_macro(name):
-    if name in MACROS:
-        del MACROS[name]
-        save_macros()
-
-def save_macros():
-    with open('macros.json', 'w') as f:
-        json.dump(MACROS, f)
+    MACRO_STORE.delete(name)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -73,6 +66,8 @@ async def websocket_endpoint(websocket: WebSocket):
     last_sent_transcription = ""
     try:
         while True:
+            # Pick up macro edits from other workers (rate limited)
+            MACRO_STORE.refresh()
             try:
                 data = await asyncio.wait_for(websocket.receive_text(), timeout=0.5)
                 action = json.loads(data)
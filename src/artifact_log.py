@@ -0,0 +1,216 @@
+"""
+Append-only log of saved transcriptions for evaluation.
+
+The Save button used to build a one-row pandas DataFrame and append it to
+artifacts/transcriptions.tsv (no header, multi-line texts quoted across
+lines), and write the recording next to it as an uncompressed
+artifacts/audio/<id>.wav. ArtifactLog appends each save to one SQLite
+database instead (artifacts/transcriptions.sqlite):
+
+    - transcriptions: id (primary key), timestamp, model and the raw,
+      final and user-edited texts, indexed by timestamp and model
+    - audio: the recording by id, as FLAC when soundfile is installed
+
+The audio lives in its own table, so reading every text for a bulk
+evaluation does not page through the recordings. An existing TSV and its
+audio directory are imported with
+
+    python artifact_log.py import artifacts/transcriptions.tsv --audio artifacts/audio
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = 'artifacts'
+DB_NAME = 'transcriptions.sqlite'
+# Rows read from the database at a time by records()
+FETCH_SIZE = 1024
+# Sample formats FLAC stores losslessly; anything else is stored at 24 bits
+FLAC_SUBTYPES = ('PCM_S8', 'PCM_16', 'PCM_24')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcriptions (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    model TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    final TEXT NOT NULL,
+    edited TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcriptions_timestamp ON transcriptions (timestamp);
+CREATE INDEX IF NOT EXISTS transcriptions_model ON transcriptions (model, timestamp);
+CREATE TABLE IF NOT EXISTS audio (
+    id TEXT PRIMARY KEY REFERENCES transcriptions (id),
+    format TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+def encode_audio(wav_audio_data):
+    """(format, bytes) to store for WAV bytes: FLAC if soundfile is installed, else the WAV as is."""
+    if sf is None:
+        return 'wav', bytes(wav_audio_data)
+    info = sf.info(io.BytesIO(wav_audio_data))
+    if info.subtype in FLAC_SUBTYPES:
+        # Integer samples round-trip exactly
+        audio, sample_rate = sf.read(io.BytesIO(wav_audio_data), dtype='int32', always_2d=True)
+        subtype = info.subtype
+    else:
+        audio, sample_rate = sf.read(io.BytesIO(wav_audio_data), dtype='float32', always_2d=True)
+        subtype = 'PCM_24'
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='FLAC', subtype=subtype)
+    return 'flac', buffer.getvalue()
+
+
+class ArtifactLog:
+    """Appends saved transcriptions and their audio; reads them back by id or in bulk."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, db_name=DB_NAME):
+        self.directory = directory
+        self.path = os.path.join(directory, db_name)
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self, create=False):
+        """The database, opened on first use; None if it does not exist yet and `create` is false."""
+        if self._db is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            # Only the first save creates the directory, not opening the log
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    @classmethod
+    def from_env(cls):
+        """The log under ARTIFACTS_DIR (default ./artifacts)."""
+        return cls(os.environ.get('ARTIFACTS_DIR', DEFAULT_DIRECTORY))
+
+    def save(self, raw, final, edited, model, wav_audio_data=None, id=None, timestamp=None):
+        """Append one transcription and, if given, its WAV recording. Returns its id."""
+        id = str(id or uuid.uuid4())
+        timestamp = timestamp or datetime.now().isoformat(sep=' ')
+        # Encoded before taking the lock, so concurrent saves only wait for the insert
+        audio = encode_audio(wav_audio_data) if wav_audio_data is not None else None
+        with self._lock:
+            db = self._connect(create=True)
+            with db:
+                db.execute("INSERT INTO transcriptions (id, timestamp, model, raw, final, edited) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (id, str(timestamp), model, raw, final, edited))
+                if audio is not None:
+                    db.execute("INSERT INTO audio (id, format, data) VALUES (?, ?, ?)", (id, *audio))
+        return id
+
+    def get(self, id):
+        """The transcription with `id` as a dict, without its audio, or None."""
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            cursor = db.execute("SELECT * FROM transcriptions WHERE id = ?", (str(id),))
+            row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def records(self, model=None, since=None):
+        """Yield every transcription, oldest first, optionally only `model`'s or from timestamp `since` on."""
+        query, conditions, params = "SELECT * FROM transcriptions", [], []
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(str(since))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            cursor = db.execute(query + " ORDER BY timestamp", params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            # The lock is only held per batch, so saves are not blocked while the caller iterates
+            with self._lock:
+                rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def audio(self, id):
+        """(format, bytes) of the recording saved with `id`, or None."""
+        with self._lock:
+            db = self._connect()
+            return db.execute("SELECT format, data FROM audio WHERE id = ?", (str(id),)).fetchone() if db else None
+
+    def __len__(self):
+        with self._lock:
+            db = self._connect()
+            return db.execute("SELECT COUNT(*) FROM transcriptions").fetchone()[0] if db else 0
+
+    def import_tsv(self, tsv_path, audio_directory=None):
+        """
+        Import the rows of the old transcriptions.tsv (pandas index, id,
+        raw, final, edited, model, timestamp) and their <id>.wav files.
+        Rows already in the log are skipped. Returns the number imported.
+        """
+        imported = 0
+        csv.field_size_limit(sys.maxsize)
+        with open(tsv_path, 'r', newline='') as f:
+            for row in csv.reader(f, delimiter='\t'):
+                if len(row) != 7:
+                    logger.warning(f"Skipping malformed row in {tsv_path}: {row[:2]}")
+                    continue
+                _, id, raw, final, edited, model, timestamp = row
+                if self.get(id) is not None:
+                    continue
+                wav_audio_data = None
+                wav_path = os.path.join(audio_directory, f"{id}.wav") if audio_directory else None
+                if wav_path and os.path.exists(wav_path):
+                    with open(wav_path, 'rb') as audio_file:
+                        wav_audio_data = audio_file.read()
+                self.save(raw, final, edited, model, wav_audio_data, id, timestamp)
+                imported += 1
+        return imported
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the old transcriptions.tsv into the artifact log.")
+    parser.add_argument('command', choices=['import'])
+    parser.add_argument('tsv_path', help="transcriptions.tsv to import")
+    parser.add_argument('--audio', help="Directory of <id>.wav recordings to import with it")
+    parser.add_argument('--dir', default=os.environ.get('ARTIFACTS_DIR', DEFAULT_DIRECTORY), help="Artifact log directory")
+    args = parser.parse_args(argv)
+
+    log = ArtifactLog(args.dir)
+    imported = log.import_tsv(args.tsv_path, args.audio)
+    print(f"Imported {imported} transcriptions ({len(log)} total)")
+    log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Binary audio frames for the /ws websocket.
+
+A client announces its stream with one small JSON header,
+
+    {"action": "audio_header", "session": "...", "sample_rate": 48000, "format": "float32", "seq": 0}
+
+and then sends raw little-endian PCM ("int16" or "float32") as binary
+websocket frames, numbered from the header's seq up. Each frame is viewed
+with np.frombuffer, without a copy, and written straight into the
+session's preallocated float32 AudioRingBuffer. int16 is scaled to
+[-1, 1) as it is written, so no intermediate arrays are allocated.
+
+The ring always holds 16 kHz audio, the rate Whisper and the stream
+positions of StreamingTranscriber assume. Streams at another rate (a
+browser's audioContext.sampleRate is usually 44.1 or 48 kHz) go through a
+StreamingResampler on their way in; only those frames are copied.
+
+Old clients that send base64 int16 inside JSON go through write_base64,
+which lands in the same ring buffer.
+"""
+import base64
+import logging
+
+import numpy as np
+
+from resampler import WHISPER_SAMPLE_RATE, StreamingResampler
+
+logger = logging.getLogger(__name__)
+
+# Wire formats: numpy dtype and the scale to [-1, 1)
+FORMATS = {
+    'int16': (np.dtype('<i2'), np.float32(1 / 32768)),
+    'float32': (np.dtype('<f4'), None),
+}
+# Seconds of audio each session's ring buffer holds
+RING_SECONDS = 30
+
+
+class AudioFormatError(ValueError):
+    """Raised for a malformed header or a frame that does not match it."""
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size float32 buffer of the most recent samples.
+
+    Positions are absolute sample counts since the stream started, so a
+    reader can ask for a range without tracking where the buffer wrapped.
+    """
+
+    def __init__(self, capacity, sample_rate=WHISPER_SAMPLE_RATE):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.written = 0
+        self._data = np.zeros(capacity, dtype=np.float32)
+
+    def write(self, samples, scale=None):
+        """Append 1-D `samples`, multiplied by `scale` if given, overwriting the oldest."""
+        count = len(samples)
+        if count > self.capacity:
+            # Only the newest capacity samples can be kept anyway
+            self.written += count - self.capacity
+            samples = samples[-self.capacity:]
+            count = self.capacity
+        start = self.written % self.capacity
+        first = min(count, self.capacity - start)
+        self._copy(samples[:first], self._data[start:start + first], scale)
+        self._copy(samples[first:], self._data[:count - first], scale)
+        self.written += count
+
+    @staticmethod
+    def _copy(source, target, scale):
+        if scale is None:
+            np.copyto(target, source, casting='same_kind')
+        else:
+            np.multiply(source, scale, out=target, dtype=np.float32)
+
+    def read(self, start, end=None):
+        """
+        Samples from absolute position `start` to `end` (default: the newest).
+
+        Returns a view into the buffer unless the range wraps around its end;
+        a view is only valid until the next write.
+        """
+        end = self.written if end is None else end
+        if not self.written - self.capacity <= start <= end <= self.written:
+            raise ValueError(f"Samples {start}-{end} are not in the buffer (holds up to {self.written})")
+        offset = start % self.capacity
+        stop = offset + end - start
+        if stop <= self.capacity:
+            return self._data[offset:stop]
+        return np.concatenate((self._data[offset:], self._data[:stop - self.capacity]))
+
+
+class AudioSession:
+    """Audio stream state of one websocket: the announced format and its ring buffer."""
+
+    def __init__(self, ring_seconds=RING_SECONDS):
+        self.ring_seconds = ring_seconds
+        self.session_id = None
+        self.sample_rate = None
+        self.format = None
+        self.seq = None
+        self.ring = None
+        self._resampler = None
+
+    def _open(self, sample_rate):
+        """A new ring (and a new stream) for audio arriving at `sample_rate`."""
+        self.ring = AudioRingBuffer(self.ring_seconds * WHISPER_SAMPLE_RATE)
+        self._resampler = StreamingResampler(sample_rate) if sample_rate != WHISPER_SAMPLE_RATE else None
+        self.sample_rate = sample_rate
+
+    def start(self, header):
+        """Apply an audio_header message. Following binary frames use its format."""
+        audio_format = header.get('format', 'int16')
+        if audio_format not in FORMATS:
+            raise AudioFormatError(f"Unknown audio format: {audio_format}")
+        try:
+            sample_rate = int(header['sample_rate'])
+            seq = int(header.get('seq', 0))
+        except (KeyError, TypeError, ValueError):
+            raise AudioFormatError("audio_header needs an integer sample_rate and seq") from None
+        if sample_rate <= 0:
+            raise AudioFormatError(f"Invalid sample rate: {sample_rate}")
+
+        if self.ring is None or sample_rate != self.sample_rate:
+            self._open(sample_rate)
+        self.session_id = header.get('session', self.session_id)
+        self.sample_rate = sample_rate
+        self.format = audio_format
+        self.seq = seq
+        logger.debug(f"Audio stream {self.session_id}: {audio_format} at {sample_rate}Hz from seq {seq}")
+
+    def _write(self, data, audio_format):
+        dtype, scale = FORMATS[audio_format]
+        if len(data) % dtype.itemsize:
+            raise AudioFormatError(f"{len(data)} bytes is not a whole number of {audio_format} samples")
+        start = self.ring.written
+        samples = np.frombuffer(data, dtype=dtype)
+        if self._resampler is None:
+            self.ring.write(samples, scale)
+        else:
+            self.ring.write(self._resampler.process(samples * scale if scale is not None else samples))
+        return self.ring.read(max(start, self.ring.written - self.ring.capacity))
+
+    def flush(self):
+        """Write the resampler's held-back tail when the stream ends; a no-op for 16 kHz streams."""
+        if self._resampler is not None:
+            self.ring.write(self._resampler.flush())
+            self._resampler = StreamingResampler(self.sample_rate)
+
+    def write_frame(self, frame):
+        """
+        Write one binary PCM frame. Returns (seq, samples), `samples` being
+        the frame as float32, usually a view into the ring buffer.
+        """
+        if self.format is None:
+            raise AudioFormatError("Binary audio received before an audio_header")
+        samples = self._write(frame, self.format)
+        seq = self.seq
+        self.seq += 1
+        return seq, samples
+
+    def write_base64(self, audio_data, sample_rate=16000):
+        """Write a base64 int16 chunk from the JSON protocol and return it as float32."""
+        if self.ring is None or sample_rate != self.sample_rate:
+            self._open(sample_rate)
+        return self._write(base64.b64decode(audio_data), 'int16')
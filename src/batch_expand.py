@@ -0,0 +1,174 @@
+"""
+Expand macros over an archive of raw transcriptions.
+
+Reads a JSONL file (one object per line), the artifacts/transcriptions.sqlite
+log written by transcription_w_macro_app.py, or a TSV file such as the
+artifacts/transcriptions.tsv log it wrote before,
+runs process_text over every row across a process pool and streams the
+results out as JSONL, in input order.
+
+Example, from `src/`:
+    python batch_expand.py ../artifacts/transcriptions.sqlite -o expanded.jsonl
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from itertools import islice
+from multiprocessing import Pool
+
+from artifact_log import ArtifactLog
+from macro_engine import POLICIES, process_text
+from macro_store import MacroStore
+
+logger = logging.getLogger(__name__)
+
+# Column layout of artifacts/transcriptions.tsv: the DataFrame index is written first
+TSV_ID_COLUMN = 1
+TSV_TEXT_COLUMN = 2
+
+# Chunks read ahead per worker, so huge inputs are not queued up all at once
+READ_AHEAD_CHUNKS = 4
+
+# Per-worker state, loaded once by _init_worker
+_macros = None
+_index = None
+_policy = None
+
+
+def read_jsonl(path, id_field='id', text_field='text'):
+    """Yield (id, text) pairs from a JSONL file."""
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record.get(id_field, line_number), record[text_field]
+
+
+def read_tsv(path, id_column=TSV_ID_COLUMN, text_column=TSV_TEXT_COLUMN):
+    """Yield (id, text) pairs from a TSV file, honouring quoted multi-line fields."""
+    csv.field_size_limit(sys.maxsize)
+    with open(path, 'r', newline='') as f:
+        for row_number, row in enumerate(csv.reader(f, delimiter='\t')):
+            if len(row) <= text_column:
+                logger.warning(f"Skipping short row {row_number} in {path}")
+                continue
+            yield row[id_column] if id_column is not None else row_number, row[text_column]
+
+
+def read_artifact_log(path, model=None):
+    """Yield (id, raw text) pairs from an artifact log database, oldest first."""
+    log = ArtifactLog(os.path.dirname(os.path.abspath(path)), os.path.basename(path))
+    try:
+        for record in log.records(model=model):
+            yield record['id'], record['raw']
+    finally:
+        log.close()
+
+
+def infer_format(path):
+    """Guess the input format from the file extension."""
+    if path.endswith(('.sqlite', '.db')):
+        return 'sqlite'
+    return 'tsv' if path.endswith(('.tsv', '.txt')) else 'jsonl'
+
+
+def _init_worker(macros_path, policy_name):
+    """Load the macros and build their index once per worker process."""
+    global _macros, _index, _policy
+    store = MacroStore(macros_path)
+    _macros, _index = store.macros, store.index
+    _policy = POLICIES[policy_name]
+
+
+def _expand(chunk):
+    return [{"id": record_id, "raw": text, "text": process_text(text, _macros, index=_index, policy=_policy)}
+            for record_id, text in chunk]
+
+
+def expand_records(records, macros_path='macros.json', processes=None, chunksize=256, policy='server'):
+    """
+    Expand macros for an iterable of (id, text) pairs.
+
+    Args:
+        records (iterable): (id, raw transcription) pairs, consumed lazily
+        macros_path (str): Path to the macros.json to expand with
+        processes (int): Number of worker processes, defaults to the CPU count
+        chunksize (int): Records sent to a worker at a time
+        policy (str): Trigger policy name from macro_engine.POLICIES
+
+    Yields:
+        dict: {"id", "raw", "text"} for each record, in input order
+    """
+    processes = processes or os.cpu_count()
+    records = iter(records)
+    # Pool.imap drains its input eagerly, so each chunk waits for a free slot
+    # and a slot is freed as each chunk's results come back
+    slots = threading.Semaphore(processes * READ_AHEAD_CHUNKS)
+    stopped = threading.Event()
+
+    def chunks():
+        while True:
+            slots.acquire()
+            chunk = [] if stopped.is_set() else list(islice(records, chunksize))
+            if not chunk:
+                return
+            yield chunk
+
+    with Pool(processes, initializer=_init_worker, initargs=(macros_path, policy)) as pool:
+        try:
+            for results in pool.imap(_expand, chunks()):
+                slots.release()
+                yield from results
+        finally:
+            # Wake the feeder if the caller stopped early, so the pool can shut down
+            stopped.set()
+            slots.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expand macros over a file of raw transcriptions.")
+    parser.add_argument('input', help="JSONL, TSV or artifact log (.sqlite) file of raw transcriptions")
+    parser.add_argument('--output', '-o', default='-', help="Output JSONL path, '-' for stdout")
+    parser.add_argument('--macros', '-m', default='macros.json', help="Path to macros.json")
+    parser.add_argument('--format', '-f', choices=['jsonl', 'tsv', 'sqlite'], default=None,
+                        help="Input format, inferred from the extension by default")
+    parser.add_argument('--id-field', default='id', help="JSONL field holding the record id")
+    parser.add_argument('--text-field', default='text', help="JSONL field holding the raw transcription")
+    parser.add_argument('--id-column', type=int, default=TSV_ID_COLUMN, help="TSV column holding the record id")
+    parser.add_argument('--text-column', type=int, default=TSV_TEXT_COLUMN,
+                        help="TSV column holding the raw transcription")
+    parser.add_argument('--model', default=None, help="Only the artifact log's transcriptions by this model")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='server',
+                        help="Trigger rules to expand with, e.g. 'transcription' for the Streamlit app's archive")
+    parser.add_argument('--processes', '-p', type=int, default=None, help="Worker processes, defaults to CPU count")
+    parser.add_argument('--chunksize', type=int, default=256, help="Records sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    input_format = args.format or infer_format(args.input)
+    if input_format == 'sqlite':
+        records = read_artifact_log(args.input, args.model)
+    elif input_format == 'tsv':
+        records = read_tsv(args.input, args.id_column, args.text_column)
+    else:
+        records = read_jsonl(args.input, args.id_field, args.text_field)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        count = 0
+        for result in expand_records(records, args.macros, args.processes, args.chunksize, args.policy):
+            out.write(json.dumps(result) + '\n')
+            count += 1
+        logger.info(f"Expanded {count} transcriptions")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
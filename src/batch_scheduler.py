@@ -0,0 +1,411 @@
+"""
+Cross-session batching for faster-whisper.
+
+Each websocket session decodes its own short window, so with one shared
+model the CTranslate2 encoder and decoder run once per session per chunk,
+each call with a batch of one. BatchScheduler stands in for the model in
+StreamingTranscriber: transcribe() calls from the worker threads are
+collected for up to max_wait seconds (or until max_batch_size arrive),
+and WhisperBatchDecoder runs one stacked encoder pass, one generate call
+and one alignment pass for all of them. The results are routed back to
+the calling threads.
+
+Only single-window (<= 30 s) greedy or beam decodes at temperature 0 are
+batched. Other calls go straight to model.transcribe. So does any window
+whose batched result would have needed faster-whisper's temperature
+fallback, or whose tokens end in an unfinished segment (model.transcribe
+seeks to its last timestamp and decodes the rest again).
+
+Prompt building, punctuation merging, word alignment and segment splitting
+follow faster-whisper's transcribe.py as of FASTER_WHISPER_VERSION, the
+version pinned in requirements.txt. With any other version installed,
+every window is decoded alone. tests/test_batch_scheduler.py compares the
+batched output with model.transcribe when faster-whisper and a model are
+available.
+"""
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+
+try:
+    import ctranslate2
+    from faster_whisper import __version__ as faster_whisper_version
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_suppressed_tokens, merge_punctuations
+except ImportError:
+    ctranslate2 = None
+
+logger = logging.getLogger(__name__)
+
+# faster-whisper release whose transcribe() internals WhisperBatchDecoder reproduces
+FASTER_WHISPER_VERSION = '1.0.3'
+
+# transcribe() options the batched path understands; any other option is decoded alone
+BATCHABLE_OPTIONS = {'language', 'task', 'beam_size', 'best_of', 'condition_on_previous_text',
+                     'initial_prompt', 'word_timestamps'}
+# faster-whisper's defaults for deciding that a decode needs temperature fallback
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOG_PROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+BatchWord = namedtuple('BatchWord', ['start', 'end', 'word', 'probability'])
+BatchSegment = namedtuple('BatchSegment', ['start', 'end', 'text', 'tokens', 'words', 'avg_logprob', 'no_speech_prob'])
+BatchInfo = namedtuple('BatchInfo', ['language', 'language_probability', 'duration'])
+
+# Marks a request the batch could not settle; the caller decodes it alone
+FALLBACK = object()
+
+
+class _Request:
+    def __init__(self, audio, options):
+        self.audio = audio
+        self.options = options
+        self.future = Future()
+
+    @property
+    def group(self):
+        """Requests decoded in one batch must share these options."""
+        return (self.options.get('language'), self.options.get('task', 'transcribe'),
+                self.options.get('beam_size', 5), bool(self.options.get('word_timestamps')))
+
+
+def compression_ratio(text):
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+class WhisperBatchDecoder:
+    """One encoder, decoder and alignment pass over several windows of one faster-whisper model."""
+
+    def __init__(self, model):
+        if ctranslate2 is None:
+            raise ImportError("Batched decoding needs faster-whisper and ctranslate2")
+        self.model = model
+        # Other releases may segment or time words differently, so nothing is batched with them
+        self.enabled = faster_whisper_version == FASTER_WHISPER_VERSION
+        if not self.enabled:
+            logger.warning(f"Batched decoding follows faster-whisper {FASTER_WHISPER_VERSION}, "
+                           f"{faster_whisper_version} is installed; decoding every window alone")
+        self.extractor = model.feature_extractor
+        self.max_samples = self.extractor.nb_max_frames * self.extractor.hop_length
+        self._tokenizers = {}
+
+    def accepts(self, request):
+        """Whether the batched path can decode this request like model.transcribe would."""
+        return (self.enabled
+                and len(request.audio) <= self.max_samples
+                and set(request.options) <= BATCHABLE_OPTIONS
+                and (request.options.get('language') is not None or not self.model.model.is_multilingual))
+
+    def _tokenizer(self, language, task):
+        key = (language, task)
+        if key not in self._tokenizers:
+            self._tokenizers[key] = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                                              task=task, language=language or 'en')
+        return self._tokenizers[key]
+
+    def _prompt(self, tokenizer, initial_prompt):
+        if initial_prompt is None:
+            previous = []
+        elif isinstance(initial_prompt, str):
+            previous = tokenizer.encode(' ' + initial_prompt.strip())
+        else:
+            previous = list(initial_prompt)
+        return self.model.get_prompt(tokenizer, previous)
+
+    def _features(self, audio):
+        frames = len(audio) // self.extractor.hop_length
+        features = self.extractor(audio)[:, :frames]
+        padding = self.extractor.nb_max_frames - features.shape[-1]
+        return np.pad(features, ((0, 0), (0, padding))) if padding > 0 else features, frames
+
+    def decode(self, requests):
+        """Decode requests sharing one group. Returns (segments, info) or FALLBACK for each."""
+        language, task, beam_size, word_timestamps = requests[0].group
+        tokenizer = self._tokenizer(language, task)
+        model = self.model
+
+        features, num_frames = zip(*(self._features(request.audio) for request in requests))
+        to_cpu = model.model.device == 'cuda' and len(model.model.device_index) > 1
+        encoder_output = model.model.encode(
+            ctranslate2.StorageView.from_array(np.ascontiguousarray(np.stack(features), dtype=np.float32)),
+            to_cpu=to_cpu)
+        results = model.model.generate(
+            encoder_output,
+            [self._prompt(tokenizer, request.options.get('initial_prompt')) for request in requests],
+            beam_size=beam_size,
+            max_length=model.max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+            max_initial_timestamp_index=int(round(1.0 / model.time_precision)),
+        )
+
+        decoded = []
+        for request, frames, result in zip(requests, num_frames, results):
+            tokens = result.sequences_ids[0]
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            duration = frames * self.extractor.time_per_frame
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+                decoded.append([])
+            elif (avg_logprob < LOG_PROB_THRESHOLD
+                  or compression_ratio(tokenizer.decode(tokens).strip()) > COMPRESSION_RATIO_THRESHOLD):
+                decoded.append(None)
+            else:
+                decoded.append(self._split_segments(tokenizer, tokens, duration, avg_logprob, result.no_speech_prob))
+
+        if word_timestamps:
+            self._add_words(tokenizer, encoder_output, num_frames, decoded)
+
+        outputs = []
+        for request, segments in zip(requests, decoded):
+            if segments is None:
+                outputs.append(FALLBACK)
+                continue
+            info = BatchInfo(language or 'en', 1.0, len(request.audio) / self.extractor.sampling_rate)
+            # As model.transcribe: empty and zero-length segments are not returned
+            outputs.append(([BatchSegment(**segment) for segment in segments
+                             if segment['start'] != segment['end'] and tokenizer.decode(segment['tokens']).strip()],
+                            info))
+        return outputs
+
+    def _split_segments(self, tokenizer, tokens, duration, avg_logprob, no_speech_prob):
+        """
+        Cut the tokens of one window into segments at its timestamp tokens, as
+        model.transcribe does. Returns None when the tokens end in an unfinished
+        segment: model.transcribe would seek to its last timestamp and decode the
+        rest of the window again, which one batched pass cannot do.
+        """
+        begin = tokenizer.timestamp_begin
+        precision = self.model.time_precision
+        single_timestamp_ending = len(tokens) >= 2 and tokens[-2] < begin <= tokens[-1]
+        boundaries = [i for i in range(1, len(tokens)) if tokens[i] >= begin and tokens[i - 1] >= begin]
+
+        pieces = []
+        if boundaries:
+            if not single_timestamp_ending:
+                return None
+            boundaries.append(len(tokens))
+            last = 0
+            for boundary in boundaries:
+                pieces.append((tokens[last:boundary], (tokens[last] - begin) * precision,
+                               (tokens[boundary - 1] - begin) * precision))
+                last = boundary
+        else:
+            timestamps = [token for token in tokens if token >= begin]
+            end = duration
+            if timestamps and timestamps[-1] != begin:
+                end = (timestamps[-1] - begin) * precision
+            pieces.append((tokens, 0.0, end))
+
+        return [dict(start=start, end=end, text=tokenizer.decode(piece), tokens=piece, words=None,
+                     avg_logprob=avg_logprob, no_speech_prob=no_speech_prob)
+                for piece, start, end in pieces]
+
+    def _add_words(self, tokenizer, encoder_output, num_frames, decoded):
+        """Word timings for every decoded window from one batched alignment pass."""
+        segment_tokens = [[[token for token in segment['tokens'] if token < tokenizer.eot] for segment in segments]
+                          if segments else [] for segments in decoded]
+        text_tokens = [[token for tokens in window for token in tokens] for window in segment_tokens]
+        # Every window of the encoder batch has to be aligned; empty ones get a lone end of text
+        alignments = self.model.model.align(encoder_output, tokenizer.sot_sequence,
+                                            [tokens or [tokenizer.eot] for tokens in text_tokens],
+                                            list(num_frames), median_filter_width=7)
+        for segments, window_tokens, tokens, alignment in zip(decoded, segment_tokens, text_tokens, alignments):
+            if segments:
+                words = self._word_timings(tokenizer, tokens, alignment) if tokens else []
+                self._assign_words(segments, window_tokens, words)
+
+    @staticmethod
+    def _assign_words(segments, segment_tokens, alignment):
+        """
+        Split a window's word timings between its segments, with the duration
+        clamping and boundary fixes of faster-whisper's add_word_timestamps.
+        """
+        word_durations = np.array([word['end'] - word['start'] for word in alignment])
+        word_durations = word_durations[word_durations.nonzero()]
+        median_duration = min(0.7, float(np.median(word_durations))) if len(word_durations) > 0 else 0.0
+        max_duration = median_duration * 2
+
+        # Words at sentence boundaries are not longer than twice the median word duration
+        if len(word_durations) > 0:
+            sentence_end_marks = ".。!！?？"
+            for i in range(1, len(alignment)):
+                if alignment[i]['end'] - alignment[i]['start'] > max_duration:
+                    if alignment[i]['word'] in sentence_end_marks:
+                        alignment[i]['end'] = alignment[i]['start'] + max_duration
+                    elif alignment[i - 1]['word'] in sentence_end_marks:
+                        alignment[i]['start'] = alignment[i]['end'] - max_duration
+
+        merge_punctuations(alignment, PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS)
+
+        # A single window decoded from its start: no earlier speech, no time offset
+        last_speech_timestamp = 0.0
+        word_index = 0
+        for segment, tokens in zip(segments, segment_tokens):
+            saved, words = 0, []
+            while word_index < len(alignment) and saved < len(tokens):
+                timing = alignment[word_index]
+                if timing['word']:
+                    words.append(dict(word=timing['word'], start=round(timing['start'], 2),
+                                      end=round(timing['end'], 2), probability=timing['probability']))
+                saved += len(timing['tokens'])
+                word_index += 1
+
+            if words:
+                # The first and second word after a pause are not longer than twice the median
+                if words[0]['end'] - last_speech_timestamp > median_duration * 4 and (
+                        words[0]['end'] - words[0]['start'] > max_duration
+                        or (len(words) > 1 and words[1]['end'] - words[0]['start'] > max_duration * 2)):
+                    if len(words) > 1 and words[1]['end'] - words[1]['start'] > max_duration:
+                        boundary = max(words[1]['end'] / 2, words[1]['end'] - max_duration)
+                        words[0]['end'] = words[1]['start'] = boundary
+                    words[0]['start'] = max(0, words[0]['end'] - max_duration)
+
+                # Prefer the segment's start timestamp if the first word is too long
+                if segment['start'] < words[0]['end'] and segment['start'] - 0.5 > words[0]['start']:
+                    words[0]['start'] = max(0, min(words[0]['end'] - median_duration, segment['start']))
+                else:
+                    segment['start'] = words[0]['start']
+
+                # Prefer the segment's end timestamp if the last word is too long
+                if segment['end'] > words[-1]['start'] and segment['end'] + 0.5 < words[-1]['end']:
+                    words[-1]['end'] = max(words[-1]['start'] + median_duration, segment['end'])
+                else:
+                    segment['end'] = words[-1]['end']
+
+                last_speech_timestamp = segment['end']
+
+            segment['words'] = [BatchWord(word['start'], word['end'], word['word'], word['probability'])
+                                for word in words]
+
+    def _word_timings(self, tokenizer, text_tokens, alignment):
+        """Word start and end times from cross-attention alignment, as faster-whisper's find_alignment."""
+        words, word_tokens = tokenizer.split_to_word_tokens(text_tokens + [tokenizer.eot])
+        if len(word_tokens) <= 1:
+            return []
+        boundaries = np.pad(np.cumsum([len(tokens) for tokens in word_tokens[:-1]]), (1, 0))
+        text_indices = np.array([pair[0] for pair in alignment.alignments])
+        time_indices = np.array([pair[1] for pair in alignment.alignments])
+        jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+        jump_times = time_indices[jumps] / self.model.tokens_per_second
+        probabilities = alignment.text_token_probs
+        return [dict(word=word, tokens=tokens, start=start, end=end, probability=float(np.mean(probabilities[i:j])))
+                for word, tokens, start, end, i, j in zip(words, word_tokens, jump_times[boundaries[:-1]],
+                                                          jump_times[boundaries[1:]], boundaries[:-1], boundaries[1:])]
+
+
+class BatchScheduler:
+    """
+    Shared front for one model: transcribe() blocks the calling thread
+    while its window waits for, and runs in, the next batch.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait=0.01, decoder=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.decoder = decoder or WhisperBatchDecoder(model)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched = 0
+        self.unbatched = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='whisper-batcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def hf_tokenizer(self):
+        # StreamingTranscriber caches prompt tokens with the model's tokenizer
+        return getattr(self.model, 'hf_tokenizer', None)
+
+    def transcribe(self, audio, **options):
+        """Same call and result shape as WhisperModel.transcribe, with segments as a list."""
+        request = _Request(audio, options)
+        batched = self.decoder.accepts(request)
+        with self._lock:
+            # Checked under the lock close() takes, so no request is queued behind the stop marker
+            if self._closed:
+                raise RuntimeError("BatchScheduler is closed")
+            if batched:
+                self._queue.put(request)
+        if batched:
+            result = request.future.result()
+            if result is not FALLBACK:
+                return result
+        with self._lock:
+            self.unbatched += 1
+        return self.model.transcribe(audio, **options)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            groups = {}
+            for request in self._collect(first):
+                groups.setdefault(request.group, []).append(request)
+            for requests in groups.values():
+                self._decode(requests)
+
+    def _decode(self, requests):
+        try:
+            results = self.decoder.decode(requests)
+        except Exception as e:
+            logger.error(f"Batched decode of {len(requests)} windows failed: {e}", exc_info=True)
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        with self._lock:
+            self.batches += 1
+            self.batched += len(requests)
+        logger.debug(f"Decoded a batch of {len(requests)} windows")
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+
+    def stats(self):
+        """Batch counters, for the metrics endpoint."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "batched_windows": self.batched,
+                "mean_batch_size": self.batched / self.batches if self.batches else 0.0,
+                "unbatched_windows": self.unbatched,
+                "queued_windows": self._queue.qsize(),
+            }
+
+    def close(self):
+        """Decode the queued windows and stop; later transcribe() calls raise RuntimeError."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
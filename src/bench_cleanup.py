@@ -0,0 +1,71 @@
+"""
+Micro-benchmark for the punctuation cleanup at the end of process_text.
+
+Builds a long expanded report from bench_engine's synthetic dictation,
+then times cleanup_text against a single pass alternative that rewrites
+each run of punctuation and spaces at once. Both are checked to produce
+identical output first.
+
+    python bench_cleanup.py --sentences 400 --repeat 50
+"""
+import argparse
+import re
+import timeit
+from functools import lru_cache
+
+import macro_engine
+from bench_engine import build_dictation
+from macro_engine import CLEANUP_CHARS, cleanup_text
+from macro_store import MacroStore
+
+# Runs of two or more characters a cleanup rule can match. Rules never cross
+# other characters, so rewriting each run on its own gives the same output.
+CLEANUP_RUN = re.compile('[' + re.escape(CLEANUP_CHARS) + ']{2,}')
+
+
+@lru_cache(maxsize=4096)
+def _cleanup_run(run):
+    return cleanup_text(run)
+
+
+def single_pass_cleanup(text):
+    """cleanup_text as one regex pass over punctuation runs."""
+    return CLEANUP_RUN.sub(lambda match: _cleanup_run(match.group()), text)
+
+
+def expanded_report(MACROS, sentences, seed=0):
+    """The text process_text hands to cleanup_text for a synthetic dictation."""
+    captured = []
+
+    def capture(text):
+        captured.append(text)
+        return text
+
+    macro_engine.cleanup_text = capture
+    try:
+        macro_engine.process_text(build_dictation(MACROS, sentences, seed), MACROS)
+    finally:
+        macro_engine.cleanup_text = cleanup_text
+    return captured[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--macros', '-m', default='macros.json', help="Path to macros.json")
+    parser.add_argument('--sentences', type=int, default=400, help='Dictated sentences in the report')
+    parser.add_argument('--repeat', type=int, default=50, help='Cleanup calls per timing')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = expanded_report(MacroStore(args.macros).macros, args.sentences, args.seed)
+    if single_pass_cleanup(report) != cleanup_text(report):
+        raise SystemExit("single pass cleanup output differs from cleanup_text")
+
+    print(f"report: {len(report)} characters")
+    for name, function in (('cleanup_text', cleanup_text), ('single pass', single_pass_cleanup)):
+        seconds = min(timeit.repeat(lambda: function(report), number=args.repeat, repeat=5)) / args.repeat
+        print(f"{name:>14}: {seconds * 1e6:9.1f} us")
+
+
+if __name__ == '__main__':
+    main()
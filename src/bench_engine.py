@@ -0,0 +1,77 @@
+"""
+Benchmark for macro_engine.process_text under every trigger policy.
+
+Builds a synthetic dictation (macro inserts, spoken punctuation, numbered
+lists, new lines) over the macros in macros.json and times process_text
+for each policy, both cold (a fresh matcher and index, as on the first
+report after startup) and warm (memoized lookups reused).
+
+    python bench_engine.py --sentences 400 --repeat 5
+"""
+import argparse
+import random
+import time
+
+import macro_engine
+from macro_index import MacroIndex
+from macro_store import MacroStore
+from trigger_matcher import TriggerMatcher
+
+DICTATION_WORDS = ("the heart size is normal no pleural effusion or pneumothorax lungs are clear "
+                   "mild degenerative change of the spine stable").split()
+
+
+def build_dictation(MACROS, sentences, seed=0):
+    """Synthetic dictation mixing macro inserts, list items and spoken punctuation."""
+    rng = random.Random(seed)
+    keys = list(MACROS)
+    parts = []
+    for number in range(sentences):
+        roll = rng.random()
+        if keys and roll < .3:
+            parts.append(f"insert macro {rng.choice(keys)} period")
+        elif roll < .4:
+            parts.append(f"new line {rng.choice(['one', 'two', 'three', 'four'])} period")
+        else:
+            words = ' '.join(rng.choice(DICTATION_WORDS) for _ in range(rng.randint(4, 12)))
+            parts.append(words + rng.choice([" period", " comma", " period new line", " slash"]))
+    return ' '.join(parts)
+
+
+def time_policy(text, MACROS, policy, repeat):
+    """Return (cold, best warm) seconds for process_text under `policy`."""
+    start = time.perf_counter()
+    matcher = TriggerMatcher(macro_engine.REPLACE_PHRASES)
+    index = MacroIndex(MACROS)
+    macro_engine.process_text(text, MACROS, matcher, index, policy)
+    cold = time.perf_counter() - start
+
+    warm = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        macro_engine.process_text(text, MACROS, matcher, index, policy)
+        warm = min(warm, time.perf_counter() - start)
+    return cold, warm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--macros', '-m', default='macros.json', help="Path to macros.json")
+    parser.add_argument('--sentences', type=int, default=400, help="Dictated sentences in the report")
+    parser.add_argument('--repeat', type=int, default=5, help="Warm runs per policy")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', choices=sorted(macro_engine.POLICIES), action='append',
+                        help="Policies to time, all by default")
+    args = parser.parse_args(argv)
+
+    MACROS = MacroStore(args.macros).macros
+    text = build_dictation(MACROS, args.sentences, args.seed)
+    print(f"dictation: {len(text.split())} words, {len(MACROS)} macros")
+
+    for name in args.policy or macro_engine.POLICIES:
+        cold, warm = time_policy(text, MACROS, macro_engine.POLICIES[name], args.repeat)
+        print(f"{name:>14}: cold {cold * 1e3:8.1f} ms   warm {warm * 1e3:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Optional capture of the audio a model was given, for debugging.
+
+The Streamlit apps used to write every request's resampled audio to
+output_audio.wav in the working directory: cast to int16 without scaling
+(so float audio came out as near silence), overwritten by every session,
+and never read. AudioCapture replaces it and is off unless DEBUG_AUDIO_DIR
+is set. When on, each clip goes to DEBUG_AUDIO_DIR/<session>/<time>_<n>.wav
+as properly scaled 16-bit PCM, written by a background thread so the
+request does not wait for the encode and the disk.
+"""
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+logger = logging.getLogger(__name__)
+
+# Session ids become directory names
+UNSAFE_CHARACTERS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class AudioCapture:
+    """Writes clips per session in the background; does nothing when `directory` is None."""
+
+    def __init__(self, directory=None, subtype='PCM_16'):
+        self.directory = directory
+        self.subtype = subtype
+        self._count = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-capture') if directory else None
+
+    @classmethod
+    def from_env(cls):
+        """Capture to DEBUG_AUDIO_DIR if it is set."""
+        return cls(os.environ.get('DEBUG_AUDIO_DIR') or None)
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def capture(self, session_id, audio, sample_rate):
+        """
+        Queue a copy of float `audio` (-1..1) for writing. Returns a Future
+        for the file's path, or None when capture is off.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._count += 1
+            count = self._count
+        session = UNSAFE_CHARACTERS.sub('_', str(session_id or 'default'))
+        path = os.path.join(self.directory, session, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{count}.wav")
+        # Copied now: the caller may reuse its buffer before the write runs
+        clip = np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0)
+        return self._executor.submit(self._write, path, clip, sample_rate)
+
+    def _write(self, path, audio, sample_rate):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # soundfile scales float samples to the PCM subtype's full range
+            sf.write(path, audio, sample_rate, subtype=self.subtype)
+        except Exception as e:
+            logger.error(f"Failed to capture debug audio to {path}: {e}", exc_info=True)
+            raise
+        logger.debug(f"Captured {len(audio) / sample_rate:.1f}s of debug audio to {path}")
+        return path
+
+    def close(self):
+        """Finish the queued writes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
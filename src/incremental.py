@@ -0,0 +1,166 @@
+"""
+Incremental macro expansion for streaming transcripts.
+
+IncrementalProcessor keeps the expansion state of a dictation between
+updates, so each new chunk (or revised tail) only re-runs the expansion
+loop over the words it can affect. Its output always equals
+process_text(committed + pending) under the same policy.
+"""
+import re
+from collections import namedtuple
+
+from macro_engine import CLEANUP_CHARS, DEFAULT_MATCHER, LOOKAHEAD, SERVER_POLICY, cleanup_text, expand_step
+from macro_index import MacroIndex
+
+# Replace emitted[start:] with text
+OutputDiff = namedtuple('OutputDiff', ['start', 'text'])
+
+# A position right after any character outside CLEANUP_CHARS is a seam that
+# no cleanup rule can span.
+LAST_UNSAFE_RUN = re.compile('[' + re.escape(CLEANUP_CHARS) + r']*\Z')
+
+LINE_SEPARATOR = '  \n'
+
+
+def compose_diffs(first, second):
+    """The single OutputDiff that applies `first` and then `second`."""
+    if second.start <= first.start:
+        return second
+    return OutputDiff(first.start, first.text[:second.start - first.start] + second.text)
+
+
+class IncrementalProcessor:
+    """
+    Streaming counterpart of process_text.
+
+    State kept between calls:
+        - the finalized prefix of the output, already cleaned up
+        - the expansion loop state (skip count, line position) at the first
+          word whose expansion can still change, and the raw text from there
+        - the pending (revisable) tail and the last emitted output
+
+    Words are finalized once they are committed and LOOKAHEAD further words
+    (or the end of their line) are committed after them.
+    """
+
+    def __init__(self, MACROS, matcher=DEFAULT_MATCHER, index=None, policy=SERVER_POLICY):
+        self.macros = MACROS
+        self.matcher = matcher
+        self.policy = policy
+        if index is None:
+            index = MacroIndex(MACROS)
+        self.index = index
+        self.reset()
+
+    def reset(self):
+        """Forget the dictation and start over."""
+        self._clean = []
+        self._clean_length = 0
+        self._unsafe = ''
+        self._frontier_raw = ''
+        self._skip = 0
+        self._line_started = False
+        self._pending = ''
+        self._emitted_tail = ''
+
+    @property
+    def text(self):
+        """The expanded output emitted so far."""
+        return ''.join(self._clean) + self._emitted_tail
+
+    def commit(self, text):
+        """Append finalized raw text, replacing the pending tail, and return the output diff."""
+        self._frontier_raw += text
+        self._pending = ''
+        return self._update()
+
+    def set_pending(self, text):
+        """Replace the revisable tail after the committed text and return the output diff."""
+        self._pending = text
+        return self._update()
+
+    def _expand(self):
+        """
+        Replay the expansion loop from the frontier over the committed and
+        pending text. Returns the raw output of the finalized steps, the raw
+        output of the rest, and the frontier state after the finalized steps.
+        """
+        lines = (self._frontier_raw + self._pending).split('\n')
+        committed_lines = self._frontier_raw.split('\n')
+        open_line = committed_lines[-1]
+        closed_lines = len(committed_lines) - 1
+        # The last committed word may still grow unless whitespace follows it
+        final_words = len(open_line.split())
+        if open_line and not open_line[-1].isspace():
+            final_words -= 1
+
+        final_out, pending_out = [], []
+        out = final_out
+        skip, line_started = self._skip, self._line_started
+
+        for number, line in enumerate(lines):
+            if number > 0:
+                out.append(LINE_SEPARATOR)
+                line_started = False
+            spans = [match.start() for match in re.finditer(r'\S+', line)]
+            words = line.split()
+            i = 0
+            while i < len(words):
+                if out is final_out and not (number < closed_lines or
+                                             (number == closed_lines and i + LOOKAHEAD <= final_words)):
+                    frontier = (number, spans[i], skip, line_started)
+                    out = pending_out
+                items, i, skip = expand_step(words, i, skip, self.macros, self.matcher, self.index, self.policy)
+                for item in items:
+                    out.append(' ' + item if line_started else item)
+                    line_started = True
+            if out is final_out and number == closed_lines:
+                # Every word of the open line is final, so the frontier sits at its end
+                frontier = (number, len(line), skip, line_started)
+                out = pending_out
+
+        return ''.join(final_out), ''.join(pending_out), frontier
+
+    def _advance(self, final_out, frontier):
+        """Move finalized output into the cleaned prefix and the frontier forward."""
+        number, column, skip, line_started = frontier
+        committed_lines = self._frontier_raw.split('\n')
+        self._frontier_raw = '\n'.join([committed_lines[number][column:]] + committed_lines[number + 1:])
+        self._skip, self._line_started = skip, line_started
+
+        unsafe = self._unsafe + final_out
+        # Clean up to the last seam that no cleanup pattern can cross
+        seam = LAST_UNSAFE_RUN.search(unsafe).start()
+        if seam:
+            cleaned = cleanup_text(unsafe[:seam])
+            self._clean.append(cleaned)
+            self._clean_length += len(cleaned)
+        self._unsafe = unsafe[seam:]
+
+    def _update(self):
+        previous_start = self._clean_length
+        previous_tail = self._emitted_tail
+
+        final_out, pending_out, frontier = self._expand()
+        self._advance(final_out, frontier)
+
+        # Everything between the previous and the new cleaned prefix was part of the old tail
+        new_tail = ''.join(self._clean_since(previous_start)) + cleanup_text(self._unsafe + pending_out)
+        self._emitted_tail = new_tail[self._clean_length - previous_start:]
+
+        common = 0
+        for old, new in zip(previous_tail, new_tail):
+            if old != new:
+                break
+            common += 1
+        return OutputDiff(previous_start + common, new_tail[common:])
+
+    def _clean_since(self, start):
+        """Cleaned output pieces added after the cleaned prefix reached `start`."""
+        pieces, length = [], self._clean_length
+        for piece in reversed(self._clean):
+            if length <= start:
+                break
+            pieces.append(piece)
+            length -= len(piece)
+        return reversed(pieces)
@@ -0,0 +1,84 @@
+"""
+Batched Whisper inference over long recordings for the Streamlit apps.
+
+transcribe_audio used to run the processor and model.generate once per
+30-second chunk, so a 10-minute dictation meant 20 serial forward passes.
+transcribe_chunks builds the features of every chunk in one processor
+call and decodes them batch_size chunks per generate call.
+
+With stride_seconds > 0 (long-form mode), consecutive chunks overlap by
+that much, so no word is cut at a chunk boundary without also being heard
+whole in the next chunk. The texts are merged on the longest run of
+words the two sides of each seam share.
+"""
+import string
+from difflib import SequenceMatcher
+from math import ceil
+
+import numpy as np
+
+# Whisper's input window
+CHUNK_SECONDS = 30
+# Chunks decoded per generate call
+BATCH_SIZE = 8
+# Dictation rarely exceeds this; bounds the seam search in long-form mode
+WORDS_PER_SECOND = 4
+# Shorter shared runs are not trusted as the seam
+MIN_SEAM_WORDS = 2
+
+
+def split_chunks(audio, sample_rate, chunk_seconds=CHUNK_SECONDS, stride_seconds=0):
+    """
+    Chunks of at most `chunk_seconds`. Without a stride they are equal
+    and back to back; with one, each starts `stride_seconds` before the
+    previous one ends.
+    """
+    size = int(chunk_seconds * sample_rate)
+    if len(audio) == 0:
+        return []
+    if stride_seconds <= 0:
+        return np.array_split(audio, ceil(len(audio) / size))
+    overlap = int(stride_seconds * sample_rate)
+    if not 0 < overlap < size:
+        raise ValueError(f"stride_seconds must be between 0 and {chunk_seconds}")
+    # Every chunk after the first brings audio the previous one did not have
+    return [audio[start:start + size] for start in range(0, max(len(audio) - overlap, 1), size - overlap)]
+
+
+def _normalize(word):
+    return word.lower().strip(string.punctuation)
+
+
+def merge_overlapping(texts, max_overlap_words):
+    """Join chunk texts, dropping the words each seam's overlap produced twice."""
+    words = []
+    for text in texts:
+        new = text.split()
+        if words and new:
+            tail = words[-max_overlap_words:]
+            head = new[:max_overlap_words]
+            matcher = SequenceMatcher(None, [_normalize(word) for word in tail], [_normalize(word) for word in head],
+                                      autojunk=False)
+            match = matcher.find_longest_match(0, len(tail), 0, len(head))
+            if match.size >= MIN_SEAM_WORDS:
+                # The earlier chunk up to the end of the shared run, then the later chunk after it
+                del words[len(words) - len(tail) + match.a + match.size:]
+                new = new[match.b + match.size:]
+        words.extend(new)
+    return ' '.join(words)
+
+
+def transcribe_chunks(audio, sample_rate, model, processor, batch_size=BATCH_SIZE, stride_seconds=0):
+    """Transcribe mono audio of any length with batched generate calls."""
+    chunks = split_chunks(audio, sample_rate, stride_seconds=stride_seconds)
+    if not chunks:
+        return ''
+    # One feature extraction call; every chunk is padded to 30 s
+    features = processor(chunks, sampling_rate=sample_rate, return_tensors="pt").input_features
+    texts = []
+    for start in range(0, len(chunks), batch_size):
+        predicted_ids = model.generate(features[start:start + batch_size])
+        texts.extend(processor.batch_decode(predicted_ids, skip_special_tokens=True))
+    if stride_seconds > 0:
+        return merge_overlapping(texts, int(2 * stride_seconds * WORDS_PER_SECOND))
+    return ' '.join(texts)
@@ -0,0 +1,229 @@
+"""
+Macro expansion engine shared by the server (macro_processor.py), the
+Streamlit transcription app and the text-only app.
+
+process_text expands spoken punctuation, numbered lists and "insert macro"
+commands in a transcript. The apps grew slightly different trigger rules,
+which are kept as TriggerPolicy presets so each one renders exactly as
+before:
+
+    SERVER_POLICY         src/app.py and the websocket servers
+    TRANSCRIPTION_POLICY  transcription_w_macro_app.py
+    TEXT_POLICY           simple_no_asr_macro_app.py
+
+This module has no side effects on import; macros are passed in.
+"""
+from macro_index import MacroIndex
+from number_words import parse_number
+from trigger_matcher import TriggerMatcher
+
+REPLACE_PHRASES = {
+    "period": ".",
+    "new line": "  \n",
+    "newline": "  \n",
+    "slash": "/",
+    "comma": ",",
+    "open paren": "(",
+    "closed paren": ")",
+    "close paren": ")",
+    "open paren.": "(",
+    "closed paren.": ")",
+    "close paren.": ")",
+}
+
+# Compiled once for the default phrase table and reused across calls
+DEFAULT_MATCHER = TriggerMatcher(REPLACE_PHRASES)
+
+# Words past `i` that expand_step may read: "insert macro", a 4 word key and trailing punctuation
+LOOKAHEAD = 7
+
+# Spacing and punctuation fixes, applied in this order. Later rules see the
+# output of earlier ones (" . ," becomes ". ," then ".," then "."), so the
+# order is part of the output format.
+CLEANUP_RULES = (
+    (" .", "."), (" /", "/"), ("/ ", "/"), (" ,", ","),
+    (".,", "."), (",.", "."), ("..", "."), ("( ", "("), (" )", ")"),
+)
+
+# Characters a cleanup rule can match
+CLEANUP_CHARS = ''.join(sorted({char for old, _ in CLEANUP_RULES for char in old}))
+
+
+def spoken_macro_key(words, i, length):
+    """Return the `length` word macro key following the command at `i`, and its token count."""
+    macro_key = ' '.join(words[i+2:i+2+length])
+    # Remove trailing punctuation and normalize
+    macro_key = macro_key.rstrip(',.!?').lower()
+    return macro_key, len(macro_key.split())
+
+
+class TriggerPolicy:
+    """
+    Trigger rules of one expansion mode.
+
+    command: how the macro insertion command is recognized
+        'fuzzy'   - insert/add/include and macro(s), fuzzy matched above 85
+        'insert'  - a word close to "insert" (ratio above 80), then "macro"
+        'literal' - exactly "insert macro"
+    trim_keys: strip trailing punctuation from spoken macro keys and try an
+        exact key match before the fuzzy one
+    step_over_matches: after a two word phrase, list number or macro, step
+        past the matched words and also set the skip count, which drops as
+        many words again. Otherwise the skip count alone steps over them.
+    """
+
+    COMMANDS = ('fuzzy', 'insert', 'literal')
+
+    def __init__(self, command='fuzzy', trim_keys=True, step_over_matches=True):
+        if command not in self.COMMANDS:
+            raise ValueError(f"Unknown macro command rule: {command}")
+        self.command = command
+        self.trim_keys = trim_keys
+        self.step_over_matches = step_over_matches
+
+    def __repr__(self):
+        return (f"TriggerPolicy(command={self.command!r}, trim_keys={self.trim_keys}, "
+                f"step_over_matches={self.step_over_matches})")
+
+    def is_macro_command(self, matcher, words, i):
+        """Check if the current position contains a macro insertion command."""
+        if self.command == 'fuzzy':
+            return matcher.is_macro_command(words, i)
+        return matcher.is_insert_macro(words, i, fuzzy=self.command == 'insert')
+
+    def macro_key(self, words, i, length):
+        """Return the `length` word macro key following the command at `i`, and its word count."""
+        if self.trim_keys:
+            return spoken_macro_key(words, i, length)
+        return ' '.join(words[i+2:i+2+length]).lower(), length
+
+
+SERVER_POLICY = TriggerPolicy('fuzzy', trim_keys=True, step_over_matches=True)
+TRANSCRIPTION_POLICY = TriggerPolicy('insert', trim_keys=False, step_over_matches=False)
+TEXT_POLICY = TriggerPolicy('literal', trim_keys=False, step_over_matches=False)
+
+POLICIES = {
+    'server': SERVER_POLICY,
+    'transcription': TRANSCRIPTION_POLICY,
+    'text': TEXT_POLICY,
+}
+
+
+def prefetch(lines, matcher, index, policy=SERVER_POLICY):
+    """Batch score every phrase and macro window of a transcript before the main pass."""
+    line_words = [line.split() for line in lines]
+    matcher.prefetch(line_words)
+
+    windows = []
+    for words in line_words:
+        for i in range(len(words)):
+            if policy.is_macro_command(matcher, words, i):
+                windows.extend(policy.macro_key(words, i, length)
+                               for length in range(4, 0, -1) if i + 2 + length <= len(words))
+    index.prefetch(windows)
+
+
+def insert_macro(words, i, MACROS, index=None, policy=SERVER_POLICY):
+    """
+    Look up the macro named after the command at `i`, trying the longest key
+    first. Returns the macro text and the key's word count, or (words[i], 0).
+    """
+    if index is None:
+        index = MacroIndex(MACROS)
+
+    for length in range(4, 0, -1):
+        if i + 2 + length <= len(words):
+            macro_key, key_length = policy.macro_key(words, i, length)
+
+            # Try exact match first
+            if policy.trim_keys:
+                exact_key = index.exact(macro_key, key_length)
+                if exact_key is not None:
+                    return MACROS[exact_key], key_length
+
+            # Fuzzy match among keys of the same length
+            best_match = index.fuzzy(macro_key, key_length)
+            if best_match is not None:
+                return MACROS[best_match], key_length
+
+    return words[i], 0
+
+
+def expand_step(words, i, skip, MACROS, matcher, index, policy=SERVER_POLICY):
+    """
+    Run one step of the expansion loop at position `i` of a line.
+
+    Only words[i:] is read, at most LOOKAHEAD words ahead. Returns the
+    items to append to the line, the next position and the new skip count.
+    """
+    if skip > 0:
+        return [], i + 1, skip - 1
+
+    word = words[i]
+    word_lower = word.lower()
+    # Where a two word match leaves `i`; the skip count set with it covers the rest
+    step = 2 if policy.step_over_matches else 1
+
+    # Check for replacement phrases
+    phrase = ' '.join(words[i:i+2]).lower()
+    replacement = matcher.match_phrase(phrase)
+    if replacement is not None:
+        return [replacement], i + step, 1
+    replacement = matcher.match_phrase(word_lower)
+    if replacement is not None:
+        return [replacement], i + 1, skip
+
+    # Check for numbered lists
+    if i < len(words) - 1 and matcher.is_list_separator(words[i+1]):
+        number = parse_number(word_lower.replace(",", ""))
+        if number is not None:
+            return ["\n" + str(number) + "."], i + step, 1
+
+    # Check for macro insertion
+    if policy.is_macro_command(matcher, words, i):
+        macro_text, key_length = insert_macro(words, i, MACROS, index, policy)
+        if not policy.step_over_matches:
+            # Skip "macro" and the key, or nothing if no macro matched
+            return [macro_text], i + 1, 1 + key_length if key_length else 0
+        items = [macro_text]
+        i += 2 + key_length
+        # Handle trailing punctuation
+        if i < len(words) and words[i] in [',', '.', '!', '?']:
+            items.append(words[i])
+            i += 1
+        return items, i, key_length
+
+    return [word], i + 1, skip
+
+
+def cleanup_text(text):
+    """Fix spacing around punctuation in expanded text."""
+    # Each pass is a C level scan that returns `text` itself when nothing matches
+    for old, new in CLEANUP_RULES:
+        text = text.replace(old, new)
+    return text
+
+
+def process_text(text, MACROS, matcher=DEFAULT_MATCHER, index=None, policy=SERVER_POLICY):
+    """Expand spoken punctuation, numbered lists and macros in a transcript."""
+    if index is None:
+        index = MacroIndex(MACROS)
+
+    lines = text.split('\n')
+    prefetch(lines, matcher, index, policy)
+    final_text = []
+    skip = 0
+
+    for line in lines:
+        words = line.split()
+        final_line = []
+
+        i = 0
+        while i < len(words):
+            items, i, skip = expand_step(words, i, skip, MACROS, matcher, index, policy)
+            final_line.extend(items)
+
+        final_text.append(' '.join(final_line))
+
+    # Clean up the final text
+    return cleanup_text('  \n'.join(final_text))
@@ -0,0 +1,145 @@
+from scorers import create_scorer, normalize
+from trigger_matcher import FuzzyChoice, wratio_bound
+
+# Memoized fuzzy lookups kept before the memo is reset
+MAX_MEMO_SIZE = 65536
+
+
+class _Bucket:
+    """Keys sharing one token length, with their exact-match table and score statistics."""
+
+    def __init__(self):
+        self.keys = {}
+        self.lower = {}
+
+    def add(self, key):
+        self.keys[key] = FuzzyChoice(key)
+        self.lower.setdefault(key.lower(), []).append(key)
+
+    def remove(self, key):
+        del self.keys[key]
+        same_lower = self.lower[key.lower()]
+        same_lower.remove(key)
+        if not same_lower:
+            del self.lower[key.lower()]
+
+
+class MacroIndex:
+    """
+    Lookup structure over a MACROS dict.
+
+    Keys are bucketed by token length. Each bucket keeps a lowercase
+    exact-match table plus each key's character and token statistics, so a
+    fuzzy lookup only scores the keys whose WRatio upper bound
+    (trigger_matcher.wratio_bound) can beat the threshold, instead of every
+    key in the library. The bound is never below the real score, so the
+    result is the same as a full scan. Candidates keep MACROS insertion
+    order so ties resolve the same way as a scan over MACROS.keys().
+    """
+
+    def __init__(self, macros, scorer=None):
+        self.macros = macros
+        self.scorer = scorer or create_scorer()
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-index every key of the underlying MACROS dict."""
+        self._order = {}
+        self._next = 0
+        self._buckets = {}
+        self._memo = {}
+        for key in self.macros:
+            self._index(key)
+
+    def _index(self, key):
+        if key in self._order:
+            return
+        self._memo.clear()
+        self._order[key] = self._next
+        self._next += 1
+        self._buckets.setdefault(len(key.split()), _Bucket()).add(key)
+
+    def _unindex(self, key):
+        if key not in self._order:
+            return
+        self._memo.clear()
+        del self._order[key]
+        self._buckets[len(key.split())].remove(key)
+
+    def update(self, key, text):
+        """Add or update a macro in MACROS and the index."""
+        self.macros[key] = text
+        self._index(key)
+
+    def delete(self, key):
+        """Delete a macro from MACROS and the index."""
+        if key in self.macros:
+            del self.macros[key]
+        self._unindex(key)
+
+    def __len__(self):
+        return len(self._order)
+
+    def keys_with_length(self, length):
+        """Macro keys with `length` tokens, in MACROS order."""
+        bucket = self._buckets.get(length)
+        return list(bucket.keys) if bucket else []
+
+    def exact(self, macro_key, length):
+        """Return the first key with `length` tokens equal to `macro_key` ignoring case."""
+        bucket = self._buckets.get(length)
+        same_lower = bucket.lower.get(macro_key.lower()) if bucket else None
+        return same_lower[0] if same_lower else None
+
+    def candidates(self, macro_key, length, threshold=80):
+        """Keys with `length` tokens that could score above `threshold` against `macro_key`."""
+        bucket = self._buckets.get(length)
+        if not bucket:
+            return []
+        query = FuzzyChoice(macro_key)
+        return [key for key, choice in bucket.keys.items() if wratio_bound(query, choice) > threshold]
+
+    def prefetch(self, windows, threshold=80):
+        """
+        Batch score spoken macro keys, given as (macro_key, length) pairs.
+
+        Keys of the same length are scored against the union of their
+        candidates in one matrix call and the results are memoized for fuzzy().
+        """
+        pending = {}
+        for macro_key, length in windows:
+            memo_key = (normalize(macro_key), length, threshold)
+            if memo_key in self._memo or memo_key in pending or self.exact(macro_key, length) is not None:
+                continue
+            pending[memo_key] = (macro_key, set(self.candidates(macro_key, length, threshold)))
+
+        by_length = {}
+        for memo_key, (macro_key, candidates) in pending.items():
+            queries, union = by_length.setdefault(memo_key[1], ([], set()))
+            queries.append((memo_key, macro_key))
+            union.update(candidates)
+
+        for queries, union in by_length.values():
+            choices = sorted(union, key=self._order.__getitem__)
+            results = self.scorer.best_matches([macro_key for _, macro_key in queries], choices, threshold)
+            for (memo_key, _), best_match in zip(queries, results):
+                self._remember(memo_key, best_match)
+
+    def _remember(self, memo_key, best_match):
+        if len(self._memo) >= MAX_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[memo_key] = best_match
+
+    def fuzzy(self, macro_key, length, threshold=80):
+        """Return the best fuzzy match with `length` tokens scoring above `threshold`, or None."""
+        memo_key = (normalize(macro_key), length, threshold)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        best_match = None
+        candidates = self.candidates(macro_key, length, threshold)
+        if candidates:
+            result = self.scorer.extract_one(macro_key, candidates)
+            if result and result[1] > threshold:
+                best_match = result[0]
+        self._remember(memo_key, best_match)
+        return best_match
@@ -0,0 +1,309 @@
+"""
+SQLite macro repository for multi-user deployments.
+
+SQLiteMacroStore offers the MacroStore interface (macros, index, set,
+delete, refresh) over one SQLite database holding any number of macro
+sets, one per namespace (a user or a clinic). Nothing is loaded at
+startup: `macros` is a read-only mapping that fetches texts on lookup,
+and `index` reads the keys of one token length at a time and scores only
+those whose WRatio bound can beat the threshold, as MacroIndex does.
+
+Select it with MACRO_BACKEND=sqlite (MACRO_DB sets the database path).
+An existing macros.json is imported with
+
+    python macro_repository.py import macros.json --namespace clinic-a
+
+Each edit also replaces the key's row in macro_changes under a new
+version, so changes_since() serves delta sync to clients of any worker.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+
+from macro_index import MAX_MEMO_SIZE, MacroIndex
+from macro_store import REFRESH_INTERVAL, MacroStore
+from scorers import create_scorer
+from trigger_matcher import FuzzyChoice, wratio_bound
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = 'macros.db'
+DEFAULT_NAMESPACE = 'default'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS macros (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    lower_key TEXT NOT NULL,
+    UNIQUE (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS macros_exact ON macros (namespace, length, lower_key);
+CREATE TABLE IF NOT EXISTS macro_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT,
+    UNIQUE (namespace, key)
+);
+"""
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+class SQLiteMacros(Mapping):
+    """Read-only MACROS view of one namespace. Texts are fetched on lookup."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, key):
+        rows = self._store._fetch("SELECT text FROM macros WHERE namespace = ? AND key = ?",
+                                  (self._store.namespace, key))
+        if not rows:
+            raise KeyError(key)
+        return rows[0][0]
+
+    def __iter__(self):
+        rows = self._store._fetch("SELECT key FROM macros WHERE namespace = ? ORDER BY id", (self._store.namespace,))
+        return (key for key, in rows)
+
+    def __len__(self):
+        return self._store._fetch("SELECT COUNT(*) FROM macros WHERE namespace = ?", (self._store.namespace,))[0][0]
+
+    def copy(self):
+        """The whole namespace as a plain dict, in one query."""
+        return dict(self._store._fetch("SELECT key, text FROM macros WHERE namespace = ? ORDER BY id",
+                                       (self._store.namespace,)))
+
+
+class SQLiteMacroIndex(MacroIndex):
+    """
+    MacroIndex over a namespace in the database.
+
+    Exact and candidate lookups are queries against the indexed macros
+    table; candidates are filtered with the same WRatio bound as MacroIndex,
+    so fuzzy results match the in-memory index. Lookups are memoized until
+    the namespace changes.
+    """
+
+    def __init__(self, store, scorer=None):
+        self._store = store
+        self.macros = store.macros
+        self.scorer = scorer or create_scorer()
+        # Row ids of keys seen as candidates; ids give MACROS insertion order
+        self._order = {}
+        # Score statistics by key; they depend only on the key, so edits never invalidate them
+        self._choices = {}
+        self.rebuild()
+
+    def rebuild(self):
+        """Forget memoized lookups, e.g. after another process edited the namespace."""
+        self._memo = {}
+
+    def update(self, key, text):
+        """Add or update a macro in the namespace."""
+        self._store.set(key, text)
+
+    def delete(self, key):
+        """Delete a macro from the namespace."""
+        self._store.delete(key)
+
+    def __len__(self):
+        return len(self.macros)
+
+    def keys_with_length(self, length):
+        """Macro keys with `length` tokens, in MACROS order."""
+        rows = self._store._fetch("SELECT key FROM macros WHERE namespace = ? AND length = ? ORDER BY id",
+                                  (self._store.namespace, length))
+        return [key for key, in rows]
+
+    def exact(self, macro_key, length):
+        """Return the first key with `length` tokens equal to `macro_key` ignoring case."""
+        rows = self._store._fetch(
+            "SELECT key FROM macros WHERE namespace = ? AND length = ? AND lower_key = ? ORDER BY id LIMIT 1",
+            (self._store.namespace, length, macro_key.lower()))
+        return rows[0][0] if rows else None
+
+    def candidates(self, macro_key, length, threshold=80):
+        """Keys with `length` tokens that could score above `threshold` against `macro_key`."""
+        rows = self._store._fetch("SELECT key, id FROM macros WHERE namespace = ? AND length = ? ORDER BY id",
+                                  (self._store.namespace, length))
+        if len(self._choices) >= MAX_MEMO_SIZE:
+            self._choices.clear()
+        query = FuzzyChoice(macro_key)
+        candidates = []
+        for key, macro_id in rows:
+            choice = self._choices.get(key)
+            if choice is None:
+                choice = self._choices[key] = FuzzyChoice(key)
+            if wratio_bound(query, choice) > threshold:
+                self._order[key] = macro_id
+                candidates.append(key)
+        return candidates
+
+
+class SQLiteMacroStore:
+    """
+    MACROS for one namespace of a SQLite macro database.
+
+    `macros` and `index` stand in for the MacroStore dict and MacroIndex.
+    Edits are committed straight to the database; other workers pick them
+    up on their next refresh(). Versions are macro_changes row ids, shared
+    by every worker.
+    """
+
+    def __init__(self, path=DEFAULT_DB, namespace=DEFAULT_NAMESPACE, scorer=None, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.namespace = namespace
+        self.scorer = scorer
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._checked_at = time.monotonic()
+        self._namespaces = {namespace: self}
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            # Readers in other workers keep going while one of them writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self.macros = SQLiteMacros(self)
+        self.index = SQLiteMacroIndex(self, scorer)
+
+    def _fetch(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def for_namespace(self, namespace):
+        """The store for another user's or clinic's macro set in the same database."""
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = SQLiteMacroStore(self.path, namespace, self.scorer, self.refresh_interval)
+        return self._namespaces[namespace]
+
+    def refresh(self, force=False):
+        """
+        Pick up changes committed by other connections. Checks at most once
+        per refresh_interval unless `force`. Returns True if the database changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            changed = data_version != self._data_version
+            self._data_version = data_version
+        if changed:
+            self.index.rebuild()
+            logger.info(f"Macro database {self.path} changed; cleared cached lookups for '{self.namespace}'")
+        return changed
+
+    def _record_change(self, key, text):
+        self._db.execute("INSERT OR REPLACE INTO macro_changes (namespace, key, text) VALUES (?, ?, ?)",
+                         (self.namespace, key, text))
+
+    @property
+    def version(self):
+        """Version of the namespace's macros: its newest change."""
+        return self._fetch("SELECT COALESCE(MAX(version), 0) FROM macro_changes WHERE namespace = ?",
+                           (self.namespace,))[0][0]
+
+    def changes_since(self, version):
+        """
+        (version, changes): the current version and the keys changed after
+        `version` (text, or None if deleted). changes is None when `version`
+        is unknown or missing, and the client needs the full macro set.
+        """
+        with self._lock:
+            current = self.version
+            if not isinstance(version, int) or isinstance(version, bool) or not 0 <= version <= current:
+                return current, None
+            rows = self._db.execute("SELECT key, text FROM macro_changes "
+                                    "WHERE namespace = ? AND version > ? AND version <= ? ORDER BY version",
+                                    (self.namespace, version, current)).fetchall()
+        return current, dict(rows)
+
+    def _insert(self, key, text):
+        row = self._db.execute("SELECT id, text FROM macros WHERE namespace = ? AND key = ?",
+                               (self.namespace, key)).fetchone()
+        if row:
+            if row[1] != text:
+                self._db.execute("UPDATE macros SET text = ? WHERE id = ?", (text, row[0]))
+                self._record_change(key, text)
+            return
+        self._record_change(key, text)
+        self._db.execute("INSERT INTO macros (namespace, key, text, length, lower_key) VALUES (?, ?, ?, ?, ?)",
+                         (self.namespace, key, text, len(key.split()), key.lower()))
+
+    def set(self, key, text):
+        """Add or update a macro."""
+        self.set_many({key: text})
+
+    def set_many(self, macros):
+        """Add or update several macros in one transaction."""
+        with self._lock, self._db:
+            for key, text in macros.items():
+                self._insert(key, text)
+        self.index.rebuild()
+
+    def delete(self, key):
+        """Delete a macro if it exists."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id FROM macros WHERE namespace = ? AND key = ?",
+                                   (self.namespace, key)).fetchone()
+            if row is None:
+                return
+            self._db.execute("DELETE FROM macros WHERE id = ?", (row[0],))
+            self._record_change(key, None)
+        self.index.rebuild()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_macro_store(path=None, namespace=None, scorer=None):
+    """
+    Open the macro store selected by the MACRO_BACKEND environment variable:
+    'json' (macros.json, the default) or 'sqlite' (the MACRO_DB database).
+    """
+    backend = os.environ.get('MACRO_BACKEND', 'json')
+    if backend == 'sqlite':
+        return SQLiteMacroStore(path or os.environ.get('MACRO_DB', DEFAULT_DB), namespace or DEFAULT_NAMESPACE, scorer)
+    if backend != 'json':
+        raise ValueError(f"Unknown macro backend: {backend}")
+    return MacroStore(path or 'macros.json', scorer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export a namespace of the SQLite macro database.")
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('json_path', help="macros.json to import from or export to")
+    parser.add_argument('--db', default=os.environ.get('MACRO_DB', DEFAULT_DB), help="SQLite database")
+    parser.add_argument('--namespace', '-n', default=DEFAULT_NAMESPACE, help="User or clinic macro set")
+    args = parser.parse_args(argv)
+
+    store = SQLiteMacroStore(args.db, args.namespace)
+    if args.command == 'import':
+        with open(args.json_path, 'r') as f:
+            macros = json.load(f)
+        store.set_many(macros)
+        print(f"Imported {len(macros)} macros into '{args.namespace}' ({len(store.macros)} total)")
+    else:
+        with open(args.json_path, 'w') as f:
+            json.dump(store.macros.copy(), f, indent=2)
+        print(f"Exported {len(store.macros)} macros from '{args.namespace}'")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""
+Macro storage with atomic writes and change detection.
+
+MacroStore keeps MACROS in memory together with its MacroIndex. Edits are
+appended as one JSON line each to a journal next to the snapshot
+(macros.json.journal) instead of rewriting macros.json. After
+COMPACT_AFTER entries the snapshot is rewritten through a temp file and
+os.replace, so readers never see a torn macros.json, and the journal is
+cleared. Writers in different processes serialize on a lock file.
+
+refresh() picks up edits made by other processes or by hand: new journal
+lines are replayed from the last offset read, and a replaced snapshot is
+diffed against memory, so only the keys that changed are re-indexed.
+
+Every change, local or picked up by refresh(), is also recorded in a
+MacroChangeLog under a new version, so changes_since() can hand clients
+only the keys edited after the version they last saw.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from macro_index import MacroIndex
+
+logger = logging.getLogger(__name__)
+
+# Journal entries written before the snapshot is rewritten
+COMPACT_AFTER = 256
+# Minimum seconds between two file checks in refresh()
+REFRESH_INTERVAL = 1.0
+
+
+def _file_state(path):
+    """Identity of a file's current contents, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def write_atomic(path, data):
+    """Write `data` to `path` through a temp file in the same directory and os.replace."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class MacroChangeLog:
+    """
+    The latest change of every edited key, ordered by version, for delta sync.
+
+    Versions are '<epoch>:<number>'. The epoch is new for each process, so
+    a version handed out by another worker or an earlier run is never
+    mistaken for one of ours.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.number = 0
+        # key -> (number, text or None if deleted), oldest change first
+        self._changes = OrderedDict()
+
+    @property
+    def version(self):
+        return f"{self.epoch}:{self.number}"
+
+    def record(self, key, text):
+        """Note that `key` now has `text` (None: deleted)."""
+        self.number += 1
+        self._changes[key] = (self.number, text)
+        self._changes.move_to_end(key)
+
+    def since(self, version):
+        """
+        Keys changed after `version`, mapped to their text or None if deleted.
+        None if `version` is not one of this log's, so the client needs everything.
+        """
+        try:
+            epoch, number = str(version).split(':')
+            number = int(number)
+        except ValueError:
+            return None
+        if epoch != self.epoch or number > self.number:
+            return None
+        changes = {}
+        for key, (changed_at, text) in reversed(self._changes.items()):
+            if changed_at <= number:
+                break
+            changes[key] = text
+        return changes
+
+
+class MacroStore:
+    """
+    MACROS backed by a JSON snapshot plus an append-only journal.
+
+    `macros` is the dict the apps pass around as MACROS and `index` its
+    MacroIndex; both are kept up to date by set, delete and refresh.
+    """
+
+    def __init__(self, path='macros.json', scorer=None, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock_path = path + '.lock'
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._checked_at = time.monotonic()
+        with self._file_lock(shared=True):
+            macros = self._load()
+        self.index = MacroIndex(macros, scorer)
+        self.macros = self.index.macros
+        self.changes = MacroChangeLog()
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        """
+        Hold the cross-process lock on the store files. Only writers create
+        the lock file; readers skip locking until one has, as no writer can
+        be midway through a write or a compaction before then.
+        """
+        if fcntl is None:
+            yield
+            return
+        try:
+            lock_file = open(self.lock_path, 'r' if shared else 'a')
+        except FileNotFoundError:
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Read the snapshot and the whole journal, remembering where reading stopped."""
+        self._snapshot_state = _file_state(self.path)
+        macros = {}
+        if self._snapshot_state is not None:
+            with open(self.path, 'r') as f:
+                macros = json.load(f)
+        self._journal_offset = 0
+        self._journal_entries = 0
+        for entry in self._read_journal():
+            self._apply_entry(macros, entry)
+        return macros
+
+    def _read_journal(self):
+        """Yield the journal entries past the last offset read."""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # A writer may be midway through its line; leave it for the next read
+        complete = data.rfind(b'\n') + 1
+        for line in data[:complete].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt entry in {self.journal_path}")
+                continue
+            self._journal_entries += 1
+            yield entry
+        self._journal_offset += complete
+
+    @staticmethod
+    def _apply_entry(macros, entry):
+        if entry.get('delete'):
+            macros.pop(entry['key'], None)
+        else:
+            macros[entry['key']] = entry['text']
+
+    def _apply_to_index(self, entry):
+        if entry.get('delete'):
+            if entry['key'] in self.macros:
+                self.changes.record(entry['key'], None)
+            self.index.delete(entry['key'])
+        else:
+            self.changes.record(entry['key'], entry['text'])
+            self.index.update(entry['key'], entry['text'])
+
+    def _sync(self):
+        """Bring memory up to date with the files. Call with the file lock held."""
+        journal_state = _file_state(self.journal_path)
+        journal_size = journal_state[2] if journal_state else 0
+        if _file_state(self.path) != self._snapshot_state or journal_size < self._journal_offset:
+            # The snapshot was replaced or the journal cut short (compaction or
+            # an outside edit): reload and diff against memory
+            current = self.macros
+            latest = self._load()
+            changed = False
+            for key in [key for key in current if key not in latest]:
+                self.changes.record(key, None)
+                self.index.delete(key)
+                changed = True
+            for key, text in latest.items():
+                if key not in current or current[key] != text:
+                    self.changes.record(key, text)
+                    self.index.update(key, text)
+                    changed = True
+            return changed
+
+        changed = False
+        for entry in self._read_journal():
+            self._apply_to_index(entry)
+            changed = True
+        return changed
+
+    def refresh(self, force=False):
+        """
+        Pick up changes made by other writers. Checks the files at most once
+        per refresh_interval unless `force`. Returns True if MACROS changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            with self._file_lock(shared=True):
+                changed = self._sync()
+        if changed:
+            logger.info(f"Reloaded macros from {self.path}: {len(self.macros)} macros")
+        return changed
+
+    @property
+    def version(self):
+        """Version of the macros in memory."""
+        return self.changes.version
+
+    def changes_since(self, version):
+        """
+        (version, changes): the current version and the keys changed after
+        `version` (text, or None if deleted). changes is None when `version`
+        is unknown or missing, and the client needs the full macro set.
+        """
+        with self._lock:
+            return self.changes.version, self.changes.since(version)
+
+    def _write(self, entry):
+        with self._lock, self._file_lock():
+            # Replay other writers' entries first so the offset stays in step with the file
+            self._sync()
+            if entry.get('delete') and entry['key'] not in self.macros:
+                return
+            with open(self.journal_path, 'ab') as f:
+                line = json.dumps(entry).encode('utf-8') + b'\n'
+                if f.tell() > self._journal_offset:
+                    # Left over from a writer that died mid-line; start ours on a fresh line
+                    line = b'\n' + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                self._journal_offset = f.tell()
+            self._journal_entries += 1
+            self._apply_to_index(entry)
+            if self._journal_entries >= COMPACT_AFTER:
+                self._compact()
+
+    def set(self, key, text):
+        """Add or update a macro."""
+        self._write({'key': key, 'text': text})
+
+    def delete(self, key):
+        """Delete a macro if it exists."""
+        self._write({'key': key, 'delete': True})
+
+    def compact(self):
+        """Fold the journal into a new snapshot."""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._compact()
+
+    def _compact(self):
+        write_atomic(self.path, json.dumps(self.macros))
+        # Entries are in the snapshot now; clear them only after it is in place
+        open(self.journal_path, 'w').close()
+        self._snapshot_state = _file_state(self.path)
+        self._journal_offset = 0
+        self._journal_entries = 0
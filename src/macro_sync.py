@@ -0,0 +1,70 @@
+"""
+Versioned macro sync for websocket clients.
+
+Clients used to get the whole MACROS dict after every add_macro or
+delete_macro and on every get_macros. Now each message carries the
+store's version. A client that sends back the last version it saw gets
+only the keys changed since then, and every edit is pushed to all
+sessions of the store as a delta:
+
+    {"action": "macros_delta", "version": ..., "changes": {"key": "text", "gone": null}}
+
+Clients with no version, or one the store does not know, get the full
+set ({"macros": {...}, "version": ...}).
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def macros_message(store, version=None):
+    """The reply to a client that last saw `version`: a delta when possible, else the full set."""
+    current, changes = store.changes_since(version)
+    if changes is None:
+        return {"macros": store.macros.copy(), "version": current}
+    return {"action": "macros_delta", "version": current, "changes": changes}
+
+
+class MacroSync:
+    """Connected websockets per macro store, with the version each was last sent."""
+
+    def __init__(self):
+        # websocket -> [store, version]
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def register(self, websocket, store):
+        self._sessions[websocket] = [store, None]
+
+    def unregister(self, websocket):
+        self._sessions.pop(websocket, None)
+
+    async def send(self, websocket, version=None):
+        """Bring one session up to date from `version`, the last one its client saw."""
+        session = self._sessions[websocket]
+        message = macros_message(session[0], version)
+        session[1] = message["version"]
+        await websocket.send_json(message)
+
+    async def publish(self, store):
+        """Send every session of `store` the changes it has not seen yet."""
+        messages = {}
+        sends = []
+        for websocket, session in list(self._sessions.items()):
+            # Sessions that never asked for macros are left alone
+            if session[0] is not store or session[1] is None:
+                continue
+            if session[1] not in messages:
+                messages[session[1]] = macros_message(store, session[1])
+            message = messages[session[1]]
+            if message.get("changes") == {}:
+                continue
+            session[1] = message["version"]
+            sends.append(websocket.send_json(message))
+        # One slow or closed connection does not hold up the others
+        for result in await asyncio.gather(*sends, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to send macro changes: {result}")
@@ -0,0 +1,130 @@
+"""
+Whisper model loading, sizing and warmup for the server.
+
+The model used to be built at import time in float32 with faster-whisper's
+default threading, and the first request after a deploy paid for the
+lazy initialization of every CTranslate2 replica. ModelPool instead:
+
+    - picks the compute type for the device: int8 on CPU, float16 on CUDA
+    - splits the cores between the replicas: `workers` replicas
+      (faster-whisper's num_workers), cpu_threads = cores // workers each
+    - runs one synthetic decode per replica before reporting ready
+
+load() blocks; the server runs it off the event loop from its lifespan
+hook and answers /ready with 503 until `ready` is True.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_TYPES = {"cpu": "int8", "cuda": "float16"}
+# Seconds of synthetic audio decoded by each replica during warmup
+WARMUP_SECONDS = 1.0
+WARMUP_SAMPLE_RATE = 16000
+
+LOADING, WARMING, READY, FAILED = "loading", "warming", "ready", "failed"
+
+
+def default_compute_type(device):
+    """int8 on CPU, float16 on CUDA; faster-whisper's default otherwise."""
+    return COMPUTE_TYPES.get(device, "default")
+
+
+def plan_cpu_threads(workers, cores=None):
+    """Threads per replica so that `workers` replicas share the cores without oversubscribing them."""
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // max(1, workers))
+
+
+def warmup_audio(seconds=WARMUP_SECONDS):
+    """Quiet noise: enough for a full encoder pass and a short decode."""
+    rng = np.random.default_rng(0)
+    return rng.normal(0, 0.01, int(seconds * WARMUP_SAMPLE_RATE)).astype(np.float32)
+
+
+class ModelPool:
+    """A WhisperModel with `workers` replicas, loaded and warmed on request."""
+
+    def __init__(self, model_name, device="cpu", compute_type=None, workers=2, cpu_threads=None, loader=None):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type or default_compute_type(device)
+        self.workers = workers
+        self.cpu_threads = cpu_threads or plan_cpu_threads(workers)
+        self._loader = loader or WhisperModel
+        self.model = None
+        self.state = LOADING
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def load(self, **warmup_options):
+        """Build the model and warm every replica. Returns the model; raises if loading fails."""
+        started = time.monotonic()
+        logger.info(f"Loading Whisper model {self.model_name} on {self.device} ({self.compute_type}, "
+                    f"{self.workers} workers x {self.cpu_threads} threads)")
+        try:
+            self.model = self._loader(self.model_name, device=self.device, compute_type=self.compute_type,
+                                      cpu_threads=self.cpu_threads, num_workers=self.workers)
+            self.load_seconds = time.monotonic() - started
+            self.state = WARMING
+            self.warmup(**warmup_options)
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.error(f"Failed to load Whisper model {self.model_name}: {e}", exc_info=True)
+            raise
+        self.state = READY
+        logger.info(f"Whisper model ready in {time.monotonic() - started:.1f}s "
+                    f"(load {self.load_seconds:.1f}s, warmup {self.warmup_seconds:.1f}s)")
+        return self.model
+
+    def warmup(self, **options):
+        """Decode synthetic audio on every replica at once, so none is cold on its first request."""
+        started = time.monotonic()
+        audio = warmup_audio()
+        errors = []
+
+        def decode():
+            try:
+                segments, _ = self.model.transcribe(audio, **options)
+                # faster-whisper decodes lazily, as the segments are consumed
+                list(segments)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=decode, name=f"whisper-warmup-{n}") for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        self.warmup_seconds = time.monotonic() - started
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "workers": self.workers,
+            "cpu_threads": self.cpu_threads,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds
+        }
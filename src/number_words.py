@@ -0,0 +1,65 @@
+"""
+Number word parsing for numbered-list detection.
+
+parse_number turns a single spoken token ("three", "twenty-one", "third",
+"21st", "12") into its value, or returns None. Tokens that contain anything
+but number words are rejected before word2number is called, and results are
+kept in a bounded LRU cache because the same few tokens recur in every report.
+"""
+import re
+from functools import lru_cache
+
+from word2number import w2n
+
+# Distinct tokens remembered by parse_number
+CACHE_SIZE = 4096
+
+NUMBER_WORDS = frozenset(w2n.american_number_system) | {'and'}
+
+ORDINAL_WORDS = {
+    'first': 'one', 'second': 'two', 'third': 'three', 'fifth': 'five',
+    'eighth': 'eight', 'ninth': 'nine', 'twelfth': 'twelve',
+}
+
+DIGIT_ORDINAL = re.compile(r'(\d+)(?:st|nd|rd|th)\Z')
+
+
+def cardinal_word(word):
+    """Return the cardinal form of an ordinal number word, or the word itself."""
+    if word in ORDINAL_WORDS:
+        return ORDINAL_WORDS[word]
+    if word.endswith('ieth'):
+        # twentieth, thirtieth, ...
+        return word[:-4] + 'y'
+    if word.endswith('th') and word[:-2] in w2n.american_number_system:
+        return word[:-2]
+    return word
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_number(token):
+    """Return the value of a (lowercase) number token, or None if it is not a number."""
+    if token.isdigit():
+        try:
+            return int(token)
+        except ValueError:
+            # Other unicode digits, e.g. superscripts
+            return None
+
+    match = DIGIT_ORDINAL.match(token)
+    if match:
+        return int(match.group(1))
+
+    words = token.replace('-', ' ').split()
+    if not words:
+        return None
+    # Only the last word of a compound can be an ordinal: "twenty-first"
+    words[-1] = cardinal_word(words[-1])
+    if not all(word in NUMBER_WORDS for word in words) or words == ['and']:
+        return None
+
+    try:
+        return w2n.word_to_num(' '.join(words))
+    except (ValueError, IndexError):
+        # word2number raises IndexError on malformed compounds like "thousand-one"
+        return None
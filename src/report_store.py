@@ -0,0 +1,210 @@
+"""
+Append-only report storage.
+
+Reports used to be written as one small JSON file each, synchronously,
+into the working directory. ReportStore appends them as JSON lines to
+segment files instead (reports/reports-000001.jsonl, a new segment every
+SEGMENT_SIZE bytes) from a writer thread. Everything queued while one
+fsync runs is written and synced together in the next batch, so a burst
+of saves costs one fsync, not one per report.
+
+An SQLite index (reports/index.sqlite) maps each id to its segment,
+offset and length, and is indexed by date, so a report is fetched with
+one seek instead of a directory listing. The segments are the source of
+truth: on startup, lines past the last indexed one are indexed again and
+a torn final line is cut off.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import Future
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Bytes written to a segment before the next one is started
+SEGMENT_SIZE = 64 * 1024 * 1024
+# Reports written and fsynced together at most
+MAX_BATCH = 256
+
+SEGMENT_PATTERN = re.compile(r'reports-(\d+)\.jsonl$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_date ON reports (date, timestamp);
+"""
+
+
+class ReportStore:
+    """Saves reports off the caller's thread and fetches them by id or date."""
+
+    def __init__(self, directory='reports', segment_size=SEGMENT_SIZE, max_batch=MAX_BATCH):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_batch = max_batch
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        self._file = None
+        self._recover()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"reports-{number:06d}.jsonl")
+
+    def _segments(self):
+        numbers = []
+        for path in glob.glob(os.path.join(self.directory, 'reports-*.jsonl')):
+            match = SEGMENT_PATTERN.search(path)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _recover(self):
+        """Index complete lines the index missed and drop a torn final line, then open the last segment."""
+        segments = self._segments()
+        with self._lock:
+            last_segment, indexed_end = self._db.execute(
+                "SELECT segment, MAX(offset + length) FROM reports "
+                "WHERE segment = (SELECT MAX(segment) FROM reports)").fetchone()
+        rows = []
+        for number in segments:
+            if last_segment is not None and number < last_segment:
+                continue
+            start = indexed_end if number == last_segment else 0
+            path = self._segment_path(number)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+            complete = data.rfind(b'\n') + 1
+            position = start
+            for line in data[:complete].splitlines(keepends=True):
+                try:
+                    rows.append(self._index_row(json.loads(line), number, position, len(line)))
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Skipping corrupt report line at {path}:{position}")
+                position += len(line)
+            if complete < len(data):
+                logger.warning(f"Dropping {len(data) - complete} bytes of an incomplete report in {path}")
+                os.truncate(path, start + complete)
+        if rows:
+            logger.info(f"Indexed {len(rows)} reports missing from the index")
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._open_segment(segments[-1] if segments else 1)
+
+    def _open_segment(self, number):
+        if self._file is not None:
+            self._file.close()
+        self._segment = number
+        self._file = open(self._segment_path(number), 'ab')
+        self._offset = self._file.tell()
+
+    @staticmethod
+    def _index_row(record, segment, offset, length):
+        created = datetime.strptime(record['timestamp'], "%Y%m%d_%H%M%S")
+        return record['id'], created.date().isoformat(), record['timestamp'], segment, offset, length
+
+    def submit(self, text):
+        """Queue a report. Returns a Future for its record, set once it is on disk."""
+        record = {
+            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "id": str(uuid.uuid4()),
+            "text": text
+        }
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    async def save(self, text):
+        """Save a report without blocking the event loop. Returns its record."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Whatever queued up during the last fsync goes out in this one
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            rows = []
+            for record, _ in batch:
+                if self._offset >= self.segment_size:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._open_segment(self._segment + 1)
+                line = (json.dumps(record) + '\n').encode('utf-8')
+                self._file.write(line)
+                rows.append(self._index_row(record, self._segment, self._offset, len(line)))
+                self._offset += len(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            logger.error(f"Failed to save {len(batch)} reports: {e}", exc_info=True)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for record, future in batch:
+            future.set_result(record)
+
+    def get(self, report_id):
+        """The report with `report_id`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT segment, offset, length FROM reports WHERE id = ?",
+                                   (report_id,)).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def ids_for_date(self, date):
+        """Ids of the reports saved on `date` (a date or 'YYYY-MM-DD'), oldest first."""
+        date = date if isinstance(date, str) else date.isoformat()
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM reports WHERE date = ? ORDER BY timestamp, segment, offset",
+                                    (date,)).fetchall()
+        return [report_id for report_id, in rows]
+
+    def close(self):
+        """Write out queued reports and close the files."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,139 @@
+"""
+Streaming polyphase resampling to Whisper's 16 kHz.
+
+The Streamlit apps used scipy.signal.resample: one FFT over the whole
+recording, on both channels, whose cost depends on the length's prime
+factors and whose memory grows with the recording. StreamingResampler
+does what scipy.signal.resample_poly does (same Kaiser FIR filter, same
+output), but a block at a time, keeping only the filter's worth of input
+between blocks. The filter for each rate pair is designed once and
+cached. resample_wav reads a WAV in fixed blocks and downmixes each one
+to mono before resampling, so only one channel is ever filtered.
+"""
+import io
+from functools import lru_cache
+from math import ceil, gcd
+
+import numpy as np
+from scipy.signal import firwin, upfirdn
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+WHISPER_SAMPLE_RATE = 16000
+# Input frames read and resampled at a time
+BLOCK_FRAMES = 65536
+
+
+def rate_ratio(from_rate, to_rate):
+    """(up, down) in lowest terms."""
+    divisor = gcd(int(from_rate), int(to_rate))
+    return int(to_rate) // divisor, int(from_rate) // divisor
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """
+    resample_poly's default anti-aliasing filter for `up`/`down`, padded
+    in front so its centre falls on a multiple of `down`. Returns
+    (filter, half length, centre).
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+    pad = -half_len % down
+    taps = np.concatenate((np.zeros(pad), taps)).astype(np.float32)
+    taps.setflags(write=False)
+    return taps, half_len, half_len + pad
+
+
+def to_mono(audio):
+    """Average the channels of (frames, channels) audio; 1-D audio is returned as is."""
+    audio = np.asarray(audio, dtype=np.float32)
+    return audio.mean(axis=1, dtype=np.float32) if audio.ndim == 2 else audio
+
+
+class StreamingResampler:
+    """Resamples a mono stream block by block; the blocks joined equal resample_poly of the whole."""
+
+    def __init__(self, from_rate, to_rate=WHISPER_SAMPLE_RATE):
+        self.up, self.down = rate_ratio(from_rate, to_rate)
+        if self.up == self.down == 1:
+            # Already at the target rate: blocks pass through
+            self.taps, self.half_len, self.centre = None, 0, 0
+        else:
+            self.taps, self.half_len, self.centre = polyphase_filter(self.up, self.down)
+        # Input kept from absolute sample `_start` on; `_start` stays a multiple of `down`
+        self._buffer = np.zeros(0, np.float32)
+        self._start = 0
+        self._received = 0
+        self._produced = 0
+
+    def _outputs(self, end):
+        """Output samples [_produced, end) from the buffered input."""
+        if end <= self._produced:
+            return np.zeros(0, np.float32)
+        if self.taps is None:
+            out = self._buffer[self._produced - self._start:end - self._start]
+        else:
+            filtered = upfirdn(self.taps, self._buffer, self.up, self.down)
+            offset = self.centre // self.down - self._start * self.up // self.down
+            out = filtered[self._produced + offset:end + offset]
+        self._produced = end
+        # Keep the input the next output still reaches back to
+        first_needed = max(0, (self._produced * self.down - self.half_len) // self.up)
+        start = max(self._start, first_needed - first_needed % self.down)
+        self._buffer = self._buffer[start - self._start:]
+        self._start = start
+        return out.astype(np.float32, copy=False)
+
+    def process(self, block):
+        """Resample the next mono block. Returns the output samples it completes."""
+        block = np.asarray(block, dtype=np.float32)
+        self._buffer = np.concatenate((self._buffer, block))
+        self._received += len(block)
+        # Output n needs input up to (n * down + half_len) / up
+        return self._outputs(max(0, (self._received * self.up - self.half_len - 1) // self.down + 1))
+
+    def flush(self):
+        """The output samples still held back for lack of later input."""
+        total = ceil(self._received * self.up / self.down)
+        self._buffer = np.concatenate((self._buffer, np.zeros(self.half_len // self.up + 1, np.float32)))
+        return self._outputs(total)
+
+
+def resample_stream(blocks, from_rate, to_rate=WHISPER_SAMPLE_RATE, frames=None):
+    """
+    Downmix and resample an iterable of (frames, channels) or mono blocks.
+    With `frames` (the input length) known, the output is filled in place
+    instead of collected and concatenated.
+    """
+    resampler = StreamingResampler(from_rate, to_rate)
+    if frames is None:
+        parts = [resampler.process(to_mono(block)) for block in blocks]
+        parts.append(resampler.flush())
+        return np.concatenate(parts)
+
+    out = np.empty(ceil(frames * resampler.up / resampler.down), np.float32)
+    position = 0
+    for block in blocks:
+        part = resampler.process(to_mono(block))
+        out[position:position + len(part)] = part
+        position += len(part)
+    part = resampler.flush()
+    out[position:position + len(part)] = part
+    return out[:position + len(part)]
+
+
+def resample_wav(wav_audio_data, to_rate=WHISPER_SAMPLE_RATE, block_frames=BLOCK_FRAMES):
+    """
+    Decode WAV bytes into mono float32 audio at `to_rate`, BLOCK_FRAMES at a time.
+
+    Returns:
+        tuple: (audio, sample rate of the WAV)
+    """
+    info = sf.info(io.BytesIO(wav_audio_data))
+    blocks = sf.blocks(io.BytesIO(wav_audio_data), blocksize=block_frames, dtype='float32', always_2d=True)
+    return resample_stream(blocks, info.samplerate, to_rate, info.frames), info.samplerate
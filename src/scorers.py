@@ -0,0 +1,140 @@
+"""
+Fuzzy scoring backends for macro and phrase matching.
+
+Every backend scores with WRatio on strings normalized the way
+fuzzywuzzy.process does it and reports integer scores. fuzzywuzzy is the
+default and the reference. rapidfuzz rounds once, after scaling the
+partial scores, where fuzzywuzzy rounds each partial score first, so a
+pair close to the 80/85/95 thresholds can land on the other side of one.
+"""
+import logging
+import os
+from functools import lru_cache
+
+from fuzzywuzzy import fuzz, process, utils
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    from rapidfuzz import fuzz as rf_fuzz
+    from rapidfuzz import process as rf_process
+except ImportError:
+    rf_process = None
+
+
+@lru_cache(maxsize=65536)
+def normalize(s):
+    """Normalize a string exactly like process.extractOne does before scoring."""
+    return utils.full_process(utils.full_process(s), force_ascii=True)
+
+
+class Scorer:
+    """Scores queries against choices. Subclasses implement score_matrix."""
+
+    name = None
+
+    def score_matrix(self, queries, choices):
+        """
+        Score every query against every choice.
+
+        Returns:
+            A len(queries) x len(choices) table of integer WRatio scores
+        """
+        raise NotImplementedError
+
+    def extract_one(self, query, choices):
+        """Return (choice, score) for the best scoring choice, like process.extractOne."""
+        choices = list(choices)
+        if not choices:
+            return None
+        scores = self.score_matrix([query], choices)[0]
+        best = _first_argmax(scores)
+        return choices[best], int(scores[best])
+
+    def best_matches(self, queries, choices, threshold):
+        """For each query, return the best choice scoring above `threshold`, or None."""
+        choices = list(choices)
+        if not choices:
+            return [None] * len(queries)
+        results = []
+        for scores in self.score_matrix(queries, choices):
+            best = _first_argmax(scores)
+            results.append(choices[best] if scores[best] > threshold else None)
+        return results
+
+
+def _first_argmax(scores):
+    # Ties go to the earliest choice, as in process.extractOne
+    best = 0
+    for j in range(1, len(scores)):
+        if scores[j] > scores[best]:
+            best = j
+    return best
+
+
+class FuzzywuzzyScorer(Scorer):
+    """Reference backend: fuzzywuzzy's WRatio, one pair at a time."""
+
+    name = 'fuzzywuzzy'
+
+    def score_matrix(self, queries, choices):
+        processed_choices = [normalize(choice) for choice in choices]
+        return [[fuzz.WRatio(processed_query, processed_choice, full_process=False)
+                 for processed_choice in processed_choices]
+                for processed_query in (normalize(query) for query in queries)]
+
+    def extract_one(self, query, choices):
+        return process.extractOne(query, choices)
+
+
+class RapidfuzzScorer(Scorer):
+    """Batched backend: one rapidfuzz cdist call per query/choice matrix. Opt in; see the module docstring."""
+
+    name = 'rapidfuzz'
+
+    def __init__(self, workers=1):
+        if rf_process is None:
+            raise ImportError("rapidfuzz is required for the rapidfuzz scorer")
+        self.workers = workers
+
+    def score_matrix(self, queries, choices):
+        scores = rf_process.cdist(
+            [normalize(query) for query in queries],
+            [normalize(choice) for choice in choices],
+            scorer=rf_fuzz.WRatio,
+            processor=None,
+            dtype=np.float64,
+            workers=self.workers,
+        )
+        # fuzzywuzzy reports rounded scores, so round before comparing with thresholds
+        return np.rint(scores).astype(np.int32)
+
+    def best_matches(self, queries, choices, threshold):
+        choices = list(choices)
+        if not choices or not queries:
+            return [None] * len(queries)
+        scores = self.score_matrix(queries, choices)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(queries)), best]
+        return [choices[j] if score > threshold else None for j, score in zip(best, best_scores)]
+
+
+SCORERS = {
+    FuzzywuzzyScorer.name: FuzzywuzzyScorer,
+    RapidfuzzScorer.name: RapidfuzzScorer,
+}
+
+
+def create_scorer(name=None, **kwargs):
+    """
+    Create a scorer by name.
+
+    Defaults to the MACRO_SCORER environment variable, then to fuzzywuzzy,
+    whose scores the matchers' thresholds were tuned on.
+    """
+    name = name or os.environ.get('MACRO_SCORER') or FuzzywuzzyScorer.name
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer: {name}")
+    logger.debug(f"Using {name} scorer")
+    return SCORERS[name](**kwargs)
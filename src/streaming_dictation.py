@@ -0,0 +1,171 @@
+"""
+Transcription of a recording while it is being made, for the Streamlit app.
+
+The app used to transcribe only after st_audiorec returned the whole
+recording, so the clinician waited for the full inference time after
+they stopped talking. DictationWorker takes audio as it is recorded and
+decodes it on a background thread:
+
+    - every STEP_SECONDS of new audio, the window since the last commit
+      point is decoded and shown as pending text
+    - the window is committed up to the middle of its last pause (or
+      whole, once it reaches MAX_WINDOW_SECONDS), decoded once more on
+      its own so no word is split, and never decoded again
+
+finish() then only has to decode the tail after the last commit point.
+The model is any callable taking 16 kHz float32 audio and returning text.
+The 16 kHz audio is kept so the recording can be saved afterwards.
+"""
+import logging
+import queue
+import threading
+from math import ceil
+
+import numpy as np
+
+from resampler import WHISPER_SAMPLE_RATE, StreamingResampler
+
+logger = logging.getLogger(__name__)
+
+# New audio decoded at a time for the pending text
+STEP_SECONDS = 2.0
+# A window without a pause is committed whole at this length (Whisper hears 30 s)
+MAX_WINDOW_SECONDS = 25.0
+# Silence this long between words is a safe place to cut
+PAUSE_SECONDS = 0.6
+# Windows are not cut closer than this to the commit point
+MIN_COMMIT_SECONDS = 1.0
+# Frame RMS below this (on -1..1 audio) is silence
+SILENCE_LEVEL = 0.01
+FRAME_SECONDS = 0.02
+
+
+def _frame_levels(audio, sample_rate):
+    frame = int(FRAME_SECONDS * sample_rate)
+    count = len(audio) // frame
+    frames = audio[:count * frame].reshape(count, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1)), frame
+
+
+def has_voice(audio, sample_rate=WHISPER_SAMPLE_RATE, silence_level=SILENCE_LEVEL):
+    """Whether any frame of `audio` is louder than silence."""
+    levels, _ = _frame_levels(audio, sample_rate)
+    return bool(len(levels)) and levels.max() >= silence_level
+
+
+def last_pause(audio, sample_rate=WHISPER_SAMPLE_RATE, pause_seconds=PAUSE_SECONDS,
+               silence_level=SILENCE_LEVEL, min_position=0):
+    """Sample position in the middle of the last pause of at least `pause_seconds`, or None."""
+    levels, frame = _frame_levels(audio, sample_rate)
+    edges = np.diff(np.concatenate(([0], (levels < silence_level).astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    needed = ceil(pause_seconds / FRAME_SECONDS)
+    for start, end in zip(starts[::-1], ends[::-1]):
+        if end - start >= needed:
+            position = (start + end) // 2 * frame
+            # Earlier pauses are closer still to the commit point
+            return position if position >= min_position else None
+    return None
+
+
+class DictationWorker:
+    """Decodes a recording in the background as it is fed; see the module docstring."""
+
+    def __init__(self, transcribe, step=STEP_SECONDS, max_window=MAX_WINDOW_SECONDS, pause=PAUSE_SECONDS,
+                 silence_level=SILENCE_LEVEL):
+        self.transcribe = transcribe
+        self.sample_rate = WHISPER_SAMPLE_RATE
+        self.step = int(step * self.sample_rate)
+        self.max_window = int(max_window * self.sample_rate)
+        self.pause = pause
+        self.silence_level = silence_level
+        self.decodes = 0
+        self.error = None
+        self._resampler = None
+        self._source_rate = None
+        self._window = np.zeros(0, np.float32)
+        self._undecoded = 0
+        self._committed = []
+        self._pending = ''
+        self._recording = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='dictation-worker', daemon=True)
+        self._thread.start()
+
+    def feed(self, samples, sample_rate):
+        """Queue mono float32 samples recorded at `sample_rate`. Returns at once."""
+        if sample_rate != self._source_rate:
+            if self._resampler is not None:
+                self._queue.put(self._resampler.flush())
+            self._resampler = StreamingResampler(sample_rate, self.sample_rate)
+            self._source_rate = sample_rate
+        self._queue.put(self._resampler.process(samples))
+
+    def snapshot(self):
+        """(committed, pending): the texts committed so far, oldest first, and the tentative text after them."""
+        with self._lock:
+            return list(self._committed), self._pending
+
+    def wait(self):
+        """Block until the audio fed so far has been taken in (and decoded, if a step was due)."""
+        self._queue.join()
+
+    def finish(self, timeout=None):
+        """Decode the audio after the last commit point and stop. Returns the whole text."""
+        if self._resampler is not None:
+            self._queue.put(self._resampler.flush())
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return ' '.join(self._committed)
+
+    def recording(self):
+        """The audio fed so far, at 16 kHz. Complete once finish() returned."""
+        return np.concatenate(self._recording) if self._recording else np.zeros(0, np.float32)
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                try:
+                    if chunk is None:
+                        self._commit(len(self._window))
+                        return
+                    self._recording.append(chunk)
+                    self._window = np.concatenate((self._window, chunk))
+                    self._undecoded += len(chunk)
+                    # Audio that queued up during the last decode is taken in one go
+                    if self._undecoded >= self.step and self._queue.empty():
+                        self._update()
+                finally:
+                    self._queue.task_done()
+        except Exception as e:
+            logger.error(f"Streaming transcription failed: {e}", exc_info=True)
+            self.error = e
+
+    def _decode(self, audio):
+        self.decodes += 1
+        return self.transcribe(audio).strip()
+
+    def _update(self):
+        self._undecoded = 0
+        if len(self._window) >= self.max_window:
+            self._commit(len(self._window))
+            return
+        position = last_pause(self._window, self.sample_rate, self.pause, self.silence_level,
+                              int(MIN_COMMIT_SECONDS * self.sample_rate))
+        if position is not None:
+            self._commit(position)
+        pending = self._decode(self._window) if has_voice(self._window, self.sample_rate, self.silence_level) else ''
+        with self._lock:
+            self._pending = pending
+
+    def _commit(self, position):
+        audio, self._window = self._window[:position], self._window[position:]
+        text = self._decode(audio) if has_voice(audio, self.sample_rate, self.silence_level) else ''
+        with self._lock:
+            if text:
+                self._committed.append(text)
+            self._pending = ''
@@ -0,0 +1,123 @@
+"""
+Rolling-window transcription of one audio stream.
+
+Transcribing every websocket chunk on its own pays the full encoder cost
+with no context and splits words at chunk edges. StreamingTranscriber
+keeps per-stream state instead:
+
+    - committed_until: the stream position (in samples) up to which the
+      text is final
+    - the committed text, tokenized once and cached as the prompt for
+      the next decode
+    - the window: audio from a short overlap before committed_until up to
+      the newest sample, read from the session's AudioRingBuffer
+
+Each decode() re-runs Whisper on the window only. Words that end more
+than HOLD_BACK_SECONDS before the end of the window are committed. The
+rest come back as pending text and are decoded again, with more audio,
+on the next call. Words in the overlap were committed by the previous
+call and are dropped.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Whisper timestamps are in seconds of 16 kHz audio
+WHISPER_SAMPLE_RATE = 16000
+# Audio re-decoded before the commit point, for context at the seam
+OVERLAP_SECONDS = 1.0
+# Words ending this close to the end of the window may still change
+HOLD_BACK_SECONDS = 1.5
+# A window this long is committed whole, so it cannot grow past the ring buffer
+MAX_WINDOW_SECONDS = 20.0
+# Whisper's prompt holds at most n_text_ctx // 2 - 1 tokens
+MAX_PROMPT_TOKENS = 223
+
+
+class StreamingTranscriber:
+    """Decodes a stream's new audio with the committed text as context."""
+
+    def __init__(self, model, ring, overlap=OVERLAP_SECONDS, hold_back=HOLD_BACK_SECONDS,
+                 max_window=MAX_WINDOW_SECONDS, **transcribe_options):
+        if getattr(ring, 'sample_rate', WHISPER_SAMPLE_RATE) != WHISPER_SAMPLE_RATE:
+            # Every position and duration below is in samples of 16 kHz audio
+            raise ValueError(f"StreamingTranscriber needs a {WHISPER_SAMPLE_RATE} Hz ring, got {ring.sample_rate} Hz")
+        self.model = model
+        self.ring = ring
+        self.overlap = int(overlap * WHISPER_SAMPLE_RATE)
+        self.hold_back = int(hold_back * WHISPER_SAMPLE_RATE)
+        self.max_window = min(int(max_window * WHISPER_SAMPLE_RATE), ring.capacity)
+        self.transcribe_options = transcribe_options
+        # faster-whisper takes the prompt as token ids, so it is encoded only once
+        self._tokenizer = getattr(model, 'hf_tokenizer', None)
+        self.reset()
+
+    def reset(self):
+        """Forget the text so far and continue from the newest audio."""
+        self.committed_until = self.ring.written
+        self.committed_text = ''
+        self.pending_text = ''
+        self._prompt_tokens = []
+
+    def _remember(self, text):
+        self.committed_text = (self.committed_text + ' ' + text).strip()
+        if self._tokenizer is not None:
+            self._prompt_tokens.extend(self._tokenizer.encode(' ' + text, add_special_tokens=False).ids)
+            del self._prompt_tokens[:-MAX_PROMPT_TOKENS]
+
+    @property
+    def prompt(self):
+        """The initial_prompt for the next decode: cached token ids, or the text tail."""
+        if self._tokenizer is not None:
+            return list(self._prompt_tokens) or None
+        return ' '.join(self.committed_text.split()[-MAX_PROMPT_TOKENS // 2:]) or None
+
+    def decode(self, final=False):
+        """
+        Decode the audio after the commit point. Blocks; run it off the event loop.
+        With `final` (the stream ended) every decoded word is committed.
+
+        Returns:
+            (committed, pending): text newly final in this call, and the
+            tentative text after it
+        """
+        end = self.ring.written
+        start = max(self.committed_until - self.overlap, end - self.ring.capacity, 0)
+        if end - max(start, self.committed_until) <= 0:
+            return (self.finish(), '') if final else ('', self.pending_text)
+        window = self.ring.read(start, end)
+        seam = (self.committed_until - start) / WHISPER_SAMPLE_RATE
+        duration = (end - start) / WHISPER_SAMPLE_RATE
+        hold_back = 0 if final or end - start >= self.max_window else self.hold_back / WHISPER_SAMPLE_RATE
+
+        segments, _ = self.model.transcribe(window, initial_prompt=self.prompt, word_timestamps=True,
+                                            **self.transcribe_options)
+        # Words centred in the overlap were committed by the previous call
+        words = [word for segment in segments for word in (segment.words or ())
+                 if (word.start + word.end) / 2 >= seam]
+
+        settled = [word for word in words if word.end <= duration - hold_back]
+        tentative = words[len(settled):]
+        committed = ''.join(word.word for word in settled).strip()
+        self.pending_text = ''.join(word.word for word in tentative).strip()
+
+        if settled:
+            self._remember(committed)
+        if final:
+            self.committed_until = end
+        elif settled:
+            self.committed_until = start + int(settled[-1].end * WHISPER_SAMPLE_RATE)
+        elif not tentative:
+            # Nothing but silence: keep only the tail a word could be starting in
+            self.committed_until = max(self.committed_until, end - int(hold_back * WHISPER_SAMPLE_RATE))
+        logger.debug(f"Decoded {duration:.1f}s window: committed {committed!r}, pending {self.pending_text!r}")
+        return committed, self.pending_text
+
+    def finish(self):
+        """Commit the pending text, e.g. when the stream ends. Returns it."""
+        committed = self.pending_text
+        if committed:
+            self._remember(committed)
+        self.pending_text = ''
+        self.committed_until = self.ring.written
+        return committed
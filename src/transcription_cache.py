@@ -0,0 +1,121 @@
+"""
+Transcription cache keyed by content, for the Streamlit app.
+
+The app used to decide whether to transcribe by comparing the recording's
+bytes with the copy it kept in session state, so each session held its
+whole WAV, and the same audio was transcribed again in every new session.
+Now the session keeps only audio_digest() of the recording, and
+transcriptions are cached under cache_key(digest, model, options):
+
+    - in memory, the `capacity` most recently used (LRUCache)
+    - optionally on disk, one small JSON file per key under `directory`,
+      so a reopened or retried recording is found after a restart too
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from macro_store import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Transcriptions kept in memory
+CACHE_SIZE = 256
+
+
+def audio_digest(data):
+    """Hex digest of recorded audio bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cache_key(digest, model, options=None):
+    """Key for the transcription of audio `digest` by `model` with decode `options`."""
+    identity = json.dumps([digest, model, options or {}], sort_keys=True, default=str)
+    return hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """A thread-safe mapping that keeps its `capacity` most recently used entries."""
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+class TranscriptionCache:
+    """Transcriptions by cache_key, in an in-memory LRU backed by an optional directory."""
+
+    def __init__(self, capacity=CACHE_SIZE, directory=None):
+        self.directory = directory
+        self.memory = LRUCache(capacity)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Sized by TRANSCRIPTION_CACHE_SIZE; on disk under TRANSCRIPTION_CACHE_DIR if it is set."""
+        return cls(int(os.environ.get('TRANSCRIPTION_CACHE_SIZE', CACHE_SIZE)),
+                   os.environ.get('TRANSCRIPTION_CACHE_DIR') or None)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key):
+        """The cached transcription for `key`, or None."""
+        text = self.memory.get(key)
+        if text is not None:
+            self.hits += 1
+            return text
+        if self.directory:
+            try:
+                with open(self._path(key), 'r') as f:
+                    text = json.load(f)['text']
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            if text is not None:
+                self.disk_hits += 1
+                self.memory.put(key, text)
+                return text
+        self.misses += 1
+        return None
+
+    def put(self, key, text):
+        self.memory.put(key, text)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, json.dumps({"text": text}))
+
+    def get_or_transcribe(self, key, transcribe):
+        """The cached transcription for `key`, or transcribe() cached under it."""
+        text = self.get(key)
+        if text is None:
+            text = transcribe()
+            self.put(key, text)
+        return text
@@ -0,0 +1,101 @@
+"""
+Bounded worker pool for blocking speech-to-text calls.
+
+The websocket handlers are coroutines, so a blocking whisper.transcribe
+call (and the segment generator it returns, which is where decoding
+actually happens) stalls every connection on the event loop.
+TranscriptionPool runs those calls on a small thread pool instead:
+CTranslate2 releases the GIL while decoding, and a WhisperModel created
+with num_workers=N serves N threads at once from one copy of the model.
+
+At most max_pending calls are queued or running. Past that, run() waits
+up to wait_timeout for a slot and then raises TranscriptionBusy, so a
+burst of clients gets backpressure instead of an ever-growing queue.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBusy(Exception):
+    """Raised when every slot of the pool is taken and none freed up in time."""
+
+
+class TranscriptionPool:
+    """Runs blocking transcription calls for asyncio code, `workers` at a time."""
+
+    def __init__(self, workers=2, max_pending=32, wait_timeout=5.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcribe')
+        self._slots = asyncio.Semaphore(max_pending)
+        self._lock = threading.Lock()
+        # Submitted and not finished yet; only touched on the event loop
+        self.pending = 0
+        # Counters below are updated by the worker threads under _lock
+        self.running = 0
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    async def run(self, func, *args):
+        """Run func(*args) on a worker thread and return its result."""
+        submitted = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise TranscriptionBusy(f"{self.pending} transcriptions pending") from None
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self._executor.submit(self._timed, func, args, submitted)
+        # The slot stays taken until the call finishes, even if the caller gives up waiting
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        if self.pending > self.workers:
+            logger.debug(f"Transcription queue depth: {self.pending - self.workers}")
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+        self._slots.release()
+
+    def _timed(self, func, args, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self.running += 1
+            self.started += 1
+            self._wait_total += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self._run_total += time.perf_counter() - started
+
+    def stats(self):
+        """Queue depth and timing counters, for the metrics endpoint."""
+        with self._lock:
+            running, started, completed = self.running, self.started, self.completed
+            wait_total, run_total = self._wait_total, self._run_total
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "running": running,
+            "queue_depth": max(0, self.pending - running),
+            "completed": completed,
+            "rejected": self.rejected,
+            "mean_wait_ms": 1000 * wait_total / started if started else 0.0,
+            "mean_run_ms": 1000 * run_total / completed if completed else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
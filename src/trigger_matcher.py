@@ -0,0 +1,246 @@
+import math
+from collections import Counter
+from functools import lru_cache
+
+from fuzzywuzzy import fuzz
+
+from scorers import create_scorer, normalize
+
+# Unscaled weights used by WRatio
+UNBASE_SCALE = .95
+PARTIAL_SCALE = .90
+LONG_PARTIAL_SCALE = .6
+
+# Memoized lookups kept per vocabulary before the memo is reset
+MAX_MEMO_SIZE = 65536
+
+
+@lru_cache(maxsize=MAX_MEMO_SIZE)
+def insert_ratio(word):
+    """fuzz.ratio of a lowercase word against "insert"."""
+    return fuzz.ratio(word, 'insert')
+
+
+class FuzzyChoice:
+    """A fuzzy choice with the statistics needed to bound its WRatio score."""
+
+    __slots__ = ('key', 'processed', 'length', 'counts', 'single_token', 'tokens', 'token_length')
+
+    def __init__(self, key):
+        self.key = key
+        self.processed = normalize(key)
+        self.length = len(self.processed)
+        self.counts = Counter(self.processed)
+        self.single_token = ' ' not in self.processed
+        self.tokens = set(self.processed.split())
+        # Length of the shortest string the token ratios compare: the distinct tokens joined
+        self.token_length = len(' '.join(self.tokens))
+
+
+def _overlap(counts_a, counts_b):
+    """Size of the character multiset intersection of two strings."""
+    if len(counts_a) > len(counts_b):
+        counts_a, counts_b = counts_b, counts_a
+    return sum(min(n, counts_b[c]) for c, n in counts_a.items() if c in counts_b)
+
+
+def wratio_upper_bound(processed, counts, choice):
+    """
+    Upper bound on WRatio(processed, choice.processed).
+
+    Every matching character counted by the ratio (difflib, Levenshtein or
+    rapidfuzz) is a common character, so the character multiset overlap
+    bounds both the plain and the partial ratio. Token based scores only
+    exceed the plain ones when either side has more than one token. Each
+    part is rounded up so the bound holds for rounded and unrounded scores.
+    """
+    length = len(processed)
+    if not length or not choice.length:
+        return 0
+    overlap = _overlap(counts, choice.counts)
+    shortest = min(length, choice.length)
+    len_ratio = max(length, choice.length) / shortest
+    single_token = choice.single_token and ' ' not in processed
+
+    bound = math.ceil(100 * (2.0 * overlap / (length + choice.length)))
+    if len_ratio < 1.5:
+        if not single_token:
+            bound = max(bound, 100 * UNBASE_SCALE)
+        return math.ceil(bound)
+
+    scale = LONG_PARTIAL_SCALE if len_ratio > 8 else PARTIAL_SCALE
+    # A partial window may be shorter than `shortest`, hence the looser form
+    partial = math.ceil(100 * (2.0 * overlap / (shortest + overlap))) if overlap else 0
+    if not single_token:
+        partial = max(partial, 100 * UNBASE_SCALE)
+    return math.ceil(max(bound, partial * scale))
+
+
+def wratio_bound(query, choice):
+    """
+    Upper bound on WRatio(query.processed, choice.processed) for two FuzzyChoices.
+
+    Unlike wratio_upper_bound, the token based scores are bounded too. With
+    no token in common, the token sort and token set ratios compare strings
+    made of each side's characters, at least as long as its distinct tokens
+    joined by single spaces, so the character multiset overlap bounds them
+    as well. Sharing a token can score 100. Each score is bounded the way
+    fuzzywuzzy rounds it, so the bound holds for every pair.
+    """
+    if not query.length or not choice.length:
+        return 0
+    if query.tokens & choice.tokens:
+        return 100
+    overlap = _overlap(query.counts, choice.counts)
+    bound = math.ceil(100 * (2.0 * overlap / (query.length + choice.length)))
+    token = math.ceil(100 * (2.0 * overlap / (query.token_length + choice.token_length)))
+    len_ratio = max(query.length, choice.length) / min(query.length, choice.length)
+    if len_ratio < 1.5:
+        return math.ceil(max(bound, token * UNBASE_SCALE))
+
+    scale = LONG_PARTIAL_SCALE if len_ratio > 8 else PARTIAL_SCALE
+    # A partial window may be shorter than the shorter string, hence the looser form
+    partial = math.ceil(100 * (2.0 * overlap / (min(query.length, choice.length) + overlap))) if overlap else 0
+    partial_token = (math.ceil(100 * (2.0 * overlap / (min(query.token_length, choice.token_length) + overlap)))
+                     if overlap else 0)
+    return math.ceil(max(bound, partial * scale, partial_token * UNBASE_SCALE * scale))
+
+
+class FuzzyVocabulary:
+    """
+    A fixed list of choices compiled for repeated extractOne-style lookups.
+
+    Exact (normalized) hits are answered from a dict. Otherwise only the
+    choices whose score bound can beat the threshold are handed to the
+    scorer, so the result is the same as scoring every choice.
+    """
+
+    def __init__(self, choices, scorer=None):
+        self.scorer = scorer or create_scorer()
+        self.choices = [FuzzyChoice(key) for key in choices]
+        self.exact = {}
+        for choice in self.choices:
+            if choice.processed:
+                self.exact.setdefault(choice.processed, choice.key)
+        self._memo = {}
+
+    def candidates(self, processed, threshold):
+        """Choices that could score above `threshold` against `processed`."""
+        counts = Counter(processed)
+        return [choice.key for choice in self.choices
+                if wratio_upper_bound(processed, counts, choice) > threshold]
+
+    def _remember(self, processed, threshold, best_match):
+        if len(self._memo) >= MAX_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[(processed, threshold)] = best_match
+
+    def prefetch(self, queries, threshold):
+        """Score every unresolved query in one matrix call and memoize the results."""
+        pending = {}
+        for query in queries:
+            processed = normalize(query)
+            if not processed or processed in self.exact or (processed, threshold) in self._memo:
+                continue
+            if processed not in pending:
+                pending[processed] = set(self.candidates(processed, threshold))
+
+        candidates = set().union(*pending.values())
+        if not candidates:
+            for processed in pending:
+                self._remember(processed, threshold, None)
+            return
+        # Keep vocabulary order so ties resolve like a full scan
+        choices = [choice.key for choice in self.choices if choice.key in candidates]
+        queries = list(pending)
+        for processed, best_match in zip(queries, self.scorer.best_matches(queries, choices, threshold)):
+            self._remember(processed, threshold, best_match)
+
+    def match(self, query, threshold):
+        """Return the best choice scoring above `threshold`, or None."""
+        processed = normalize(query)
+        if not processed:
+            return None
+        if processed in self.exact:
+            return self.exact[processed]
+        if (processed, threshold) in self._memo:
+            return self._memo[(processed, threshold)]
+        candidates = self.candidates(processed, threshold)
+        best_match = None
+        if candidates:
+            result = self.scorer.extract_one(query, candidates)
+            if result and result[1] > threshold:
+                best_match = result[0]
+        self._remember(processed, threshold, best_match)
+        return best_match
+
+
+class TriggerMatcher:
+    """
+    Compiled matcher for the spoken triggers used by process_text.
+
+    Built once per phrase table: punctuation phrases ("period", "new line",
+    "close paren", ...) and the "insert macro" command are looked up by their
+    normalized one and two word windows, and fuzzy scoring only runs for
+    windows that are near misses of a trigger.
+    """
+
+    INSERT_VARIATIONS = ['insert', 'add', 'include']
+    MACRO_VARIATIONS = ['macro', 'macros', 'macro:', 'macros:']
+    LIST_SEPARATORS = {"period", ".", "period.", "period,"}
+
+    PHRASE_THRESHOLD = 95
+    COMMAND_THRESHOLD = 85
+    INSERT_RATIO_THRESHOLD = 80
+
+    def __init__(self, replace_phrases, scorer=None):
+        self.scorer = scorer or create_scorer()
+        self.replace_phrases = dict(replace_phrases)
+        self.phrases = FuzzyVocabulary(self.replace_phrases.keys(), self.scorer)
+        self.insert_words = FuzzyVocabulary(self.INSERT_VARIATIONS, self.scorer)
+        self.macro_words = FuzzyVocabulary(self.MACRO_VARIATIONS, self.scorer)
+
+    def prefetch(self, lines):
+        """Batch score every phrase window of a transcript, given as lists of words."""
+        queries = []
+        for words in lines:
+            for i in range(len(words)):
+                queries.append(' '.join(words[i:i+2]).lower())
+                queries.append(words[i].lower())
+        self.phrases.prefetch(queries, self.PHRASE_THRESHOLD)
+
+    def match_phrase(self, phrase):
+        """Return the replacement for a spoken punctuation phrase, or None."""
+        best_match = self.phrases.match(phrase, self.PHRASE_THRESHOLD)
+        if best_match is None:
+            return None
+        return self.replace_phrases[best_match]
+
+    def is_list_separator(self, word):
+        """Check if a word marks the preceding number as a list item."""
+        return word.lower() in self.LIST_SEPARATORS
+
+    def is_macro_command(self, words, i):
+        """Check if the current position contains a macro insertion command."""
+        if i >= len(words) - 1:
+            return False
+
+        current_word = words[i].lower().rstrip(',:')
+        next_word = words[i + 1].lower().rstrip(',:')
+
+        # Direct match check
+        if current_word in self.INSERT_VARIATIONS and next_word in self.MACRO_VARIATIONS:
+            return True
+
+        # Fuzzy match check for cases with typos
+        return (self.insert_words.match(current_word, self.COMMAND_THRESHOLD) is not None and
+                self.macro_words.match(next_word, self.COMMAND_THRESHOLD) is not None)
+
+    def is_insert_macro(self, words, i, fuzzy=True):
+        """Check for "insert macro" followed by a key, allowing a misheard "insert" if `fuzzy`."""
+        if i >= len(words) - 2 or words[i + 1].lower() != 'macro':
+            return False
+        word = words[i].lower()
+        if word == 'insert':
+            return True
+        return fuzzy and insert_ratio(word) > self.INSERT_RATIO_THRESHOLD
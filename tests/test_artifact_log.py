@@ -0,0 +1,89 @@
+import csv
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import scipy.io.wavfile as wavfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from artifact_log import ArtifactLog, sf
+
+
+def wav_bytes(samples, sample_rate=16000):
+    buffer = io.BytesIO()
+    wavfile.write(buffer, sample_rate, samples)
+    return buffer.getvalue()
+
+
+class TestArtifactLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = ArtifactLog(self.tmpdir.name)
+
+    def tearDown(self):
+        self.log.close()
+        self.tmpdir.cleanup()
+
+    def test_save_and_get(self):
+        id = self.log.save('raw\ntext', 'Final text.', 'Edited text.', 'whisper-small')
+        record = self.log.get(id)
+        self.assertEqual((record['raw'], record['final'], record['edited'], record['model']),
+                         ('raw\ntext', 'Final text.', 'Edited text.', 'whisper-small'))
+        self.assertIsNone(self.log.audio(id))
+        self.assertIsNone(self.log.get('missing'))
+
+    def test_directory_created_on_first_save(self):
+        directory = os.path.join(self.tmpdir.name, 'artifacts')
+        log = ArtifactLog(directory)
+        self.assertEqual((len(log), list(log.records()), log.get('missing')), (0, [], None))
+        self.assertFalse(os.path.exists(directory))
+        log.save('raw', 'final', 'edited', 'small')
+        self.assertEqual(len(log), 1)
+        log.close()
+
+    def test_records_filtered_and_ordered(self):
+        self.log.save('b', 'b', 'b', 'small', timestamp='2024-01-02 09:00:00')
+        self.log.save('a', 'a', 'a', 'small', timestamp='2024-01-01 09:00:00')
+        self.log.save('c', 'c', 'c', 'large', timestamp='2024-01-03 09:00:00')
+        self.assertEqual([record['raw'] for record in self.log.records()], ['a', 'b', 'c'])
+        self.assertEqual([record['raw'] for record in self.log.records(model='small')], ['a', 'b'])
+        self.assertEqual([record['raw'] for record in self.log.records(since='2024-01-02')], ['b', 'c'])
+
+    def test_audio_round_trip(self):
+        samples = (np.sin(np.arange(16000) / 10) * 20000).astype(np.int16)
+        id = self.log.save('raw', 'final', 'edited', 'small', wav_bytes(samples))
+        audio_format, data = self.log.audio(id)
+        if sf is None:
+            self.assertEqual((audio_format, data), ('wav', wav_bytes(samples)))
+            return
+        self.assertEqual(audio_format, 'flac')
+        self.assertLess(len(data), len(wav_bytes(samples)))
+        decoded, rate = sf.read(io.BytesIO(data), dtype='int16')
+        self.assertEqual(rate, 16000)
+        np.testing.assert_array_equal(decoded, samples)
+
+    def test_import_tsv(self):
+        tsv_path = os.path.join(self.tmpdir.name, 'transcriptions.tsv')
+        audio_directory = os.path.join(self.tmpdir.name, 'audio')
+        os.makedirs(audio_directory)
+        with open(os.path.join(audio_directory, 'id-1.wav'), 'wb') as f:
+            f.write(wav_bytes(np.zeros(160, np.int16)))
+        with open(tsv_path, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow([0, 'id-1', 'first line\nsecond line', 'final', 'edited', 'model', '2024-01-01 09:00:00'])
+            writer.writerow([0, 'id-2', 'raw', 'final', 'edited', 'model', '2024-01-02 09:00:00'])
+        self.assertEqual(self.log.import_tsv(tsv_path, audio_directory), 2)
+        # Importing again adds nothing
+        self.assertEqual(self.log.import_tsv(tsv_path, audio_directory), 0)
+        self.assertEqual(len(self.log), 2)
+        self.assertEqual(self.log.get('id-1')['raw'], 'first line\nsecond line')
+        self.assertIsNotNone(self.log.audio('id-1'))
+        self.assertIsNone(self.log.audio('id-2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
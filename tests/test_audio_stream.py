@@ -0,0 +1,91 @@
+import base64
+import os
+import sys
+import unittest
+
+import numpy as np
+from scipy.signal import resample_poly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from audio_stream import AudioFormatError, AudioRingBuffer, AudioSession
+
+
+class TestAudioRingBuffer(unittest.TestCase):
+    def test_wraps_and_reads_by_absolute_position(self):
+        ring = AudioRingBuffer(8)
+        ring.write(np.arange(6, dtype=np.float32))
+        ring.write(np.arange(6, 11, dtype=np.float32))
+        self.assertEqual(ring.written, 11)
+        np.testing.assert_array_equal(ring.read(3), np.arange(3, 11))
+        np.testing.assert_array_equal(ring.read(8, 10), [8, 9])
+        with self.assertRaises(ValueError):
+            ring.read(2)
+
+    def test_unwrapped_read_is_a_view(self):
+        ring = AudioRingBuffer(8)
+        ring.write(np.ones(4, dtype=np.float32))
+        self.assertTrue(np.shares_memory(ring.read(0), ring._data))
+
+    def test_oversized_write_keeps_newest(self):
+        ring = AudioRingBuffer(4)
+        ring.write(np.arange(10, dtype=np.float32))
+        self.assertEqual(ring.written, 10)
+        np.testing.assert_array_equal(ring.read(6), [6, 7, 8, 9])
+
+
+class TestAudioSession(unittest.TestCase):
+    def test_int16_frames_are_scaled(self):
+        session = AudioSession(ring_seconds=1)
+        session.start({"session": "abc", "sample_rate": 16000, "format": "int16", "seq": 5})
+        pcm = np.array([0, 16384, -32768], dtype='<i2')
+        seq, samples = session.write_frame(pcm.tobytes())
+        self.assertEqual(seq, 5)
+        self.assertEqual(samples.dtype, np.float32)
+        np.testing.assert_array_equal(samples, [0, .5, -1])
+        self.assertEqual(session.write_frame(pcm.tobytes())[0], 6)
+
+    def test_float32_frames(self):
+        session = AudioSession(ring_seconds=1)
+        session.start({"sample_rate": 16000, "format": "float32"})
+        pcm = np.linspace(-1, 1, 100, dtype='<f4')
+        _, samples = session.write_frame(pcm.tobytes())
+        np.testing.assert_array_equal(samples, pcm)
+        self.assertEqual(session.ring.capacity, 16000)
+
+    def test_browser_rates_are_resampled_to_16k(self):
+        session = AudioSession(ring_seconds=2)
+        session.start({"sample_rate": 48000, "format": "int16"})
+        pcm = (np.sin(np.arange(48000) * 2 * np.pi * 440 / 48000) * 16000).astype('<i2')
+        for frame in np.split(pcm, 10):
+            session.write_frame(frame.tobytes())
+        session.flush()
+        self.assertEqual((session.ring.sample_rate, session.ring.capacity), (16000, 32000))
+        # One second at 48 kHz is one second of ring positions
+        self.assertEqual(session.ring.written, 16000)
+        np.testing.assert_allclose(session.ring.read(0), resample_poly(pcm / 32768.0, 1, 3), atol=1e-4)
+
+    def test_json_fallback_matches_binary(self):
+        pcm = np.array([1, -2, 300, -32768, 32767], dtype='<i2')
+        binary = AudioSession()
+        binary.start({"sample_rate": 16000, "format": "int16"})
+        fallback = AudioSession()
+        np.testing.assert_array_equal(fallback.write_base64(base64.b64encode(pcm.tobytes()), 16000),
+                                      binary.write_frame(pcm.tobytes())[1])
+        np.testing.assert_array_equal(fallback.ring.read(0), pcm.astype(np.float32) / 32768.0)
+
+    def test_rejects_bad_input(self):
+        session = AudioSession()
+        with self.assertRaises(AudioFormatError):
+            session.write_frame(b'\x00\x00')
+        with self.assertRaises(AudioFormatError):
+            session.start({"sample_rate": 16000, "format": "mp3"})
+        with self.assertRaises(AudioFormatError):
+            session.start({"format": "int16"})
+        session.start({"sample_rate": 16000, "format": "float32"})
+        with self.assertRaises(AudioFormatError):
+            session.write_frame(b'\x00' * 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
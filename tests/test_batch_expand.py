@@ -0,0 +1,62 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from artifact_log import ArtifactLog
+from batch_expand import expand_records, read_artifact_log, read_tsv
+from macro_processor import process_text
+
+
+class TestBatchExpand(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.macros = {"normal thorax": "Normal thorax text."}
+        self.macros_path = os.path.join(self.tmpdir.name, 'macros.json')
+        with open(self.macros_path, 'w') as f:
+            json.dump(self.macros, f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_tsv_artifact_layout(self):
+        path = os.path.join(self.tmpdir.name, 'transcriptions.tsv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow([0, 'id-1', 'first line\nsecond line', 'final', 'edited', 'model', 'timestamp'])
+        self.assertEqual(list(read_tsv(path)), [('id-1', 'first line\nsecond line')])
+
+    def test_read_artifact_log(self):
+        log = ArtifactLog(self.tmpdir.name)
+        first = log.save('first', 'First.', 'First.', 'small', timestamp='2024-01-01 09:00:00')
+        log.save('second', 'Second.', 'Second.', 'large', timestamp='2024-01-02 09:00:00')
+        log.close()
+        path = os.path.join(self.tmpdir.name, 'transcriptions.sqlite')
+        self.assertEqual([text for _, text in read_artifact_log(path)], ['first', 'second'])
+        self.assertEqual(list(read_artifact_log(path, model='small')), [(first, 'first')])
+
+    def test_expand_records_matches_process_text(self):
+        texts = ["insert macro normal thorax period", "one period lungs clear comma heart normal"] * 5
+        records = list(enumerate(texts))
+        results = list(expand_records(records, self.macros_path, processes=2, chunksize=2))
+        self.assertEqual([result["id"] for result in results], list(range(len(texts))))
+        for result, text in zip(results, texts):
+            self.assertEqual(result["text"], process_text(text, self.macros))
+
+    def test_expand_records_reads_lazily(self):
+        # An endless input must be read a bounded number of chunks ahead, and stopping early must not hang
+        read = []
+        records = ((n, "normal thorax") for n in itertools.count() if not read.append(n))
+        results = expand_records(records, self.macros_path, processes=2, chunksize=4)
+        self.assertEqual([result["id"] for result in itertools.islice(results, 10)], list(range(10)))
+        results.close()
+        self.assertLess(len(read), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import os
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from batch_scheduler import FALLBACK, BatchScheduler, WhisperBatchDecoder, _Request
+
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None
+
+# Fixture clip and model for the parity test against WhisperModel.transcribe
+FIXTURE_CLIP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'WhisperLive', 'assets', 'jfk.flac')
+PARITY_MODEL = os.environ.get('WHISPER_TEST_MODEL', 'tiny.en')
+
+
+class FakeDecoder:
+    """Transcribes a window as the text of its first sample; -1 asks for fallback."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def accepts(self, request):
+        return len(request.audio) <= 10
+
+    def decode(self, requests):
+        self.batches.append(len(requests))
+        if self.fail:
+            raise RuntimeError("decoder broke")
+        return [FALLBACK if request.audio[0] < 0 else ([f"batched {int(request.audio[0])}"], None)
+                for request in requests]
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, **options):
+        self.calls += 1
+        return [f"alone {int(audio[0])}"], None
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+
+    def run_sessions(self, scheduler, windows, **options):
+        results = [None] * len(windows)
+        start = threading.Barrier(len(windows))
+
+        def session(n):
+            start.wait()
+            results[n] = scheduler.transcribe(windows[n], **options)[0]
+
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(len(windows))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_windows_share_batches(self):
+        decoder = FakeDecoder()
+        scheduler = BatchScheduler(self.model, max_batch_size=8, max_wait=0.2, decoder=decoder)
+        windows = [np.full(4, n, np.float32) for n in range(6)]
+        results = self.run_sessions(scheduler, windows, language='en')
+        scheduler.close()
+        self.assertEqual(results, [[f"batched {n}"] for n in range(6)])
+        self.assertEqual(sum(decoder.batches), 6)
+        self.assertLess(len(decoder.batches), 6)
+        self.assertEqual(scheduler.stats()["batched_windows"], 6)
+
+    def test_batch_size_is_capped(self):
+        decoder = FakeDecoder()
+        scheduler = BatchScheduler(self.model, max_batch_size=2, max_wait=0.2, decoder=decoder)
+        self.run_sessions(scheduler, [np.full(4, n, np.float32) for n in range(5)])
+        scheduler.close()
+        self.assertLessEqual(max(decoder.batches), 2)
+
+    def test_unbatchable_and_fallback_go_to_the_model(self):
+        scheduler = BatchScheduler(self.model, max_wait=0, decoder=FakeDecoder())
+        self.assertEqual(scheduler.transcribe(np.full(20, 3, np.float32))[0], ["alone 3"])
+        self.assertEqual(scheduler.transcribe(np.full(4, -1, np.float32))[0], ["alone -1"])
+        self.assertEqual(scheduler.transcribe(np.full(4, 2, np.float32))[0], ["batched 2"])
+        scheduler.close()
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual(scheduler.stats()["unbatched_windows"], 2)
+
+    def test_decoder_errors_reach_every_caller(self):
+        scheduler = BatchScheduler(self.model, max_wait=0, decoder=FakeDecoder(fail=True))
+        with self.assertRaises(RuntimeError):
+            scheduler.transcribe(np.zeros(4, np.float32))
+        scheduler.close()
+
+    def test_transcribe_after_close_raises(self):
+        scheduler = BatchScheduler(self.model, max_wait=0, decoder=FakeDecoder())
+        scheduler.close()
+        scheduler.close()
+        # Neither path may block on the stopped batcher thread
+        with self.assertRaises(RuntimeError):
+            scheduler.transcribe(np.full(4, 1, np.float32))
+        with self.assertRaises(RuntimeError):
+            scheduler.transcribe(np.full(20, 1, np.float32))
+        self.assertEqual(self.model.calls, 0)
+
+
+class FakeTokenizer:
+    """Token ids below 100 are words, 100 is end of text, 101 and up are timestamps."""
+    eot = 100
+    timestamp_begin = 101
+
+    def decode(self, tokens):
+        return ' '.join(f"w{token}" for token in tokens if token < self.eot)
+
+
+class TestSplitSegments(unittest.TestCase):
+    def setUp(self):
+        # Only the attributes _split_segments reads; the real constructor needs ctranslate2
+        self.decoder = object.__new__(WhisperBatchDecoder)
+        self.decoder.model = type('Model', (), {'time_precision': 0.02})()
+        self.tokenizer = FakeTokenizer()
+
+    def split(self, tokens):
+        return self.decoder._split_segments(self.tokenizer, tokens, 10.0, -0.2, 0.1)
+
+    def test_single_timestamp_ending_is_split(self):
+        segments = self.split([101, 1, 2, 151, 151, 3, 201])
+        self.assertEqual([(segment['text'], segment['start'], segment['end']) for segment in segments],
+                         [('w1 w2', 0.0, 1.0), ('w3', 1.0, 2.0)])
+
+    def test_unfinished_tail_falls_back(self):
+        # model.transcribe would decode the words after the last pair again; dropping them loses text
+        self.assertIsNone(self.split([101, 1, 151, 151, 2, 3]))
+
+    def test_no_pairs_ends_at_last_timestamp(self):
+        segments = self.split([101, 1, 2, 176])
+        self.assertEqual((segments[0]['start'], segments[0]['end']), (0.0, 1.5))
+        self.assertEqual(self.split([1, 2])[0]['end'], 10.0)
+
+
+@unittest.skipIf(WhisperModel is None, "faster-whisper is not installed")
+class TestWhisperBatchDecoderParity(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.model = WhisperModel(PARITY_MODEL, device='cpu', compute_type='int8')
+        except Exception as e:
+            raise unittest.SkipTest(f"Whisper model {PARITY_MODEL} is not available: {e}")
+        cls.audio = decode_audio(FIXTURE_CLIP, sampling_rate=16000)
+
+    def assert_same(self, batched, expected):
+        self.assertEqual([segment.text for segment in batched], [segment.text for segment in expected])
+        for segment, reference in zip(batched, expected):
+            self.assertAlmostEqual(segment.start, reference.start, places=2)
+            self.assertAlmostEqual(segment.end, reference.end, places=2)
+            self.assertEqual([word.word for word in segment.words], [word.word for word in reference.words])
+            for word, reference_word in zip(segment.words, reference.words):
+                self.assertAlmostEqual(word.start, reference_word.start, places=2)
+                self.assertAlmostEqual(word.end, reference_word.end, places=2)
+
+    def test_batch_matches_transcribe(self):
+        options = dict(language='en', beam_size=5, word_timestamps=True)
+        windows = [self.audio, self.audio[:5 * 16000], self.audio[3 * 16000:]]
+        decoder = WhisperBatchDecoder(self.model)
+        results = decoder.decode([_Request(window, options) for window in windows])
+        compared = 0
+        for window, result in zip(windows, results):
+            if result is FALLBACK:
+                # Decoded alone by BatchScheduler, so there is nothing batched to compare
+                continue
+            segments, _ = self.model.transcribe(window, **options)
+            self.assert_same(result[0], list(segments))
+            compared += 1
+        self.assertGreater(compared, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_cleanup import single_pass_cleanup
+from macro_engine import cleanup_text
+
+
+def chained_cleanup(text):
+    return (text.replace(" .", ".").replace(" /", "/")
+            .replace("/ ", "/").replace(" ,", ",")
+            .replace(".,", ".").replace(",.", ".")
+            .replace("..", ".").replace("( ", "(")
+            .replace(" )", ")"))
+
+
+class TestCleanup(unittest.TestCase):
+    def test_matches_chained_replace(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            text = ''.join(rng.choice(' ./,()a\n') for _ in range(rng.randint(0, 16)))
+            self.assertEqual(cleanup_text(text), chained_cleanup(text), repr(text))
+            self.assertEqual(single_pass_cleanup(text), chained_cleanup(text), repr(text))
+
+    def test_rule_order(self):
+        self.assertEqual(cleanup_text("clear . , next ( see / above )"), "clear. next (see/above)")
+        self.assertEqual(cleanup_text("end  ."), "end .")
+
+
+if __name__ == '__main__':
+    unittest.main()
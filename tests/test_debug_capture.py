@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from debug_capture import AudioCapture, sf
+
+
+class TestAudioCapture(unittest.TestCase):
+    def test_off_by_default(self):
+        os.environ.pop('DEBUG_AUDIO_DIR', None)
+        capture = AudioCapture.from_env()
+        self.assertFalse(capture.enabled)
+        self.assertIsNone(capture.capture('session', np.zeros(10, np.float32), 16000))
+        capture.close()
+
+    @unittest.skipIf(sf is None, "soundfile is not installed")
+    def test_scaled_clips_per_session(self):
+        with tempfile.TemporaryDirectory() as directory:
+            capture = AudioCapture(directory)
+            audio = np.array([0.5, -0.5, 2.0], dtype=np.float32)
+            first = capture.capture('a/../b', audio, 16000)
+            second = capture.capture('c', audio, 16000)
+            # The caller's buffer may change once capture() returns
+            audio[:] = 0
+            paths = [first.result(), second.result()]
+            capture.close()
+            self.assertEqual([os.path.basename(os.path.dirname(path)) for path in paths], ['a_.._b', 'c'])
+            written, rate = sf.read(paths[0], dtype='int16')
+            self.assertEqual(rate, 16000)
+            np.testing.assert_array_equal(written, [16384, -16384, 32767])
+
+
+if __name__ == '__main__':
+    unittest.main()
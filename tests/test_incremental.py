@@ -0,0 +1,83 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from incremental import IncrementalProcessor, compose_diffs
+from macro_engine import POLICIES, REPLACE_PHRASES, SERVER_POLICY, process_text
+from macro_index import MacroIndex
+from scorers import FuzzywuzzyScorer
+from trigger_matcher import TriggerMatcher
+
+MACROS = {
+    "Normal thorax": "The lungs are clear.",
+    "chest": "Chest normal.",
+    "left knee two": "Left knee text.",
+}
+
+VOCABULARY = ("insert insrt add macro macros Normal thorax chest left knee two period period. . , "
+              "new line newline slash comma open paren closed paren one two three the lungs .. ( ) /").split()
+
+
+class TestIncrementalProcessor(unittest.TestCase):
+    def setUp(self):
+        scorer = FuzzywuzzyScorer()
+        self.matcher = TriggerMatcher(REPLACE_PHRASES, scorer)
+        self.index = MacroIndex(dict(MACROS), scorer)
+
+    def expected(self, text, policy=SERVER_POLICY):
+        return process_text(text, self.index.macros, self.matcher, self.index, policy)
+
+    def test_matches_process_text(self):
+        rng = random.Random(0)
+        for policy in POLICIES.values():
+            for _ in range(50):
+                processor = IncrementalProcessor(self.index.macros, self.matcher, self.index, policy)
+                committed, emitted = '', ''
+                for _ in range(rng.randint(1, 20)):
+                    chunk = rng.choice([' ', '', '\n']) + ' '.join(rng.choice(VOCABULARY)
+                                                                  for _ in range(rng.randint(0, 4)))
+                    if rng.random() < .5:
+                        diff = processor.commit(chunk)
+                        committed, pending = committed + chunk, ''
+                    else:
+                        diff = processor.set_pending(chunk)
+                        pending = chunk
+                    emitted = emitted[:diff.start] + diff.text
+                    self.assertEqual(emitted, self.expected(committed + pending, policy), repr(committed + pending))
+                    self.assertEqual(processor.text, emitted)
+
+    def test_composed_diffs(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            processor = IncrementalProcessor(self.index.macros, self.matcher, self.index)
+            emitted = ''
+            for _ in range(rng.randint(1, 10)):
+                committed, pending = (' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(0, 4)))
+                                      for _ in range(2))
+                # The server's update: commit, then replace the pending tail, sent as one diff
+                diff = compose_diffs(processor.commit(committed + ' '), processor.set_pending(pending))
+                emitted = emitted[:diff.start] + diff.text
+                self.assertEqual(emitted, processor.text)
+
+    def test_macro_split_across_chunks(self):
+        processor = IncrementalProcessor(self.index.macros, self.matcher, self.index)
+        processor.commit('findings insert ')
+        processor.commit('macro normal ')
+        processor.commit('thorax period ')
+        self.assertEqual(processor.text, self.expected('findings insert macro normal thorax period '))
+        self.assertIn("The lungs are clear.", processor.text)
+
+    def test_reset(self):
+        processor = IncrementalProcessor(self.index.macros, self.matcher, self.index)
+        processor.commit('one two period ')
+        processor.reset()
+        diff = processor.commit('comma ')
+        self.assertEqual(diff.start, 0)
+        self.assertEqual(processor.text, self.expected('comma '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from long_form import merge_overlapping, split_chunks, transcribe_chunks
+
+RATE = 100
+# One word per second of audio: the sample values are word numbers
+SPEECH = np.repeat(np.arange(1, 601), RATE).astype(np.float32)
+
+
+class FakeProcessor:
+    """Features are the chunks themselves; decoding names the words heard whole."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, chunks, sampling_rate, return_tensors):
+        self.calls += 1
+        return SimpleNamespace(input_features=list(chunks))
+
+    def batch_decode(self, batch, skip_special_tokens):
+        return [' '.join(f"w{int(value)}" for value in np.unique(chunk)
+                         if np.count_nonzero(chunk == value) == RATE) for chunk in batch]
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, features):
+        self.batches.append(len(features))
+        return features
+
+
+class TestLongForm(unittest.TestCase):
+    def test_chunks_back_to_back(self):
+        chunks = split_chunks(SPEECH, RATE)
+        self.assertEqual(len(chunks), 20)
+        np.testing.assert_array_equal(np.concatenate(chunks), SPEECH)
+
+    def test_strided_chunks_overlap(self):
+        chunks = split_chunks(SPEECH[:65 * RATE], RATE, stride_seconds=5)
+        self.assertEqual([len(chunk) // RATE for chunk in chunks], [30, 30, 15])
+        np.testing.assert_array_equal(chunks[1][:5 * RATE], chunks[0][-5 * RATE:])
+        self.assertEqual(split_chunks(SPEECH[:0], RATE), [])
+
+    def test_batched_generate(self):
+        model, processor = FakeModel(), FakeProcessor()
+        text = transcribe_chunks(SPEECH, RATE, model, processor, batch_size=8)
+        self.assertEqual(processor.calls, 1)
+        self.assertEqual(model.batches, [8, 8, 4])
+        self.assertEqual(text, ' '.join(f"w{n}" for n in range(1, 601)))
+
+    def test_long_form_merges_seams(self):
+        # Chunks cut mid-word lose it on both sides without overlap; with a stride it is heard once
+        speech = np.repeat(np.arange(1, 101), RATE)[RATE // 2:].astype(np.float32)
+        text = transcribe_chunks(speech, RATE, FakeModel(), FakeProcessor(), stride_seconds=5)
+        self.assertEqual(text, ' '.join(f"w{n}" for n in range(2, 101)))
+
+    def test_merge_ignores_short_coincidences(self):
+        self.assertEqual(merge_overlapping(["the left knee", "the patient is"], 10), "the left knee the patient is")
+        self.assertEqual(merge_overlapping(["no acute. Findings are", "findings are normal"], 10),
+                         "no acute. Findings are normal")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import random
+import sys
+import unittest
+from fuzzywuzzy import fuzz, process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import macro_engine
+from macro_engine import REPLACE_PHRASES, TriggerPolicy
+from macro_index import MacroIndex
+from number_words import parse_number
+from scorers import FuzzywuzzyScorer
+from trigger_matcher import TriggerMatcher
+
+MACROS = {
+    "Normal thorax": "The lungs are clear.",
+    "enterocolitis": "Enterocolitis text.",
+    "chest": "Chest normal.",
+    "left knee two": "Left knee text.",
+}
+
+VOCABULARY = ("insert insrt inserts add include macro macros macro: Normal thorax thorex enterocolitis chest chest. "
+              "left knee two period period. period, . , new line newline slash comma open paren closed paren "
+              "one three twenty-one first the lungs are clear ..").split()
+
+
+# The three loops as they were before consolidation, with fuzzywuzzy scoring throughout
+
+def cleanup(text):
+    return (text.replace(" .", ".").replace(" /", "/")
+            .replace("/ ", "/").replace(" ,", ",")
+            .replace(".,", ".").replace(",.", ".")
+            .replace("..", ".").replace("( ", "(")
+            .replace(" )", ")"))
+
+
+def match_phrase(phrase):
+    best_match = process.extractOne(phrase, REPLACE_PHRASES.keys())
+    return REPLACE_PHRASES[best_match[0]] if best_match and best_match[1] > 95 else None
+
+
+def is_list_item(words, i):
+    return i < len(words) - 1 and words[i+1].lower() in ["period", ".", "period.", "period,"]
+
+
+def server_macro_command(words, i):
+    if i >= len(words) - 1:
+        return False
+    current_word = words[i].lower().rstrip(',:')
+    next_word = words[i + 1].lower().rstrip(',:')
+    best_insert_match = process.extractOne(current_word, ['insert', 'add', 'include'])
+    best_macro_match = process.extractOne(next_word, ['macro', 'macros', 'macro:', 'macros:'])
+    return best_insert_match[1] > 85 and best_macro_match[1] > 85
+
+
+def server_insert_macro(words, i, MACROS):
+    for length in range(4, 0, -1):
+        if i + 2 + length <= len(words):
+            macro_key = ' '.join(words[i+2:i+2+length]).rstrip(',.!?').lower()
+            same_length_keys = [key for key in MACROS if len(key.split()) == len(macro_key.split())]
+            if macro_key in [k.lower() for k in same_length_keys]:
+                exact_key = next(k for k in same_length_keys if k.lower() == macro_key)
+                return MACROS[exact_key], len(macro_key.split())
+            best_match = process.extractOne(macro_key, same_length_keys)
+            if best_match and best_match[1] > 80:
+                return MACROS[best_match[0]], len(macro_key.split())
+    return words[i], 0
+
+
+def server_process_text(text, MACROS):
+    final_text, skip = [], 0
+    for line in text.split('\n'):
+        words, final_line, i = line.split(), [], 0
+        while i < len(words):
+            if skip > 0:
+                skip -= 1
+                i += 1
+                continue
+            word = words[i]
+            replacement = match_phrase(' '.join(words[i:i+2]).lower())
+            if replacement is not None:
+                final_line.append(replacement)
+                skip = 1
+                i += 2
+                continue
+            replacement = match_phrase(word.lower())
+            if replacement is not None:
+                final_line.append(replacement)
+                i += 1
+                continue
+            if is_list_item(words, i):
+                number = parse_number(word.lower().replace(",", ""))
+                if number is not None:
+                    final_line.append("\n" + str(number) + ".")
+                    skip = 1
+                    i += 2
+                    continue
+            if server_macro_command(words, i):
+                macro_text, skip = server_insert_macro(words, i, MACROS)
+                final_line.append(macro_text)
+                i += 2 + skip
+                if i < len(words) and words[i] in [',', '.', '!', '?']:
+                    final_line.append(words[i])
+                    i += 1
+            else:
+                final_line.append(word)
+                i += 1
+        final_text.append(' '.join(final_line))
+    return cleanup('  \n'.join(final_text))
+
+
+def app_insert_macro(words, i, MACROS):
+    for length in range(4, 0, -1):
+        if i + 2 + length <= len(words):
+            macro_key = ' '.join(words[i+2:i+2+length])
+            same_length_keys = [key for key in MACROS if len(key.split()) == length]
+            best_match = process.extractOne(macro_key.lower(), same_length_keys)
+            if best_match and best_match[1] > 80:
+                return MACROS.get(best_match[0]), 1 + length
+    return words[i], 0
+
+
+def app_process_text(text, MACROS, fuzzy_insert):
+    final_text, skip = [], 0
+    for line in text.split('\n'):
+        words, final_line = line.split(), []
+        for i in range(len(words)):
+            word = words[i]
+            word_lower = word.lower()
+            if skip > 0:
+                skip -= 1
+                continue
+            replacement = match_phrase(' '.join(words[i:i+2]).lower())
+            if replacement is not None:
+                final_line.append(replacement)
+                skip = 1
+                continue
+            replacement = match_phrase(word_lower)
+            if replacement is not None:
+                final_line.append(replacement)
+                continue
+            if is_list_item(words, i):
+                number = parse_number(word_lower.replace(",", ""))
+                if number is not None:
+                    final_line.append("\n" + str(number) + ".")
+                    skip = 1
+                    continue
+            is_insert = fuzz.ratio(word_lower, "insert") > 80 if fuzzy_insert else word_lower == "insert"
+            if i < len(words) - 2 and is_insert and words[i+1].lower() == "macro":
+                word, skip = app_insert_macro(words, i, MACROS)
+            final_line.append(word)
+        final_text.append(' '.join(final_line))
+    return cleanup('  \n'.join(final_text))
+
+
+REFERENCES = {
+    'server': server_process_text,
+    'transcription': lambda text, MACROS: app_process_text(text, MACROS, fuzzy_insert=True),
+    'text': lambda text, MACROS: app_process_text(text, MACROS, fuzzy_insert=False),
+}
+
+
+def random_transcripts(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ' '.join(rng.choice(VOCABULARY + ['\n']) for _ in range(rng.randint(0, 30)))
+
+
+class TestMacroEngine(unittest.TestCase):
+    def setUp(self):
+        scorer = FuzzywuzzyScorer()
+        self.matcher = TriggerMatcher(REPLACE_PHRASES, scorer)
+        self.index = MacroIndex(dict(MACROS), scorer)
+
+    def test_parity_with_each_app(self):
+        for name, policy in macro_engine.POLICIES.items():
+            reference = REFERENCES[name]
+            for text in random_transcripts(60, seed=len(name)):
+                self.assertEqual(macro_engine.process_text(text, self.index.macros, self.matcher, self.index, policy),
+                                 reference(text, MACROS), f"{name}: {text!r}")
+
+    def test_policies_differ_on_insert_command(self):
+        text = "insrt macro chest period"
+        rendered = {name: macro_engine.process_text(text, self.index.macros, self.matcher, self.index, policy)
+                    for name, policy in macro_engine.POLICIES.items()}
+        self.assertEqual(rendered['transcription'], "Chest normal.")
+        self.assertEqual(rendered['text'], "insrt macro chest.")
+
+    def test_unknown_command(self):
+        with self.assertRaises(ValueError):
+            TriggerPolicy('spoken')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+import unittest
+from fuzzywuzzy import process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from macro_index import MacroIndex
+from scorers import FuzzywuzzyScorer
+
+MACROS = {
+    "enterocolitis": "Enterocolitis text.",
+    "Normal thorax": "Normal thorax text.",
+    "normal abdomen": "Normal abdomen text.",
+    "left knee two": "Left knee text.",
+    "ent": "ENT text.",
+}
+
+
+def random_keys(rng, count):
+    """Short keys over a small alphabet, so many pairs score close to the threshold."""
+    return {' '.join(''.join(rng.choice("acmnor.") for _ in range(rng.randint(1, 4)))
+                     for _ in range(rng.randint(1, 2))): "Text." for _ in range(count)}
+
+
+def assert_full_scan_parity(test, make_index, seed=0):
+    """fuzzy() must equal process.extractOne over every key with the same token count."""
+    rng = random.Random(seed)
+    macros = random_keys(rng, 60)
+    index = make_index(dict(macros))
+    for query in random_keys(rng, 300):
+        length = len(query.split())
+        same_length_keys = [key for key in macros if len(key.split()) == length]
+        best_match = process.extractOne(query, same_length_keys)
+        expected = best_match[0] if best_match and best_match[1] > 80 else None
+        test.assertEqual(index.fuzzy(query, length), expected, query)
+
+
+class TestMacroIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MacroIndex(dict(MACROS), FuzzywuzzyScorer())
+
+    def test_exact(self):
+        self.assertEqual(self.index.exact("normal thorax", 2), "Normal thorax")
+        self.assertIsNone(self.index.exact("normal thorax", 1))
+
+    def test_fuzzy_matches_full_scan(self):
+        queries = ["normal thorex", "thorax normal", "enterocolitis", "entero", "close enterocolitis knee",
+                   "right knee two", "normal", "abdomen"]
+        for query in queries:
+            length = len(query.split())
+            same_length_keys = [key for key in MACROS if len(key.split()) == length]
+            best_match = process.extractOne(query, same_length_keys)
+            expected = best_match[0] if best_match and best_match[1] > 80 else None
+            self.assertEqual(self.index.fuzzy(query, length), expected, query)
+
+    def test_matches_missed_by_gram_filters(self):
+        # Neither pair shares a token or a trigram, but WRatio scores both above 80
+        index = MacroIndex({"abd": "Abd text.", "chest": "Chest text.", "ac omr": "B"}, FuzzywuzzyScorer())
+        self.assertEqual(index.fuzzy("a", 1), "abd")
+        self.assertEqual(index.fuzzy("o c", 2), "ac omr")
+
+    def test_randomized_full_scan_parity(self):
+        assert_full_scan_parity(self, lambda macros: MacroIndex(macros, FuzzywuzzyScorer()))
+
+    def test_update_and_delete(self):
+        self.index.update("chest", "Chest text.")
+        self.assertEqual(self.index.exact("CHEST", 1), "chest")
+        self.assertEqual(self.index.macros["chest"], "Chest text.")
+        self.index.delete("chest")
+        self.assertIsNone(self.index.exact("chest", 1))
+        self.assertNotIn("chest", self.index.macros)
+        self.assertEqual(self.index.keys_with_length(1), ["enterocolitis", "ent"])
+
+
+if __name__ == '__main__':
+    unittest.main()
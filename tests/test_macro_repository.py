@@ -0,0 +1,119 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import macro_engine
+from macro_index import MacroIndex
+from test_macro_index import assert_full_scan_parity
+from macro_repository import SQLiteMacroStore
+from scorers import FuzzywuzzyScorer
+from trigger_matcher import TriggerMatcher
+
+WORDS = "ct chest abdomen pelvis left right knee normal thorax mri brain with without contrast".split()
+
+
+def random_macros(count, seed=0):
+    rng = random.Random(seed)
+    return {' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))): f"Text {n}." for n in range(count)}
+
+
+class TestSQLiteMacroStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'macros.db')
+        self.store = SQLiteMacroStore(self.path, scorer=FuzzywuzzyScorer(), refresh_interval=0)
+
+    def tearDown(self):
+        for store in self.store._namespaces.values():
+            store.close()
+        self.tmpdir.cleanup()
+
+    def test_lookups_match_macro_index(self):
+        macros = random_macros(200)
+        self.store.set_many(macros)
+        index = MacroIndex(dict(macros), FuzzywuzzyScorer())
+        rng = random.Random(1)
+        for key in rng.sample(list(macros), 50):
+            spoken = key.lower().replace('e', 'a', 1)
+            length = len(key.split())
+            self.assertEqual(self.store.index.candidates(spoken, length), index.candidates(spoken, length))
+            self.assertEqual(self.store.index.fuzzy(spoken, length), index.fuzzy(spoken, length))
+            self.assertEqual(self.store.index.exact(key.upper(), length), index.exact(key.upper(), length))
+
+    def test_matches_missed_by_gram_filters(self):
+        # Neither pair shares a token or a trigram, but WRatio scores both above 80
+        self.store.set_many({"abd": "Abd text.", "chest": "Chest text.", "ac omr": "B"})
+        self.assertEqual(self.store.index.fuzzy("a", 1), "abd")
+        self.assertEqual(self.store.index.fuzzy("o c", 2), "ac omr")
+
+    def test_randomized_full_scan_parity(self):
+        def make_index(macros):
+            self.store.set_many(macros)
+            return self.store.index
+        assert_full_scan_parity(self, make_index)
+
+    def test_process_text_matches_json_backend(self):
+        macros = random_macros(50)
+        self.store.set_many(macros)
+        index = MacroIndex(dict(macros), FuzzywuzzyScorer())
+        matcher = TriggerMatcher(macro_engine.REPLACE_PHRASES, FuzzywuzzyScorer())
+        text = ' '.join(f"insert macro {key} period the lungs are clear" for key in list(macros)[:10])
+        self.assertEqual(macro_engine.process_text(text, self.store.macros, matcher, self.store.index),
+                         macro_engine.process_text(text, index.macros, matcher, index))
+
+    def test_mapping_interface(self):
+        self.store.set("chest", "Chest normal.")
+        self.store.set("Normal thorax", "The lungs are clear.")
+        self.store.set("chest", "Chest clear.")
+        self.assertEqual(self.store.macros["chest"], "Chest clear.")
+        self.assertEqual(list(self.store.macros), ["chest", "Normal thorax"])
+        self.assertEqual(self.store.macros.copy(), {"chest": "Chest clear.", "Normal thorax": "The lungs are clear."})
+        self.store.delete("chest")
+        self.store.delete("missing")
+        self.assertNotIn("chest", self.store.macros)
+        self.assertIsNone(self.store.index.fuzzy("chest", 1))
+        self.assertEqual(len(self.store.macros), 1)
+
+    def test_delete_and_readd_moves_key_last(self):
+        self.store.set_many({"chest one": "A.", "chest two": "B."})
+        self.store.delete("chest one")
+        self.store.set("chest one", "A.")
+        self.assertEqual(self.store.index.keys_with_length(2), ["chest two", "chest one"])
+
+    def test_namespaces_are_separate(self):
+        clinic = self.store.for_namespace("clinic-a")
+        self.store.set("chest", "Default chest.")
+        clinic.set("chest", "Clinic chest.")
+        self.assertIs(self.store.for_namespace("clinic-a"), clinic)
+        self.assertEqual(self.store.macros["chest"], "Default chest.")
+        self.assertEqual(clinic.macros["chest"], "Clinic chest.")
+        clinic.delete("chest")
+        self.assertIsNone(clinic.index.exact("chest", 1))
+        self.assertEqual(self.store.index.exact("chest", 1), "chest")
+
+    def test_refresh_sees_other_connections(self):
+        self.store.set("left knee", "Left knee.")
+        self.assertIsNone(self.store.index.fuzzy("right knee", 2))
+        other = SQLiteMacroStore(self.path, refresh_interval=0)
+        other.set("right knee", "Right knee.")
+        other.close()
+        self.assertTrue(self.store.refresh())
+        self.assertEqual(self.store.index.fuzzy("right knee", 2), "right knee")
+        self.assertFalse(self.store.refresh())
+
+    def test_schema_created_once(self):
+        self.store.set("chest", "Chest normal.")
+        reopened = SQLiteMacroStore(self.path)
+        self.assertEqual(reopened.macros.copy(), {"chest": "Chest normal."})
+        reopened.close()
+        with sqlite3.connect(self.path) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM macros").fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
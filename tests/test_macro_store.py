@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import macro_store
+from macro_store import MacroStore, write_atomic
+from scorers import FuzzywuzzyScorer
+
+
+class TestMacroStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'macros.json')
+        with open(self.path, 'w') as f:
+            json.dump({"chest": "Chest normal.", "Normal thorax": "The lungs are clear."}, f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def open_store(self):
+        return MacroStore(self.path, FuzzywuzzyScorer())
+
+    def test_edits_survive_reload(self):
+        store = self.open_store()
+        store.set("left knee", "Left knee text.")
+        store.delete("chest")
+        reopened = self.open_store()
+        self.assertEqual(reopened.macros, {"Normal thorax": "The lungs are clear.", "left knee": "Left knee text."})
+        self.assertEqual(reopened.index.exact("left knee", 2), "left knee")
+
+    def test_readers_create_no_lock_file(self):
+        store = self.open_store()
+        store.refresh(force=True)
+        self.assertFalse(os.path.exists(store.lock_path))
+        store.set("abdomen", "Abdomen text.")
+        self.assertTrue(os.path.exists(store.lock_path))
+
+    def test_refresh_picks_up_other_writers(self):
+        reader, writer = self.open_store(), self.open_store()
+        writer.set("chest", "Chest updated.")
+        writer.set("abdomen", "Abdomen text.")
+        self.assertFalse(reader.refresh())  # rate limited
+        self.assertTrue(reader.refresh(force=True))
+        self.assertEqual(reader.macros["chest"], "Chest updated.")
+        self.assertEqual(reader.index.exact("abdomen", 1), "abdomen")
+        self.assertFalse(reader.refresh(force=True))
+
+    def test_compaction(self):
+        reader, writer = self.open_store(), self.open_store()
+        with patch.object(macro_store, 'COMPACT_AFTER', 3):
+            for n in range(4):
+                writer.set(f"macro {n}", f"Text {n}.")
+        self.assertEqual(os.path.getsize(writer.journal_path), len(json.dumps({"key": "macro 3", "text": "Text 3."})) + 1)
+        with open(self.path) as f:
+            self.assertIn("macro 2", json.load(f))
+        reader.refresh(force=True)
+        self.assertEqual(reader.macros, writer.macros)
+        self.assertEqual(reader.index.keys_with_length(2), ["Normal thorax", "macro 0", "macro 1", "macro 2", "macro 3"])
+
+    def test_outside_edit_of_snapshot(self):
+        store = self.open_store()
+        write_atomic(self.path, json.dumps({"chest": "Chest normal.", "spine": "Spine text."}))
+        self.assertTrue(store.refresh(force=True))
+        self.assertEqual(store.macros, {"chest": "Chest normal.", "spine": "Spine text."})
+        self.assertIsNone(store.index.exact("normal thorax", 2))
+
+    def test_partial_journal_line(self):
+        store = self.open_store()
+        with open(store.journal_path, 'a') as f:
+            f.write('{"key": "spine", "te')
+        self.assertFalse(store.refresh(force=True))
+        store.set("abdomen", "Abdomen text.")
+        self.assertEqual(self.open_store().macros["abdomen"], "Abdomen text.")
+
+
+if __name__ == '__main__':
+    unittest.main()
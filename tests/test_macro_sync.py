@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from macro_repository import SQLiteMacroStore
+from macro_store import MacroStore
+from macro_sync import MacroSync, macros_message
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+class ChangesSinceMixin:
+    """changes_since() contract shared by both macro backends."""
+
+    def test_unknown_version_needs_everything(self):
+        version, changes = self.store.changes_since(None)
+        self.assertEqual(version, self.store.version)
+        self.assertIsNone(changes)
+        self.assertIsNone(self.store.changes_since('nonsense')[1])
+
+    def test_only_changed_keys_after_version(self):
+        self.store.set('chest', 'Chest text.')
+        self.store.set('knee', 'Knee text.')
+        seen = self.store.version
+        self.store.set('knee', 'New knee text.')
+        self.store.set('brain', 'Brain text.')
+        self.store.delete('chest')
+        version, changes = self.store.changes_since(seen)
+        self.assertEqual(changes, {'knee': 'New knee text.', 'brain': 'Brain text.', 'chest': None})
+        self.assertEqual(self.store.changes_since(version), (version, {}))
+
+
+class TestMacroStoreChanges(ChangesSinceMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'macros.json')
+        with open(self.path, 'w') as f:
+            json.dump({}, f)
+        self.store = MacroStore(self.path, refresh_interval=0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def reopen(self):
+        return MacroStore(self.path, refresh_interval=0)
+
+    def test_another_process_version_needs_everything(self):
+        self.store.set('chest', 'Chest text.')
+        self.assertIsNone(self.reopen().changes_since(self.store.version)[1])
+
+    def test_other_writers_changes_are_versioned(self):
+        seen = self.store.version
+        self.reopen().set('pelvis', 'Pelvis text.')
+        self.assertTrue(self.store.refresh())
+        self.assertEqual(self.store.changes_since(seen)[1], {'pelvis': 'Pelvis text.'})
+
+
+class TestSQLiteMacroStoreChanges(ChangesSinceMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'macros.db')
+        self.store = SQLiteMacroStore(self.path, refresh_interval=0)
+        self.opened = [self.store]
+
+    def tearDown(self):
+        for store in self.opened:
+            store.close()
+        self.tmpdir.cleanup()
+
+    def reopen(self):
+        self.opened.append(SQLiteMacroStore(self.path, refresh_interval=0))
+        return self.opened[-1]
+
+    def test_versions_are_shared_between_workers(self):
+        other = self.reopen()
+        seen = other.version
+        self.store.set('pelvis', 'Pelvis text.')
+        self.assertEqual(other.changes_since(seen), (self.store.version, {'pelvis': 'Pelvis text.'}))
+
+    def test_version_from_a_recreated_database_needs_everything(self):
+        self.store.set('chest', 'Chest text.')
+        self.assertIsNone(self.store.changes_since(self.store.version + 5)[1])
+
+    def test_namespaces_have_separate_changes(self):
+        seen = self.store.version
+        self.store.for_namespace('clinic-a').set('pelvis', 'Pelvis text.')
+        self.assertEqual(self.store.changes_since(seen)[1], {})
+        self.opened.append(self.store.for_namespace('clinic-a'))
+
+
+class TestMacroSync(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'macros.json')
+        with open(self.path, 'w') as f:
+            json.dump({'chest': 'Chest text.'}, f)
+        self.store = MacroStore(self.path)
+        self.sync = MacroSync()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_first_sync_is_full_then_deltas(self):
+        message = macros_message(self.store)
+        self.assertEqual(message['macros'], {'chest': 'Chest text.'})
+        self.store.set('knee', 'Knee text.')
+        delta = macros_message(self.store, message['version'])
+        self.assertEqual(delta['action'], 'macros_delta')
+        self.assertEqual(delta['changes'], {'knee': 'Knee text.'})
+
+    def test_edits_are_pushed_to_synced_sessions(self):
+        synced, other_store, idle = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        self.sync.register(synced, self.store)
+        self.sync.register(other_store, object())
+        self.sync.register(idle, self.store)
+
+        async def scenario():
+            await self.sync.send(synced)
+            self.store.set('knee', 'Knee text.')
+            await self.sync.publish(self.store)
+            # Nothing new: nothing sent
+            await self.sync.publish(self.store)
+
+        asyncio.run(scenario())
+        self.assertEqual(len(synced.sent), 2)
+        self.assertIn('macros', synced.sent[0])
+        self.assertEqual(synced.sent[1]['changes'], {'knee': 'Knee text.'})
+        self.assertEqual(other_store.sent, [])
+        self.assertEqual(idle.sent, [])
+
+        self.sync.unregister(synced)
+        self.assertEqual(len(self.sync), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
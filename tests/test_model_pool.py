@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from model_pool import FAILED, LOADING, READY, ModelPool, default_compute_type, plan_cpu_threads
+
+
+class FakeModel:
+    def __init__(self, name, fail_warmup=False, **options):
+        self.name = name
+        self.options = options
+        self.fail_warmup = fail_warmup
+        # Passes only if every replica decodes at the same time
+        self.all_replicas = threading.Barrier(options.get("num_workers", 1), timeout=5)
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append(options)
+        self.all_replicas.wait()
+        if self.fail_warmup:
+            raise RuntimeError("out of memory")
+        return iter([]), None
+
+
+class TestModelPool(unittest.TestCase):
+    def test_compute_type_by_device(self):
+        self.assertEqual(default_compute_type("cpu"), "int8")
+        self.assertEqual(default_compute_type("cuda"), "float16")
+        self.assertEqual(ModelPool("base", "cpu", "float32", loader=FakeModel).compute_type, "float32")
+
+    def test_cores_are_split_between_workers(self):
+        self.assertEqual(plan_cpu_threads(4, cores=16), 4)
+        self.assertEqual(plan_cpu_threads(3, cores=8), 2)
+        self.assertEqual(plan_cpu_threads(32, cores=8), 1)
+
+    def test_load_warms_every_replica(self):
+        pool = ModelPool("base", "cpu", workers=3, cpu_threads=2, loader=FakeModel)
+        self.assertEqual(pool.state, LOADING)
+        model = pool.load(language="en")
+        self.assertTrue(pool.ready)
+        self.assertEqual(model.options, {"device": "cpu", "compute_type": "int8", "cpu_threads": 2, "num_workers": 3})
+        self.assertEqual(len(model.calls), 3)
+        self.assertEqual(model.calls[0], {"language": "en"})
+        self.assertEqual(pool.stats()["state"], READY)
+
+    def test_failed_warmup_is_reported(self):
+        pool = ModelPool("base", loader=lambda name, **options: FakeModel(name, fail_warmup=True, **options))
+        with self.assertRaises(RuntimeError):
+            pool.load()
+        self.assertFalse(pool.ready)
+        self.assertEqual(pool.state, FAILED)
+        self.assertEqual(pool.stats()["error"], "out of memory")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+from word2number import w2n
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from number_words import parse_number
+
+
+class TestParseNumber(unittest.TestCase):
+    def test_matches_word2number(self):
+        for token in ["one", "twelve", "twenty-one", "one-hundred-five", "two-thousand-and-three", "7", "point"]:
+            self.assertEqual(parse_number(token), w2n.word_to_num(token), token)
+
+    def test_ordinals(self):
+        cases = {"first": 1, "second": 2, "third": 3, "fifth": 5, "twelfth": 12, "twentieth": 20,
+                 "twenty-first": 21, "hundredth": 100, "1st": 1, "22nd": 22, "3rd": 3, "14th": 14}
+        for token, expected in cases.items():
+            self.assertEqual(parse_number(token), expected, token)
+
+    def test_rejects_non_numbers(self):
+        for token in ["the", "one-sided", "x-ray", "and", "", "3.", "thousand-one", "²", "firsts"]:
+            self.assertIsNone(parse_number(token), token)
+
+
+if __name__ == '__main__':
+    unittest.main()
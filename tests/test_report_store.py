@@ -0,0 +1,79 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from report_store import ReportStore
+
+
+class TestReportStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ReportStore(self.directory)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self, **options):
+        self.store.close()
+        self.store = ReportStore(self.directory, **options)
+
+    def test_save_and_get(self):
+        record = asyncio.run(self.store.save("Patient is stable."))
+        self.assertEqual(self.store.get(record["id"]), record)
+        self.assertIsNone(self.store.get("missing"))
+
+    def test_ids_for_date(self):
+        ids = [self.store.submit(f"report {n}").result()["id"] for n in range(3)]
+        self.assertEqual(self.store.ids_for_date(date.today()), ids)
+        self.assertEqual(self.store.ids_for_date("2000-01-01"), [])
+
+    def test_concurrent_saves_share_fsyncs(self):
+        fsyncs = []
+        real_fsync = os.fsync
+        os.fsync = lambda fd: (fsyncs.append(fd), real_fsync(fd))
+        try:
+            # Hold the writer on its first batch while the rest queue up
+            gate = threading.Event()
+            write = self.store._write
+            self.store._write = lambda batch: (gate.wait(), write(batch))
+            futures = [self.store.submit(f"report {n}") for n in range(20)]
+            gate.set()
+            records = [future.result() for future in futures]
+        finally:
+            os.fsync = real_fsync
+        self.assertEqual(len({record["id"] for record in records}), 20)
+        self.assertLessEqual(len(fsyncs), 2)
+
+    def test_segments_rotate(self):
+        self.reopen(segment_size=200)
+        records = [self.store.submit("x" * 100).result() for _ in range(5)]
+        segments = [name for name in os.listdir(self.directory) if name.endswith('.jsonl')]
+        self.assertGreater(len(segments), 1)
+        for record in records:
+            self.assertEqual(self.store.get(record["id"]), record)
+
+    def test_reopen_indexes_unindexed_lines_and_drops_torn_tail(self):
+        kept = self.store.submit("indexed").result()
+        self.store.close()
+        segment = os.path.join(self.directory, 'reports-000001.jsonl')
+        with open(segment, 'a') as f:
+            f.write('{"timestamp": "20240102_030405", "id": "late", "text": "not indexed"}\n')
+            f.write('{"timestamp": "2024')
+        self.store = ReportStore(self.directory)
+        self.assertEqual(self.store.get(kept["id"]), kept)
+        self.assertEqual(self.store.get("late")["text"], "not indexed")
+        self.assertEqual(self.store.ids_for_date("2024-01-02"), ["late"])
+        after = self.store.submit("after restart").result()
+        self.assertEqual(self.store.get(after["id"]), after)
+
+
+if __name__ == '__main__':
+    unittest.main()
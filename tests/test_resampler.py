@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import unittest
+
+import numpy as np
+from scipy.signal import resample_poly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from resampler import StreamingResampler, polyphase_filter, rate_ratio, resample_stream, resample_wav, sf, to_mono
+
+
+def blocks(audio, size):
+    return [audio[position:position + size] for position in range(0, len(audio), size)]
+
+
+class TestResampler(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_matches_resample_poly(self):
+        for rate in (8000, 22050, 44100, 48000):
+            for length in (1, 999, 3 * rate + 17):
+                audio = self.rng.standard_normal(length).astype(np.float32)
+                expected = resample_poly(audio, *rate_ratio(rate, 16000))
+                for size in (1000, 65536):
+                    out = resample_stream(blocks(audio, size), rate, frames=length)
+                    self.assertEqual(len(out), len(expected))
+                    np.testing.assert_allclose(out, expected, atol=1e-4)
+
+    def test_same_rate_passes_through(self):
+        audio = self.rng.standard_normal(5000).astype(np.float32)
+        np.testing.assert_array_equal(resample_stream(blocks(audio, 1024), 16000), audio)
+
+    def test_buffer_stays_bounded(self):
+        resampler = StreamingResampler(44100)
+        for block in blocks(np.zeros(44100 * 60, np.float32), 4096):
+            resampler.process(block)
+            self.assertLess(len(resampler._buffer), 4096 + 2 * resampler.half_len // resampler.up + 2 * resampler.down)
+
+    def test_filter_is_cached(self):
+        self.assertIs(polyphase_filter(160, 441)[0], StreamingResampler(44100).taps)
+
+    def test_downmix_before_resampling(self):
+        stereo = self.rng.standard_normal((4000, 2)).astype(np.float32)
+        np.testing.assert_allclose(to_mono(stereo), stereo.mean(axis=1), atol=1e-6)
+        out = resample_stream(blocks(stereo, 1000), 48000)
+        self.assertEqual(out.ndim, 1)
+
+    @unittest.skipIf(sf is None, "soundfile is not installed")
+    def test_resample_wav(self):
+        stereo = self.rng.uniform(-0.5, 0.5, (48000, 2)).astype(np.float32)
+        wav = io.BytesIO()
+        sf.write(wav, stereo, 48000, format='WAV', subtype='FLOAT')
+        audio, rate = resample_wav(wav.getvalue(), block_frames=4096)
+        self.assertEqual(rate, 48000)
+        np.testing.assert_allclose(audio, resample_poly(stereo.mean(axis=1), 1, 3), atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
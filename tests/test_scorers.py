@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+from fuzzywuzzy import process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from scorers import FuzzywuzzyScorer, RapidfuzzScorer, create_scorer, rf_process
+
+PHRASES = ["period", "new line", "newline", "slash", "comma", "open paren", "closed paren", "close paren",
+           "open paren.", "closed paren.", "close paren."]
+COMMANDS = ["insert", "add", "include"]
+MACROS = ["enterocolitis", "Normal thorax", "normal abdomen", "left knee two", "pulmonary nodules"]
+
+WORDS = "normal chest xray two left knee thorax period comma new line insert macro abdomen".split()
+
+QUERIES = [
+    "period", "period.", "periods", "perio", "new line", "new lines", "newline", "newlines", "closed parens",
+    "close parens", "open paren.", "slash", "slashes", "comma", "commas", "insert", "insrt", "inserted",
+    "adding", "ad", "includes", "normal thorex", "thorax normal", "normal", "entero", "enterocolitis",
+    "left knee", "right knee two", "pulmonary nodule", "the lungs", "", ".", "ß period",
+]
+
+
+class TestScorers(unittest.TestCase):
+    def assert_parity(self, scorer, choices, threshold):
+        results = scorer.best_matches(QUERIES, choices, threshold)
+        for query, result in zip(QUERIES, results):
+            best_match = process.extractOne(query, choices)
+            expected = best_match[0] if best_match and best_match[1] > threshold else None
+            self.assertEqual(result, expected, f"{scorer.name}: {query!r}")
+
+    def test_fuzzywuzzy_scores(self):
+        scorer = FuzzywuzzyScorer()
+        for query in QUERIES:
+            scores = scorer.score_matrix([query], PHRASES)[0]
+            self.assertEqual(scores, [score for _, score in process.extractWithoutOrder(query, PHRASES)])
+
+    def test_fuzzywuzzy_parity(self):
+        scorer = FuzzywuzzyScorer()
+        self.assert_parity(scorer, PHRASES, 95)
+        self.assert_parity(scorer, COMMANDS, 85)
+        self.assert_parity(scorer, MACROS, 80)
+
+    @unittest.skipIf(rf_process is None, "rapidfuzz is not installed")
+    def test_rapidfuzz_parity(self):
+        scorer = RapidfuzzScorer()
+        self.assert_parity(scorer, PHRASES, 95)
+        self.assert_parity(scorer, COMMANDS, 85)
+        self.assert_parity(scorer, MACROS, 80)
+
+    def test_default_scorer_randomized_parity(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('MACRO_SCORER', None)
+            scorer = create_scorer()
+        rng = random.Random(0)
+
+        def phrase():
+            words = [rng.choice(WORDS) for _ in range(rng.randint(1, 3))]
+            # Drop or swap a character now and then, so scores land near the thresholds
+            text = ' '.join(words)
+            if text and rng.random() < 0.5:
+                j = rng.randrange(len(text))
+                text = text[:j] + rng.choice('aeiou. ') + text[j + 1:]
+            return text
+
+        for _ in range(300):
+            query, choices = phrase(), [phrase() for _ in range(5)]
+            best_match = process.extractOne(query, choices)
+            for threshold in (80, 85, 95):
+                expected = best_match[0] if best_match and best_match[1] > threshold else None
+                self.assertEqual(scorer.best_matches([query], choices, threshold)[0], expected,
+                                 f"{query!r} {choices!r} {threshold}")
+
+    def test_create_scorer(self):
+        self.assertIsInstance(create_scorer('fuzzywuzzy'), FuzzywuzzyScorer)
+        with self.assertRaises(ValueError):
+            create_scorer('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
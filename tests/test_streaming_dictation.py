@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from streaming_dictation import DictationWorker, has_voice, last_pause
+
+RATE = 16000
+WORD = RATE // 2
+
+
+class FakeTranscriber:
+    """Hears word n wherever the audio holds n / 10; records every decoded length."""
+
+    def __init__(self):
+        self.lengths = []
+
+    def __call__(self, audio):
+        self.lengths.append(len(audio))
+        values = np.round(audio * 10).astype(int)
+        words = [value for i, value in enumerate(values) if value and (i == 0 or values[i - 1] != value)]
+        return ' ' + ' '.join(f"w{value}" for value in words)
+
+
+def dictation(count, pause_every=3):
+    """Words 1..count with short gaps, and a long pause after every `pause_every` words."""
+    parts = []
+    for n in range(1, count + 1):
+        parts.append(np.full(WORD, n / 10, np.float32))
+        parts.append(np.zeros(RATE if n % pause_every == 0 else RATE // 10, np.float32))
+    return np.concatenate(parts)
+
+
+class TestDictationWorker(unittest.TestCase):
+    def setUp(self):
+        self.transcribe = FakeTranscriber()
+        self.worker = DictationWorker(self.transcribe)
+
+    def feed(self, audio, rate=RATE, chunk=RATE // 10):
+        for position in range(0, len(audio), chunk):
+            self.worker.feed(audio[position:position + chunk], rate)
+        self.worker.wait()
+
+    def test_every_word_committed_once(self):
+        self.feed(dictation(9))
+        committed, _ = self.worker.snapshot()
+        self.assertTrue(committed)
+        self.assertEqual(self.worker.finish(), ' '.join(f"w{n}" for n in range(1, 10)))
+
+    def test_finish_only_decodes_the_tail(self):
+        # Recording stops mid-sentence, right after word 10
+        audio = np.concatenate((dictation(9), np.full(WORD, 1.0, np.float32)))
+        self.feed(audio)
+        decoded = len(self.transcribe.lengths)
+        self.assertEqual(self.worker.finish(), ' '.join(f"w{n}" for n in range(1, 11)))
+        self.assertEqual(len(self.transcribe.lengths), decoded + 1)
+        self.assertLess(self.transcribe.lengths[-1], 2 * RATE)
+
+    def test_pending_text_before_a_pause(self):
+        self.feed(np.full(3 * RATE, 0.5, np.float32))
+        self.assertEqual(self.worker.snapshot(), ([], 'w5'))
+
+    def test_long_window_without_pause_is_committed(self):
+        worker = self.worker = DictationWorker(self.transcribe, max_window=4)
+        self.feed(np.full(5 * RATE, 0.3, np.float32))
+        self.assertEqual(worker.snapshot()[0], ['w3'])
+
+    def test_resamples_and_keeps_the_recording(self):
+        self.feed(np.zeros(48000, np.float32), rate=48000, chunk=4800)
+        self.worker.finish()
+        self.assertEqual(len(self.worker.recording()), RATE)
+        self.assertEqual(self.transcribe.lengths, [])
+
+    def test_pause_detection(self):
+        audio = np.concatenate((np.full(RATE, 0.5), np.zeros(RATE), np.full(RATE, 0.5))).astype(np.float32)
+        self.assertAlmostEqual(last_pause(audio) / RATE, 1.5, places=1)
+        self.assertIsNone(last_pause(audio, min_position=2 * RATE))
+        self.assertFalse(has_voice(np.zeros(RATE, np.float32)))
+        self.assertTrue(has_voice(audio))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from audio_stream import AudioRingBuffer
+from streaming_transcriber import WHISPER_SAMPLE_RATE, StreamingTranscriber
+
+WORD = WHISPER_SAMPLE_RATE // 2
+GAP = WHISPER_SAMPLE_RATE // 4
+
+
+class FakeTokenizer:
+    def encode(self, text, add_special_tokens=True):
+        return SimpleNamespace(ids=[int(word[1:]) for word in text.split()])
+
+
+class FakeModel:
+    """Hears word n wherever the audio holds the value n; records every call."""
+
+    hf_tokenizer = FakeTokenizer()
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, initial_prompt=None, word_timestamps=False, **options):
+        self.calls.append((len(audio), initial_prompt))
+        words, run_start = [], None
+        for i, value in enumerate(np.append(audio, 0)):
+            if run_start is not None and value != audio[run_start]:
+                words.append(SimpleNamespace(word=f" w{int(audio[run_start])}", start=run_start / WHISPER_SAMPLE_RATE,
+                                             end=i / WHISPER_SAMPLE_RATE))
+                run_start = None
+            if run_start is None and value:
+                run_start = i
+        return [SimpleNamespace(words=words)], None
+
+
+def dictation(count):
+    """Audio of words 1..count, each followed by a short pause."""
+    return np.concatenate([np.concatenate((np.full(WORD, n, np.float32), np.zeros(GAP, np.float32)))
+                           for n in range(1, count + 1)])
+
+
+class TestStreamingTranscriber(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.ring = AudioRingBuffer(30 * WHISPER_SAMPLE_RATE)
+        self.stream = StreamingTranscriber(self.model, self.ring)
+
+    def feed(self, audio, chunk=WHISPER_SAMPLE_RATE // 2):
+        committed = []
+        for position in range(0, len(audio), chunk):
+            self.ring.write(audio[position:position + chunk])
+            text, _ = self.stream.decode()
+            committed.append(text)
+        return committed
+
+    def test_every_word_committed_once(self):
+        committed = self.feed(dictation(12))
+        committed.append(self.stream.decode(final=True)[0])
+        self.assertEqual(' '.join(filter(None, committed)), ' '.join(f"w{n}" for n in range(1, 13)))
+        self.assertEqual(self.stream.committed_text, ' '.join(f"w{n}" for n in range(1, 13)))
+        self.assertEqual(self.stream.pending_text, '')
+
+    def test_window_stays_short(self):
+        self.feed(dictation(20))
+        # Only the overlap, the held back tail and the new chunk are decoded, never the whole stream
+        longest = max(length for length, _ in self.model.calls)
+        self.assertLess(longest, 4 * WHISPER_SAMPLE_RATE)
+
+    def test_prompt_is_cached_committed_tokens(self):
+        self.feed(dictation(6))
+        before = self.stream.committed_text
+        self.feed(np.zeros(WORD, np.float32))
+        _, prompt = self.model.calls[-1]
+        self.assertEqual(prompt, [int(word[1:]) for word in before.split()])
+        self.assertIsNone(self.model.calls[0][1])
+
+    def test_pending_tail_is_revisable(self):
+        self.ring.write(dictation(1)[:WORD])
+        committed, pending = self.stream.decode()
+        self.assertEqual((committed, pending), ('', 'w1'))
+
+    def test_reset_skips_earlier_audio(self):
+        self.feed(dictation(3))
+        self.stream.reset()
+        self.assertEqual(self.stream.decode(), ('', ''))
+        self.assertIsNone(self.stream.prompt)
+
+
+class TestStreamingTranscriberRate(unittest.TestCase):
+    def test_rejects_a_ring_at_another_rate(self):
+        with self.assertRaises(ValueError):
+            StreamingTranscriber(FakeModel(), AudioRingBuffer(48000, sample_rate=48000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from transcription_cache import LRUCache, TranscriptionCache, audio_digest, cache_key
+
+
+class TestKeys(unittest.TestCase):
+    def test_key_depends_on_audio_model_and_options(self):
+        digest = audio_digest(b'RIFF one')
+        self.assertEqual(digest, audio_digest(b'RIFF one'))
+        self.assertNotEqual(digest, audio_digest(b'RIFF two'))
+        key = cache_key(digest, 'whisper-small', {'stride_seconds': 0})
+        self.assertEqual(key, cache_key(digest, 'whisper-small', {'stride_seconds': 0}))
+        self.assertNotEqual(key, cache_key(digest, 'whisper-large', {'stride_seconds': 0}))
+        self.assertNotEqual(key, cache_key(digest, 'whisper-small', {'stride_seconds': 5}))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(capacity=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+
+class TestTranscriptionCache(unittest.TestCase):
+    def test_transcribes_once(self):
+        cache = TranscriptionCache(capacity=4)
+        calls = []
+
+        def transcribe():
+            calls.append(1)
+            return 'patient denies chest pain'
+
+        for _ in range(3):
+            self.assertEqual(cache.get_or_transcribe('key', transcribe), 'patient denies chest pain')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            TranscriptionCache(capacity=1, directory=directory).put('ab12', 'saved text')
+            cache = TranscriptionCache(capacity=1, directory=directory)
+            self.assertEqual(cache.get('ab12'), 'saved text')
+            self.assertEqual(cache.disk_hits, 1)
+            # Promoted to memory
+            self.assertEqual(cache.get('ab12'), 'saved text')
+            self.assertEqual(cache.hits, 1)
+            self.assertIsNone(cache.get('cd34'))
+
+    def test_unreadable_entry_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TranscriptionCache(directory=directory)
+            os.makedirs(os.path.join(directory, 'ef'))
+            with open(os.path.join(directory, 'ef', 'ef56.json'), 'w') as f:
+                f.write('{not json')
+            with self.assertLogs('transcription_cache', 'WARNING'):
+                self.assertIsNone(cache.get('ef56'))
+            self.assertEqual(cache.misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
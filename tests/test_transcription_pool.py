@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from transcription_pool import TranscriptionBusy, TranscriptionPool
+
+
+def blocking_call(seconds, result):
+    time.sleep(seconds)
+    return result
+
+
+class TestTranscriptionPool(unittest.TestCase):
+    def test_event_loop_stays_responsive(self):
+        async def scenario():
+            pool = TranscriptionPool(workers=2, max_pending=8)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticking = asyncio.create_task(ticker())
+            results = await asyncio.gather(*(pool.run(blocking_call, 0.1, n) for n in range(4)))
+            ticking.cancel()
+            pool.shutdown()
+            return results, ticks, pool.stats()
+
+        results, ticks, stats = asyncio.run(scenario())
+        self.assertEqual(results, [0, 1, 2, 3])
+        # Two rounds of 0.1s on two workers leave the loop free to tick throughout
+        self.assertGreater(ticks, 10)
+        self.assertEqual(stats["completed"], 4)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["mean_wait_ms"], 0)
+
+    def test_workers_bound_concurrency(self):
+        active, peak = 0, 0
+        lock = threading.Lock()
+
+        def tracked():
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.05)
+            with lock:
+                active -= 1
+
+        async def scenario():
+            pool = TranscriptionPool(workers=2, max_pending=16)
+            await asyncio.gather(*(pool.run(tracked) for _ in range(6)))
+            pool.shutdown()
+
+        asyncio.run(scenario())
+        self.assertEqual(peak, 2)
+
+    def test_full_pool_rejects(self):
+        async def scenario():
+            pool = TranscriptionPool(workers=1, max_pending=2, wait_timeout=0.05)
+            running = [asyncio.create_task(pool.run(blocking_call, 0.3, n)) for n in range(2)]
+            await asyncio.sleep(0.01)
+            self.assertEqual(pool.stats()["queue_depth"], 1)
+            with self.assertRaises(TranscriptionBusy):
+                await pool.run(blocking_call, 0, 'late')
+            await asyncio.gather(*running)
+            stats = pool.stats()
+            pool.shutdown()
+            return stats
+
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["completed"], 2)
+
+    def test_errors_reach_the_caller(self):
+        def failing():
+            raise ValueError("bad audio")
+
+        async def scenario():
+            pool = TranscriptionPool(workers=1, max_pending=1)
+            with self.assertRaises(ValueError):
+                await pool.run(failing)
+            # The slot was given back
+            self.assertEqual(await pool.run(blocking_call, 0, 'ok'), 'ok')
+            pool.shutdown()
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,17 +15,26 @@ class TestTranscriptionApp(unittest.TestCase):
         mock_st.sidebar.text_input.assert_any_call('New Macro Value')
         mock_st.sidebar.button.assert_called_once_with('Add New Macro')
 
-    @patch('transcription_w_macro_app.sf')
-    @patch('transcription_w_macro_app.io')
+    @patch('transcription_w_macro_app.resample_wav')
     @patch('transcription_w_macro_app.st')
-    def test_process_audio(self, mock_st, mock_io, mock_sf):
+    def test_process_audio(self, mock_st, mock_resample_wav):
         wav_audio_data = b"test_audio_data"
         TARGET_SAMPLE_RATE = 16000
-        mock_sf.read.return_value = (np.array([1, 2, 3]), TARGET_SAMPLE_RATE)
+        mock_resample_wav.return_value = (np.array([1, 2, 3], dtype=np.float32), 44100)
         resampled_audio_data, loaded_sample_rate = process_audio(wav_audio_data, TARGET_SAMPLE_RATE)
-        mock_sf.read.assert_called_once()
+        mock_resample_wav.assert_called_once_with(wav_audio_data, TARGET_SAMPLE_RATE)
+        self.assertEqual(loaded_sample_rate, 44100)
         mock_st.audio.assert_called_once_with(wav_audio_data, format='audio/wav')
 
+    @patch('transcription_w_macro_app.resample_wav')
+    @patch('transcription_w_macro_app.st')
+    def test_process_audio_debug_capture(self, mock_st, mock_resample_wav):
+        audio = np.array([0.1, 0.2], dtype=np.float32)
+        mock_resample_wav.return_value = (audio, 44100)
+        capture = MagicMock()
+        process_audio(b"test_audio_data", 16000, 'session-1', capture)
+        capture.capture.assert_called_once_with('session-1', audio, 16000)
+
     @patch('transcription_w_macro_app.np')
     @patch('transcription_w_macro_app.processor')
     @patch('transcription_w_macro_app.model')
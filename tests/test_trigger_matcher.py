@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+from fuzzywuzzy import process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from scorers import FuzzywuzzyScorer
+from trigger_matcher import TriggerMatcher
+
+REPLACE_PHRASES = {
+    "period": ".",
+    "new line": "  \n",
+    "newline": "  \n",
+    "slash": "/",
+    "comma": ",",
+    "open paren": "(",
+    "closed paren": ")",
+    "close paren": ")",
+    "open paren.": "(",
+    "closed paren.": ")",
+    "close paren.": ")",
+}
+
+QUERIES = [
+    "period", "period.", "period ,", "periods", "perio", "new line", "new lines", "newline",
+    "newlines", "closed parens", "close parens", "closedparen", "open paren.", "open parens",
+    "slash", "slashes", "comma", "commas", ".", "", "the lungs", "insert macro", "ß period",
+]
+
+
+class TestTriggerMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = TriggerMatcher(REPLACE_PHRASES, FuzzywuzzyScorer())
+
+    def test_match_phrase_parity(self):
+        for query in QUERIES:
+            best_match = process.extractOne(query, REPLACE_PHRASES.keys())
+            expected = REPLACE_PHRASES[best_match[0]] if best_match and best_match[1] > 95 else None
+            self.assertEqual(self.matcher.match_phrase(query), expected, query)
+
+    def test_is_macro_command_parity(self):
+        words = ["insert", "macro", "inserted", "macros:", "adding", "macro,", "at", "macr",
+                 "include", "macros", "the", "macro"]
+        for i in range(len(words)):
+            if i < len(words) - 1:
+                insert_match = process.extractOne(words[i].lower().rstrip(',:'), TriggerMatcher.INSERT_VARIATIONS)
+                macro_match = process.extractOne(words[i + 1].lower().rstrip(',:'), TriggerMatcher.MACRO_VARIATIONS)
+                expected = insert_match[1] > 85 and macro_match[1] > 85
+            else:
+                expected = False
+            self.assertEqual(self.matcher.is_macro_command(words, i), expected, words[i])
+
+
+if __name__ == '__main__':
+    unittest.main()
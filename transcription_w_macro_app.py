@@ -1,22 +1,42 @@
-from datetime import datetime
-from fuzzywuzzy import fuzz, process
 import io
-import json
 import numpy as np
-import pandas as pd
+import os
+import queue
 import scipy.io.wavfile as wavfile
-from scipy.signal import resample
-import soundfile as sf
 import streamlit as st
 from st_audiorec import st_audiorec
+import sys
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
 import uuid
-from word2number import w2n
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+import macro_engine
+from macro_store import MacroStore
+from resampler import resample_wav, to_mono
+from long_form import transcribe_chunks
+from debug_capture import AudioCapture
+from incremental import IncrementalProcessor
+from streaming_dictation import DictationWorker
+from artifact_log import ArtifactLog
+from transcription_cache import LRUCache, TranscriptionCache, audio_digest, cache_key
+
+try:
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+except ImportError:
+    webrtc_streamer = None
 
 st.set_page_config(layout='wide')
 
 TARGET_SAMPLE_RATE = 16000
 MODEL_PATH = 'openai/whisper-large-v3'
+# 30-second chunks decoded per model.generate call
+CHUNK_BATCH_SIZE = int(os.environ.get('CHUNK_BATCH_SIZE', 8))
+# Long-form mode: seconds of overlap between chunks, merged at the seams; 0 cuts chunks back to back
+LONG_FORM_STRIDE_SECONDS = float(os.environ.get('LONG_FORM_STRIDE_SECONDS', 0))
+# Sessions whose last recording is kept for Save; only the least recently recording one is dropped
+SESSION_RECORDINGS_SIZE = int(os.environ.get('SESSION_RECORDINGS_SIZE', 256))
+# Opt in to starting in streaming mode (needs streamlit-webrtc): text appears while the clinician talks
+STREAMING_DEFAULT = os.environ.get('STREAMING_TRANSCRIPTION', '0') == '1'
 
 @st.cache_resource 
 def load_model():
@@ -32,10 +52,42 @@ def load_processor():
 model = load_model()
 processor = load_processor()
 
-with open('macros.json', 'r') as f:
-    MACROS = json.load(f)
+@st.cache_resource
+def load_macro_store():
+    # Shared across reruns and sessions; refresh() picks up edits made elsewhere
+    return MacroStore('macros.json')
+
+MACRO_STORE = load_macro_store()
+
+@st.cache_resource
+def load_audio_capture():
+    # Off unless DEBUG_AUDIO_DIR is set
+    return AudioCapture.from_env()
+
+AUDIO_CAPTURE = load_audio_capture()
+
+@st.cache_resource
+def load_transcription_cache():
+    # Shared across reruns and sessions; on disk too if TRANSCRIPTION_CACHE_DIR is set
+    return TranscriptionCache.from_env()
+
+@st.cache_resource
+def load_session_recordings():
+    # (digest, WAV bytes) of each session's last recording, by session id; session state holds only the digest
+    return LRUCache(capacity=SESSION_RECORDINGS_SIZE)
 
-def add_macros_sidebar(MACROS):
+@st.cache_resource
+def load_artifact_log():
+    # Saved transcriptions and their audio, under ARTIFACTS_DIR
+    return ArtifactLog.from_env()
+
+TRANSCRIPTION_CACHE = load_transcription_cache()
+SESSION_RECORDINGS = load_session_recordings()
+ARTIFACT_LOG = load_artifact_log()
+MACROS = MACRO_STORE.macros
+MACRO_INDEX = MACRO_STORE.index
+
+def add_macros_sidebar(MACROS, store=None):
     # Add a dropdown in the sidebar that shows all the available macros
     st.sidebar.selectbox('Available Macros', list(MACROS.keys()))
 
@@ -43,141 +95,104 @@ def add_macros_sidebar(MACROS):
     new_macro_key = st.sidebar.text_input('New Macro Key')
     new_macro_value = st.sidebar.text_input('New Macro Value')
 
-    # Write the new macro to macros.json when the user clicks a button
+    # Save the new macro to the macro store when the user clicks a button
     if st.sidebar.button('Add New Macro'):
         if new_macro_key and new_macro_value:
-            MACROS[new_macro_key] = new_macro_value
-            with open('macros.json', 'w') as f:
-                json.dump(MACROS, f)
+            if store is not None:
+                store.set(new_macro_key, new_macro_value)
+            else:
+                MACROS[new_macro_key] = new_macro_value
 
-def process_audio(wav_audio_data, TARGET_SAMPLE_RATE):
-    input_audio_data, loaded_sample_rate = sf.read(io.BytesIO(wav_audio_data), dtype='float32', always_2d=True)
-    resampling_factor = TARGET_SAMPLE_RATE / loaded_sample_rate
-    resampled_audio_data = resample(input_audio_data, int(len(input_audio_data) * resampling_factor))
+def process_audio(wav_audio_data, TARGET_SAMPLE_RATE, session_id=None, capture=None):
+    # Mono at TARGET_SAMPLE_RATE, resampled block by block
+    resampled_audio_data, loaded_sample_rate = resample_wav(wav_audio_data, TARGET_SAMPLE_RATE)
 
-    with sf.SoundFile('output_audio.wav', 'w', samplerate=TARGET_SAMPLE_RATE, channels=2) as audio_file:
-        audio_file.write(np.int16(resampled_audio_data))
+    if capture is not None:
+        # Written in the background, and only when debug capture is on
+        capture.capture(session_id, resampled_audio_data, TARGET_SAMPLE_RATE)
 
     st.audio(wav_audio_data, format='audio/wav')
 
     return resampled_audio_data, loaded_sample_rate
 
-def transcribe_audio(resampled_audio_data, TARGET_SAMPLE_RATE, model, processor):
-    samples_per_chunk = int(TARGET_SAMPLE_RATE * 30)  # Use TARGET_SAMPLE_RATE instead of loaded_sample_rate
-    chunks = np.array_split(resampled_audio_data, np.ceil(len(resampled_audio_data) / samples_per_chunk))
-
-    transcriptions = []
-
-    for chunk in chunks:
-        input_features = processor(chunk.T, sampling_rate=TARGET_SAMPLE_RATE, return_tensors="pt").input_features 
-        predicted_ids = model.generate(input_features)
-        transcription = processor.batch_decode(predicted_ids, skip_special_tokens=True)
-        transcriptions.append(transcription[0])
-
-    return ' '.join(transcriptions)
-
-def insert_macro(words, i, MACROS):
-    # Try different lengths of macro keys
-    for length in range(4, 0, -1):
-        if i + 2 + length <= len(words):
-            macro_key = ' '.join(words[i+2:i+2+length])  # take the next 'length' words as the macro key
-            # Filter MACROS.keys() to only include keys of the same length as macro_key
-            same_length_keys = [key for key in MACROS.keys() if len(key.split()) == length]
-            best_match = process.extractOne(macro_key.lower(), same_length_keys)  # Convert to lowercase for comparison
-
-            if best_match and best_match[1] > 80:  # if the match confidence is above 80
-                return MACROS.get(best_match[0]), 1 + length  # skip the next 'length' words ("macro" and macro_key)
-
-    return words[i], 0  # Use the original word if no match found
-    
-def process_transcription(transcription, MACROS):
-    # Define the phrases to replace and their replacements
-    replace_phrases = {
-        "period": ".",
-        "new line": "  \n",
-        "newline": "  \n",
-        "slash": "/",
-        "comma": ",",
-        "open paren": "(",
-        "closed paren": ")",
-        "close paren": ")",
-        "open paren.": "(",
-        "closed paren.": ")",
-        "close paren.": ")",
-    }
-
-    lines = transcription.split('\n')
-    final_transcription = []
-    skip = 0
-
-    for line in lines:
-        words = line.split()
-        final_line = []
-
-        for i in range(len(words)):
-            word = words[i]  # Save the original word
-            word_lower = word.lower()  # Convert the word to lowercase for comparison
-
-            if skip > 0:
-                skip -= 1
-                continue
-
-            # Fuzzy match for replace phrases
-            phrase = ' '.join(words[i:i+2]).lower()  # Join the current word and the next word into a phrase
-            best_match = process.extractOne(phrase, replace_phrases.keys())
-            if best_match and best_match[1] > 95:  # if the match confidence is above 95
-                final_line.append(replace_phrases.get(best_match[0]))
-                skip = 1  # Skip the next word
-                continue
-            else:
-                best_match = process.extractOne(word_lower, replace_phrases.keys())
-                if best_match and best_match[1] > 95:  # if the match confidence is above 95
-                    final_line.append(replace_phrases.get(best_match[0]))
-                    continue
-
-            # Check if the word is a number followed by "period"
-            if i < len(words) - 2 and (words[i+1].lower() == "period" or words[i+1] == "." or words[i+1].lower() == "period." or words[i+1].lower() == "period,"):
-                try:
-                    number = w2n.word_to_num(word_lower.replace(",", ""))
-                    final_line.append("\n" + str(number) + ".")
-                    skip = 1  # skip the next word ("period")
-                    continue
-                except ValueError:
-                    pass  # not a number, continue to the next check
-            elif i < len(words) - 1 and (words[i+1].lower() == "period" or words[i+1] == "." or words[i+1].lower() == "period." or words[i+1].lower() == "period,"):
-                try:
-                    number = w2n.word_to_num(word_lower.replace(",", ""))
-                    final_line.append("\n" + str(number) + ".")
-                    skip = 1  # skip the next word ("period")
-                    continue
-                except ValueError:
-                    pass  # not a number, continue to the next check
-
-            # Check if the word is "insert macro"
-            if i < len(words) - 2 and fuzz.ratio(word_lower, "insert") > 80 and words[i+1].lower() == "macro":
-                word, skip = insert_macro(words, i, MACROS)
-                final_line.append(word)
-            else:
-                final_line.append(word)  # Use the original word
-
-        final_transcription.append(' '.join(final_line))
-
-    final_transcription = '  \n'.join(final_transcription)
-    final_transcription = final_transcription.replace(" .", ".")  # remove space before periods
-    final_transcription = final_transcription.replace(" /", "/")  # remove space before slashes
-    final_transcription = final_transcription.replace("/ ", "/")  # remove space after slashes
-    final_transcription = final_transcription.replace(" ,", ",")  # remove space before slashes
-    final_transcription = final_transcription.replace(".,", ".")
-    final_transcription = final_transcription.replace(",.", ".")
-    final_transcription = final_transcription.replace("..", ".")
-    final_transcription = final_transcription.replace("( ", "(")  # remove space after "("
-    final_transcription = final_transcription.replace(" )", ")")  # remove space before ")"
-
-    return final_transcription
+def transcribe_audio(resampled_audio_data, TARGET_SAMPLE_RATE, model, processor,
+                     batch_size=CHUNK_BATCH_SIZE, stride_seconds=LONG_FORM_STRIDE_SECONDS):
+    # All chunks' features in one processor call, decoded batch_size chunks at a time
+    return transcribe_chunks(resampled_audio_data, TARGET_SAMPLE_RATE, model, processor, batch_size, stride_seconds)
+
+def insert_macro(words, i, MACROS, index=None):
+    macro_text, key_length = macro_engine.insert_macro(words, i, MACROS, index, macro_engine.TRANSCRIPTION_POLICY)
+    # Skip "macro" and the key words, if a macro matched
+    return macro_text, 1 + key_length if key_length else 0
+
+def process_transcription(transcription, MACROS, index=None):
+    return macro_engine.process_text(transcription, MACROS, index=index, policy=macro_engine.TRANSCRIPTION_POLICY)
+
+def transcribe_window(audio):
+    # One window of at most 30 s for the streaming worker
+    return transcribe_audio(audio, TARGET_SAMPLE_RATE, model, processor, batch_size=1, stride_seconds=0)
+
+def frame_to_mono(frame):
+    # av.AudioFrame -> mono float32 in -1..1
+    samples = frame.to_ndarray()
+    channels = len(frame.layout.channels)
+    samples = samples.T if frame.format.is_planar else samples.reshape(-1, channels)
+    if samples.dtype.kind == 'i':
+        samples = samples / float(np.iinfo(samples.dtype).max + 1)
+    return to_mono(samples)
+
+def wav_bytes(audio, sample_rate):
+    buffer = io.BytesIO()
+    wavfile.write(buffer, sample_rate, (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16))
+    return buffer.getvalue()
+
+def stream_dictation(MACROS, index=None):
+    """
+    Record over WebRTC and transcribe while recording, showing the text and
+    its macro expansions live. Returns (transcription, WAV bytes) on the run
+    after recording stops, else None.
+    """
+    ctx = webrtc_streamer(key='dictation', mode=WebRtcMode.SENDONLY, audio_receiver_size=1024,
+                          media_stream_constraints={'audio': True, 'video': False})
+    worker = st.session_state.get('dictation_worker')
+    if not ctx.state.playing:
+        if worker is None:
+            return None
+        # Stopping only costs the audio after the worker's last commit point
+        del st.session_state['dictation_worker']
+        transcription = worker.finish()
+        return transcription, wav_bytes(worker.recording(), TARGET_SAMPLE_RATE)
+
+    if worker is None:
+        worker = st.session_state['dictation_worker'] = DictationWorker(transcribe_window)
+    live = st.empty()
+    expander = IncrementalProcessor(MACROS, index=index, policy=macro_engine.TRANSCRIPTION_POLICY)
+    shown = 0
+    while ctx.state.playing:
+        try:
+            frames = ctx.audio_receiver.get_frames(timeout=1)
+        except queue.Empty:
+            continue
+        for frame in frames:
+            worker.feed(frame_to_mono(frame), frame.sample_rate)
+        committed, pending = worker.snapshot()
+        for text in committed[shown:]:
+            expander.commit(text + ' ')
+        shown = len(committed)
+        expander.set_pending(pending)
+        live.markdown(f"Live Transcription (with macros):\n\n{expander.text}")
+    return None
 
 def update_inference_required():
     st.session_state['inference_required'] = True
 
+def session_recording():
+    """WAV bytes of this session's last recording, or None if they were dropped."""
+    recording = SESSION_RECORDINGS.get(st.session_state['session_id'])
+    if recording is None or recording[0] != st.session_state['audio_digest']:
+        return None
+    return recording[1]
+
 def main():
     global TARGET_SAMPLE_RATE, model, processor, MACROS
 
@@ -186,30 +201,56 @@ def main():
 
     if 'inference_required' not in st.session_state:
         st.session_state['inference_required'] = True
-    if 'previous_audio_data' not in st.session_state:
-        st.session_state['previous_audio_data'] = None
+    if 'audio_digest' not in st.session_state:
+        st.session_state['audio_digest'] = None
     if 'transcription' not in st.session_state:
         st.session_state['transcription'] = ''
-
-    add_macros_sidebar(MACROS)
-
-    current_audio_data = st_audiorec()
-    if current_audio_data is not None and current_audio_data != st.session_state['previous_audio_data']:
-        st.session_state['inference_required'] = True
-        st.session_state['previous_audio_data'] = current_audio_data
-        wav_audio_data = current_audio_data
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = str(uuid.uuid4())
+
+    MACRO_STORE.refresh()
+    add_macros_sidebar(MACROS, MACRO_STORE)
+
+    streaming = webrtc_streamer is not None and st.sidebar.checkbox('Streaming transcription', STREAMING_DEFAULT)
+    if streaming:
+        streamed = stream_dictation(MACROS, MACRO_INDEX)
+        if streamed is not None:
+            st.session_state['transcription'], streamed_audio = streamed
+            st.session_state['audio_digest'] = audio_digest(streamed_audio)
+            SESSION_RECORDINGS.put(st.session_state['session_id'], (st.session_state['audio_digest'], streamed_audio))
+            st.session_state['inference_required'] = False
+        wav_audio_data = session_recording()
     else:
-        wav_audio_data = st.session_state['previous_audio_data']
-
-    if wav_audio_data is not None and st.session_state['inference_required']:
-        resampled_audio_data, loaded_sample_rate = process_audio(wav_audio_data, TARGET_SAMPLE_RATE)
-        transcription = transcribe_audio(resampled_audio_data, TARGET_SAMPLE_RATE, model, processor)
-        st.session_state['inference_required'] = False
-        st.session_state['transcription'] = transcription
+        current_audio_data = st_audiorec()
+        if current_audio_data is not None:
+            digest = audio_digest(current_audio_data)
+            if digest != st.session_state['audio_digest']:
+                st.session_state['inference_required'] = True
+                st.session_state['audio_digest'] = digest
+                SESSION_RECORDINGS.put(st.session_state['session_id'], (digest, current_audio_data))
+            # The recorder returns its recording on every rerun
+            wav_audio_data = current_audio_data
+        else:
+            wav_audio_data = session_recording()
+
+        if wav_audio_data is not None and st.session_state['inference_required']:
+            # The same audio, model and options are transcribed once, in any session
+            key = cache_key(st.session_state['audio_digest'], MODEL_PATH,
+                            {'stride_seconds': LONG_FORM_STRIDE_SECONDS})
+            transcription = TRANSCRIPTION_CACHE.get(key)
+            if transcription is None:
+                resampled_audio_data, loaded_sample_rate = process_audio(wav_audio_data, TARGET_SAMPLE_RATE,
+                                                                         st.session_state['session_id'], AUDIO_CAPTURE)
+                transcription = transcribe_audio(resampled_audio_data, TARGET_SAMPLE_RATE, model, processor)
+                TRANSCRIPTION_CACHE.put(key, transcription)
+            else:
+                st.audio(wav_audio_data, format='audio/wav')
+            st.session_state['inference_required'] = False
+            st.session_state['transcription'] = transcription
     st.write(f"Raw Transcription: {st.session_state['transcription']}")
 
     if st.session_state['transcription']:
-        final_transcription = process_transcription(st.session_state['transcription'], MACROS)
+        final_transcription = process_transcription(st.session_state['transcription'], MACROS, MACRO_INDEX)
         st.markdown(f"Final Transcription (with macros):\n\n{final_transcription}")
 
         # Add a text area for the user to edit the final transcription
@@ -217,23 +258,13 @@ def main():
 
         # Add a save button
         if st.button('Save Transcription'):
-            # Generate a UUID
-            id = uuid.uuid4()
-
-            # Save the transcriptions, model, and timestamp to a CSV file
-            df = pd.DataFrame({
-                'UUID': [str(id)],
-                'Raw Transcription': [st.session_state['transcription']],
-                'Final Transcription': [final_transcription],
-                'User Edited Transcription': [edited_transcription],
-                'Model': [MODEL_PATH],
-                'Timestamp': [datetime.now()]
-            })
-            df.to_csv('./artifacts/transcriptions.tsv', mode='a', header=False, sep='\t')
-
-            # Save the audio file with a filename that matches the UUID
-            with open(f'./artifacts/audio/{id}.wav', 'wb') as f:
-                f.write(wav_audio_data)
+            # Append the transcriptions, model, timestamp and FLAC audio to the artifact log
+            id = ARTIFACT_LOG.save(st.session_state['transcription'], final_transcription, edited_transcription,
+                                   MODEL_PATH, wav_audio_data)
+            if wav_audio_data is None:
+                st.warning(f"Saved transcription {id} without audio: the recording is no longer available")
+            else:
+                st.success(f"Saved transcription {id}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file